@@ -108,21 +108,21 @@ class LatextoolsContextListener(sublime_plugin.EventListener):
     _ctx_st_version.consume_operand = True
 
     def _ctx_documentclass(self, view, **kwargs):
-        ana = analysis.get_analysis(view)
+        ana = analysis.get_preamble_analysis(view)
         if not ana:
             return ""
-        com = ana.filter_commands("documentclass")
+        com = next(ana.filter_commands("documentclass"), None)
         if not com:
             return ""
-        doc_class = com[0].args
+        doc_class = com.args
         return doc_class
 
     def _ctx_usepackage(self, view, consume_operand, operand, **kwargs):
         falsity = False if consume_operand else ""
-        ana = analysis.get_analysis(view)
+        ana = analysis.get_preamble_analysis(view)
         if not ana:
             return falsity
-        com = ana.filter_commands("usepackage")
+        com = list(ana.filter_commands("usepackage"))
         if not com:
             return falsity
         packages = [p.strip() for c in com for p in c.args.split(",")]
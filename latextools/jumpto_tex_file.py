@@ -144,7 +144,7 @@ def find_image(tex_root, file_name, tex_file_name=None):
 
     image_types = get_setting("image_types", ["png", "pdf", "jpg", "jpeg", "eps"])
 
-    for graphics_path in [base_path] + ana.graphics_paths():
+    for graphics_path in (base_path,) + ana.graphics_paths():
         file_path = _validate_image(
             os.path.normpath(os.path.join(graphics_path, file_name)), image_types
         )
@@ -28,8 +28,10 @@ from .latextools_plugin import NoSuchPluginException
 from .utils import analysis
 from .utils import bibformat
 from .utils.cache import cache_local
-from .utils.external_command import CalledProcessError
-from .utils.external_command import check_output
+from .utils.cache import record_input
+# kpsewhich is imported from this module by plugins
+from .utils.kpsewhich import kpsewhich
+from .utils.kpsewhich import kpsewhich_all
 from .utils.logging import logger
 from .utils.settings import get_setting
 from .utils.tex_directives import get_tex_root
@@ -189,30 +191,6 @@ def _bibfile_filter(c):
     )
 
 
-def kpsewhich(filename, file_format=None):
-    command = ["kpsewhich"]
-    if file_format is not None:
-        command.append(f"-format={file_format}")
-    command.append(filename)
-
-    try:
-        return check_output(command)
-    except CalledProcessError as e:
-        logger.error(
-            "An error occurred while trying to run kpsewhich. "
-            "Files in your TEXINPUTS could not be accessed."
-        )
-        if e.output:
-            logger.debug(e.output)
-    except OSError as e:
-        logger.error(
-            "Could not run kpsewhich. Please ensure that your texpath " "setting is correct."
-        )
-        logger.debug(e)
-
-    return None
-
-
 def find_bib_files(root):
     def _find_bib_files():
         # the final list of bib files
@@ -255,17 +233,24 @@ def find_bib_files(root):
 
         # extract absolute filepath for each bib file
         rootdir = os.path.dirname(root)
+        unresolved = []
         for res in resources:
             candidate_file = analysis.decode_path(res, rootdir)
             if not candidate_file:
                 continue
 
-            # if the file doesn't exist, search the default tex paths
-            if not os.path.exists(candidate_file):
-                candidate_file = kpsewhich(res, "mlbib")
-
-            if candidate_file and os.path.exists(candidate_file):
+            record_input(candidate_file)
+            if os.path.exists(candidate_file):
                 result.add(candidate_file)
+            else:
+                unresolved.append(res)
+
+        # search the default tex paths for the files, which don't exist
+        for candidate_file in kpsewhich_all(unresolved, "mlbib").values():
+            if candidate_file:
+                record_input(candidate_file)
+                if os.path.exists(candidate_file):
+                    result.add(candidate_file)
 
         return tuple(result)
 
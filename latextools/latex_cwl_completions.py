@@ -114,7 +114,7 @@ def get_cwl_files(tex_root: str) -> tuple[str]:
 
         # autoload cwl_files by scanning the document
         if get_setting("cwl_autoload", True):
-            ana = analysis.get_analysis(tex_root)
+            ana = analysis.get_preamble_analysis(tex_root)
             if ana:
                 flags = analysis.ONLY_PREAMBLE | analysis.ONLY_COMMANDS_WITH_ARGS
 
@@ -1,10 +1,11 @@
-import json
 import os
 import re
 
 import sublime
 
 from .latex_fill_all import LatexFillAllPlugin
+from .latex_installed_packages import load_package_cache
+from .latex_installed_packages import update_package_cache
 from .utils import analysis
 from .utils.is_tex_file import get_tex_extensions
 from .utils.output_directory import get_aux_directory
@@ -311,25 +312,10 @@ def parse_completions(view, line):
 
 
 def _get_cache():
-    cache_path = os.path.normpath(os.path.join(sublime.cache_path(), "LaTeXTools"))
-
-    pkg_cache_file = os.path.normpath(os.path.join(cache_path, "pkg_cache.cache"))
-
-    cache = None
-    if not os.path.exists(pkg_cache_file):
-        gen_cache = sublime.ok_cancel_dialog(
-            "Cache files for installed packages, "
-            "classes and bibliographystyles do not exists, "
-            "would you like to generate it? After generating complete, "
-            "please re-run this completion action!"
-        )
-
-        if gen_cache:
-            sublime.run_command("latextools_gen_pkg_cache")
-    else:
-        with open(pkg_cache_file) as f:
-            cache = json.load(f)
-    return cache
+    # the cache is generated in the background when it is missing or the
+    # TeX distribution has changed; the completions are available afterwards
+    update_package_cache()
+    return load_package_cache()
 
 
 class InputLatexFillAllPlugin(LatexFillAllPlugin):
@@ -2,121 +2,247 @@
 import os
 import json
 
-from collections import defaultdict
-
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 from functools import partial
 import threading
+import time
 import traceback
 
 import sublime
 import sublime_plugin
 
-from .utils.external_command import CalledProcessError
-from .utils.external_command import check_output
+from .utils import kpathsea
+from .utils.cache import hash_digest
 from .utils.logging import logger
 
 __all__ = ["LatextoolsGenPkgCacheCommand"]
 
+# the kpathsea formats of the cached files and their extensions
+_CACHED_FORMATS = (("tex", (".sty", ".cls")), ("bst", (".bst",)))
 
-def _get_tex_searchpath(file_type):
-    if file_type is None:
-        raise Exception("file_type must be set for _get_tex_searchpath")
+# the keys of the files with the extensions in the cache
+_CACHE_KEYS = {".sty": "pkg", ".cls": "cls", ".bst": "bst"}
 
-    command = ["kpsewhich"]
-    command.append(f"--show-path={file_type}")
+# the number of threads scanning directories not covered by a ls-R database
+_SCAN_WORKERS = 4
 
-    try:
-        return check_output(command)
-    except CalledProcessError as e:
-        sublime.set_timeout(
-            partial(
-                sublime.error_message,
-                "An error occurred while trying to run kpsewhich. "
-                "Files in your TEXMF tree could not be accessed.",
-            ),
-            0,
-        )
-        if e.output:
-            logger.debug(e.output)
-        traceback.print_exc()
-    except OSError:
-        sublime.set_timeout(
-            partial(
-                sublime.error_message,
-                "Could not run kpsewhich. Please ensure that your texpath "
-                "setting is configured correctly in your LaTeXTools "
-                "settings.",
-            ),
-            0,
-        )
-        traceback.print_exc()
+# seconds between writing the results found so far during the generation
+_WRITE_INTERVAL = 1
 
-    return None
+# seconds between two checks whether the TeX distribution has changed
+CHECK_INTERVAL = 60
 
+_update_lock = threading.Lock()
+_updating = False
+_checked = 0
 
-def _get_files_matching_extensions(paths, extensions=[]):
-    if isinstance(extensions, str):
-        extensions = [extensions]
 
-    matched_files = defaultdict(lambda: [])
+def _get_cache_file():
+    cache_path = os.path.normpath(os.path.join(sublime.cache_path(), "LaTeXTools"))
+    return os.path.join(cache_path, "pkg_cache.cache")
+
+
+def _get_tex_searchpath(file_type):
+    if file_type is None:
+        raise Exception("file_type must be set for _get_tex_searchpath")
 
-    for path in paths.split(os.pathsep):
+    search_path = kpathsea.search_path(file_type)
+    if not search_path:
+        logger.error(
+            "Could not run kpsewhich. Please ensure that your texpath "
+            "setting is configured correctly in your LaTeXTools settings."
+        )
+    return search_path
+
+
+def _scan_directory(path, recursive, extensions):
+    """
+    returns the names of the files with the extensions in the directory
+    """
+    result = []
+    pending = [path]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if recursive:
+                            pending.append(entry.path)
+                    elif os.path.splitext(entry.name)[1] in extensions:
+                        result.append(entry.name)
+                except OSError:
+                    continue
+    return result
+
+
+def _iter_search_path(search_path):
+    """
+    yields the existing elements of the search path as tuples of
+    (path, only_database, recursive)
+    """
+    for element in search_path:
+        only_database = element.startswith("!!")
+        if only_database:
+            element = element[2:]
         # our current directory isn't usually meaningful from a WindowCommand
-        if path == ".":
+        if not element or element == ".":
             continue
+        yield os.path.normpath(element), only_database, element.endswith("//")
+
+
+def collect_packages(search_paths, index, on_found=None):
+    """
+    returns the names of the installed packages, classes and bibliography
+    styles as dict of sets
+
+    the files of directories covered by a ls-R database are taken from the
+    index, the other directories are scanned concurrently
+
+    :param search_paths:
+        a dict mapping the kpathsea formats "tex" and "bst" to the elements
+        of their search paths
+
+    :param index:
+        the kpathsea.FileIndex of the ls-R databases
+
+    :param on_found:
+        called with the result after the files of a directory have been added
+    """
+    found = {key: set() for key in _CACHE_KEYS.values()}
+
+    def add(names):
+        for name in names:
+            base, ext = os.path.splitext(name)
+            found[_CACHE_KEYS[ext]].add(base)
+        if on_found is not None:
+            on_found(found)
+
+    scans = []
+    for file_format, extensions in _CACHED_FORMATS:
+        for path, only_database, recursive in _iter_search_path(search_paths.get(file_format, ())):
+            if index.covers(path):
+                add(index.files(path, recursive, extensions))
+            elif not only_database and os.path.isdir(path):
+                scans.append((path, recursive, extensions))
+
+    if scans:
+        with ThreadPoolExecutor(max_workers=min(len(scans), _SCAN_WORKERS)) as executor:
+            futures = [executor.submit(_scan_directory, *scan) for scan in scans]
+            for future in as_completed(futures):
+                add(future.result())
+
+    return found
+
+
+def _distribution_fingerprint(search_paths, index):
+    """
+    returns a digest, which changes when files are installed or removed
+    """
+    state = [sorted(search_paths.items()), sorted(index.databases.items())]
+    for file_format, _ in _CACHED_FORMATS:
+        for path, only_database, _ in _iter_search_path(search_paths.get(file_format, ())):
+            if not only_database and not index.covers(path):
+                try:
+                    state.append((path, os.stat(path).st_mtime_ns))
+                except OSError:
+                    pass
+    return hash_digest(repr(state))
+
+
+def _write_package_cache(found, fingerprint, complete):
+    pkg_cache = {key: sorted(names, key=lambda s: s.lower()) for key, names in found.items()}
+    pkg_cache["fingerprint"] = fingerprint
+    pkg_cache["complete"] = complete
+
+    pkg_cache_file = _get_cache_file()
+    os.makedirs(os.path.dirname(pkg_cache_file), exist_ok=True)
+
+    # completions must never read a partially written file
+    tmp_file = pkg_cache_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(pkg_cache, f)
+    os.replace(tmp_file, pkg_cache_file)
 
-        # !! sometimes occurs in the results on POSIX; remove them
-        path = path.replace("!!", "")
-        path = os.path.normpath(path)
-        if not os.path.exists(path):  # ensure path exists
-            continue
 
-        if len(extensions) > 0:
-            for _, _, files in os.walk(path):
-                for f in files:
-                    for ext in extensions:
-                        if f.endswith("".join((os.extsep, ext))):
-                            matched_files[ext].append(os.path.splitext(f)[0])
-        else:
-            for _, _, files in os.walk(path):
-                for f in files:
-                    matched_files["*"].append(os.path.splitext(f)[0])
-
-    matched_files = dict(
-        [(key, sorted(set(value), key=lambda s: s.lower())) for key, value in matched_files.items()]
-    )
+def load_package_cache():
+    """
+    returns the cached names of the installed packages, classes and
+    bibliography styles or None, if the cache has not been generated yet
+    """
+    try:
+        with open(_get_cache_file()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-    return matched_files
 
+def _generate_package_cache(search_paths, index, fingerprint):
+    last_write = time.time()
 
-def _generate_package_cache():
-    installed_tex_items = _get_files_matching_extensions(_get_tex_searchpath("tex"), ["sty", "cls"])
+    def on_found(found):
+        # the results found so far are available while scanning the rest
+        nonlocal last_write
+        if time.time() - last_write >= _WRITE_INTERVAL:
+            _write_package_cache(found, fingerprint, False)
+            last_write = time.time()
 
-    installed_bst = _get_files_matching_extensions(_get_tex_searchpath("bst"), ["bst"])
+    found = collect_packages(search_paths, index, on_found)
+    _write_package_cache(found, fingerprint, True)
 
-    # create the cache object
-    pkg_cache = {
-        "pkg": installed_tex_items.get("sty", []),
-        "bst": installed_bst.get("bst", []),
-        "cls": installed_tex_items.get("cls", []),
-    }
+    sublime.set_timeout(
+        partial(sublime.status_message, "Finished generating LaTeX package cache"), 0
+    )
 
-    # For ST3, put the cache files in cache dir
-    # and for ST2, put it in the user packages dir
-    # and change the name
-    cache_path = os.path.normpath(os.path.join(sublime.cache_path(), "LaTeXTools"))
 
-    if not os.path.exists(cache_path):
-        os.makedirs(cache_path)
+def _update_package_cache(force):
+    global _updating
 
-    pkg_cache_file = os.path.normpath(os.path.join(cache_path, "pkg_cache.cache"))
+    try:
+        search_paths = {
+            file_format: _get_tex_searchpath(file_format) for file_format, _ in _CACHED_FORMATS
+        }
+        index = kpathsea.get_index()
+        fingerprint = _distribution_fingerprint(search_paths, index)
+        if not force:
+            cache = load_package_cache()
+            if cache and cache.get("complete") and cache.get("fingerprint") == fingerprint:
+                return
+            logger.info("TeX distribution changed, generating LaTeX package cache")
+
+        _generate_package_cache(search_paths, index, fingerprint)
+    except Exception:
+        traceback.print_exc()
+    finally:
+        with _update_lock:
+            _updating = False
 
-    with open(pkg_cache_file, "w+") as f:
-        json.dump(pkg_cache, f)
 
-    sublime.set_timeout(
-        partial(sublime.status_message, "Finished generating LaTeX package cache"), 0
-    )
+def update_package_cache(force=False):
+    """
+    generates the cache of the installed packages, classes and bibliography
+    styles in the background, if it is missing or the TeX distribution has
+    changed since it has been generated
+
+    :param force:
+        if True, the cache is generated regardless of its state
+    """
+    global _updating, _checked
+
+    with _update_lock:
+        now = time.time()
+        if _updating or not force and now - _checked < CHECK_INTERVAL:
+            return
+        _updating = True
+        _checked = now
+
+    thread = threading.Thread(target=_update_package_cache, args=(force,))
+    thread.daemon = True
+    thread.start()
 
 
 # Generates a cache for installed latex packages, classes and bst.
@@ -126,6 +252,4 @@ class LatextoolsGenPkgCacheCommand(sublime_plugin.ApplicationCommand):
 
     def run(self):
         # use a separate thread to update cache
-        thread = threading.Thread(target=_generate_package_cache)
-        thread.daemon = True
-        thread.start()
+        update_package_cache(force=True)
@@ -1,6 +1,7 @@
 import collections
 from functools import partial
 import threading
+import time
 import traceback
 
 import sublime
@@ -10,8 +11,19 @@ from .latex_cite_completions import find_bib_files
 from .latex_cite_completions import run_plugin_command
 from .latex_cwl_completions import get_cwl_command_completions
 from .utils import analysis
+from .utils import cache_gc
+from .utils import cache_stats
+from .utils import include_index
+from .utils import io_executor
 from .utils.activity_indicator import ActivityIndicator
+from .utils.bibcache import BibCache
+from .utils.cache import CacheMiss
 from .utils.cache import LocalCache
+from .utils.cache import deduplicated_computations
+from .utils.cache import discard_unsaved_input
+from .utils.cache import resident_entries
+from .utils.cache import resident_size
+from .utils.decorators import debounce
 from .utils.logging import logger
 from .utils.settings import get_setting
 from .utils.tex_directives import get_tex_root
@@ -20,12 +32,26 @@ __all__ = [
     "LatextoolsCacheUpdateListener",
     "LatextoolsAnalysisUpdateCommand",
     "LatextoolsBibcacheUpdateCommand",
+    "LatextoolsCacheMemoryReportCommand",
+    "LatextoolsCacheStatsCommand",
+    "LatextoolsCacheGcCommand",
 ]
 
 # stores a cache instance per open LaTeX view
 # note that cache instances share state
 _TEX_CACHES = {}
 
+# stores the preloaded bib cache instances per open LaTeX view, which keeps
+# their state in memory as long as the view is open
+_BIB_CACHES = {}
+
+# the names of the bib caches used by the builtin bibliography plugins
+_BIB_CACHE_NAMES = {"new": "new", "traditional": "trad"}
+
+# the delay in ms after the last modification of a view before its content
+# is analyzed
+LIVE_UPDATE_DELAY = 500
+
 
 def get_cache(view):
     vid = view.id()
@@ -42,6 +68,92 @@ def get_cache(view):
 
 def remove_cache(view):
     _TEX_CACHES.pop(view.id(), None)
+    _BIB_CACHES.pop(view.id(), None)
+
+
+class CacheWarmUp:
+    """
+    preloads the persisted caches of the tex roots of views in the
+    background, so that the first completions don't have to wait for them
+
+    views are handled one after another in the order they are added; views
+    of closed windows are skipped
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (window, view, cache, callback)
+        self._pending = collections.deque()
+        self._running = False
+
+    def add(self, view, cache, callback=None):
+        """
+        schedules the caches of the view to be preloaded
+
+        :param callback:
+            called in the background once the caches of the view are loaded
+        """
+        with self._lock:
+            self._pending.append((view.window(), view, cache, callback))
+            if self._running:
+                return
+            self._running = True
+        io_executor.submit(self._run)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                window, view, cache, callback = self._pending.popleft()
+
+            try:
+                if not self._is_open(window, view):
+                    continue
+                # the caches of a tex root are loaded only once, further
+                # views of the root share the state
+                if not cache.has("analysis"):
+                    logger.debug(f"Preloading cache for {cache.tex_root}")
+                    cache.load()
+                if self._is_open(window, view) and view.id() not in _BIB_CACHES:
+                    _BIB_CACHES[view.id()] = self._load_bib_caches(cache)
+                if callback is not None and self._is_open(window, view):
+                    callback()
+            except Exception:
+                traceback.print_exc()
+
+    @staticmethod
+    def _is_open(window, view):
+        return view.is_valid() and (window is None or window.is_valid())
+
+    @staticmethod
+    def _load_bib_caches(cache):
+        try:
+            bib_files = cache.get("bib_files")
+        except CacheMiss:
+            return ()
+
+        plugins = get_setting("bibliography", "new")
+        if isinstance(plugins, str):
+            plugins = [plugins]
+
+        bib_caches = []
+        for plugin in plugins:
+            name = _BIB_CACHE_NAMES.get(plugin)
+            if not name:
+                continue
+            for bib_file in bib_files:
+                bib_cache = BibCache(name, bib_file)
+                try:
+                    bib_cache.load(bib_cache.formatted_cache_name)
+                except CacheMiss:
+                    continue
+                bib_caches.append(bib_cache)
+        return tuple(bib_caches)
+
+
+_warm_up = CacheWarmUp()
 
 
 def update_cache(cache, doc, bib):
@@ -51,7 +163,7 @@ def update_cache(cache, doc, bib):
                 cache.invalidate()
                 if doc:
                     logger.debug(f"Updating analysis cache for {cache.tex_root}")
-                    cache.set("analysis", analysis.analyze_document(cache.tex_root))
+                    cache.refresh("analysis", partial(analysis.analyze_document, cache.tex_root))
                 if bib:
                     logger.debug(f"Updating bibliography cache for {cache.tex_root}")
                     run_plugin_command("get_entries", *(find_bib_files(cache.tex_root) or []))
@@ -68,9 +180,87 @@ def update_cache(cache, doc, bib):
         threading.Thread(target=worker).start()
 
 
+def update_live_analysis(view):
+    """
+    updates the cached analysis with the unsaved content of the view, if
+    the analysis has already been created
+    """
+    cache = get_cache(view)
+    file_name = view.file_name()
+    if not cache or not file_name:
+        return
+
+    try:
+        ana = cache.get("analysis")
+    except CacheMiss:
+        # the analysis is created from the content of the view when needed
+        return
+
+    content = view.substr(sublime.Region(0, view.size()))
+    try:
+        if ana.raw_content(analysis._normalize_file_name(file_name)) == content:
+            return
+    except analysis.FileNotAnalyzed:
+        return
+
+    logger.debug(f"Updating analysis cache for {cache.tex_root} from {file_name}")
+    result = cache.refresh("analysis", partial(analysis.update_analysis, ana, file_name, content))
+    flags = analysis.ONLY_PREAMBLE | analysis.ALL_COMMANDS
+    if result and result.commands(flags) != ana.commands(flags):
+        cache.invalidate(["preamble_analysis", "cwl_files"])
+
+
+def discard_unsaved_content(view):
+    """
+    invalidates the cached values derived from the unsaved content of the
+    view, e.g. after it has been closed or reverted without saving it
+    """
+    file_name = view.file_name()
+    if file_name:
+        discard_unsaved_input(analysis._normalize_file_name(file_name))
+
+
+def update_dependent_caches(file_name, tex_root, rebuild):
+    """
+    invalidates the entries derived from the saved file in the caches of the
+    other tex roots including it; the analyses of the roots with open views
+    are rebuilt in the background
+    """
+    open_roots = {cache.tex_root for cache in _TEX_CACHES.values()}
+
+    def worker():
+        for dependent_root in include_index.dependent_roots(file_name):
+            if dependent_root == tex_root:
+                continue
+            try:
+                cache = LocalCache(dependent_root)
+                keys = cache.invalidate_dependents(file_name)
+                if not rebuild or "analysis" not in keys or dependent_root not in open_roots:
+                    continue
+                logger.debug(f"Updating analysis cache for {dependent_root} from {file_name}")
+                cache.refresh("analysis", partial(analysis.analyze_document, dependent_root))
+                get_cwl_command_completions(dependent_root)
+            except Exception:
+                traceback.print_exc()
+
+    io_executor.submit(worker)
+
+
 class LatextoolsCacheUpdateListener(sublime_plugin.EventListener):
     def on_init(self, views):
-        for view in views:
+        # preload the caches of the views the user looks at first
+        active_window = sublime.active_window()
+        active_views = [w.active_view() for w in sublime.windows()]
+        if active_window:
+            active_views.insert(0, active_window.active_view())
+
+        def priority(view):
+            try:
+                return active_views.index(view)
+            except ValueError:
+                return len(active_views)
+
+        for view in sorted(views, key=priority):
             if view.match_selector(0, "text.tex.latex"):
                 self.on_load(view)
 
@@ -85,6 +275,13 @@ class LatextoolsCacheUpdateListener(sublime_plugin.EventListener):
         if not cache:
             return
 
+        if get_setting("cache.warm_up", True, view):
+            _warm_up.add(view, cache, partial(self._update_on_load, view, cache))
+        else:
+            self._update_on_load(view, cache)
+
+    @staticmethod
+    def _update_on_load(view, cache):
         update_doc = get_setting("cache.analysis.update_on_load", True, view)
         update_bib = get_setting("cache.bibliography.update_on_load", True, view)
         if not update_doc and not update_bib:
@@ -93,14 +290,35 @@ class LatextoolsCacheUpdateListener(sublime_plugin.EventListener):
         # because cache state is shared amongst all documents sharing a tex
         # root, this ensure we only load the analysis ONCE in the on_load
         # event
-        update_cache(
-            cache,
-            update_doc and not cache.has("analysis"),
-            update_bib and not cache.has("bib_files"),
-        )
+        update_doc = update_doc and not cache.has("analysis")
+        update_bib = update_bib and not cache.has("bib_files")
+        if update_doc or update_bib:
+            update_cache(cache, update_doc, update_bib)
 
     def on_close(self, view):
         remove_cache(view)
+        # the unsaved content is lost, unless a clone still shows it
+        if not any(v.id() != view.id() for v in view.buffer().views()):
+            discard_unsaved_content(view)
+
+    def on_revert(self, view):
+        discard_unsaved_content(view)
+
+    @debounce(LIVE_UPDATE_DELAY)
+    def on_modified_async(self, view):
+        if not view.is_primary():
+            return
+
+        if not view.match_selector(0, "text.tex.latex"):
+            return
+
+        if not get_setting("cache.analysis.update_on_modify", True, view):
+            return
+
+        try:
+            update_live_analysis(view)
+        except Exception:
+            traceback.print_exc()
 
     def on_post_save(self, view):
         if not view.is_primary():
@@ -109,12 +327,18 @@ class LatextoolsCacheUpdateListener(sublime_plugin.EventListener):
         if not view.match_selector(0, "text.tex.latex"):
             return
 
+        # the analysis of the saved content is validated by the file itself
+        discard_unsaved_content(view)
+
+        cache = get_cache(view)
         update_doc = get_setting("cache.analysis.update_on_save", True, view)
         update_bib = get_setting("cache.bibliography.update_on_save", True, view)
+        if view.file_name():
+            update_dependent_caches(view.file_name(), cache and cache.tex_root, update_doc)
         if not update_doc and not update_bib:
             return
 
-        update_cache(get_cache(view), update_doc, update_bib)
+        update_cache(cache, update_doc, update_bib)
 
 
 class LatextoolsAnalysisUpdateCommand(sublime_plugin.WindowCommand):
@@ -147,3 +371,92 @@ class LatextoolsBibcacheUpdateCommand(sublime_plugin.WindowCommand):
             return
 
         update_cache(get_cache(view), False, True)
+
+
+def _format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def show_report(window, text):
+    """
+    shows a text report in the LaTeXTools cache output panel
+    """
+    panel = window.create_output_panel("latextools_cache")
+    panel_settings = panel.settings()
+    panel_settings.set("gutter", False)
+    panel_settings.set("line_numbers", False)
+    panel_settings.set("word_wrap", False)
+    panel.run_command("append", {"characters": text})
+    window.run_command("show_panel", {"panel": "output.latextools_cache"})
+
+
+class LatextoolsCacheMemoryReportCommand(sublime_plugin.WindowCommand):
+    """
+    lists the cache entries currently held in memory, the most recently used
+    entries first
+    """
+
+    def run(self):
+        now = time.time()
+        lines = [
+            f"LaTeXTools cache: {_format_size(resident_size())} resident "
+            f"(budget: {get_setting('cache.memory_budget', 0)} MB)",
+            "",
+            f"{'size':>10}  {'idle':>8}  {'key':<30}  cache",
+        ]
+        for label, key, size, last_access in resident_entries():
+            lines.append(
+                f"{_format_size(size):>10}  {now - last_access:>7.0f}s  {key:<30}  {label}"
+            )
+
+        deduplicated = deduplicated_computations()
+        if deduplicated:
+            lines.extend(("", "computations saved by waiting for a computation in progress:"))
+            for key, count in sorted(deduplicated.items()):
+                lines.append(f"{count:>10}  {key}")
+        show_report(self.window, "\n".join(lines) + "\n")
+
+
+class LatextoolsCacheStatsCommand(sublime_plugin.WindowCommand):
+    """
+    shows the hit, miss and timing counters of the caches per key class
+    """
+
+    def run(self, reset=False):
+        text = "LaTeXTools cache statistics\n\n" + cache_stats.format_table() + "\n"
+        show_report(self.window, text)
+        if reset:
+            cache_stats.reset()
+
+
+class LatextoolsCacheGcCommand(sublime_plugin.WindowCommand):
+    """
+    removes the caches of removed documents and bib files and the least
+    recently used caches exceeding the cache.size_limit
+
+    :param dry_run:
+        if True, only lists the caches, which would be removed
+    """
+
+    def run(self, dry_run=False):
+        def worker():
+            removed, total_size = cache_gc.collect(dry_run=dry_run)
+            action = "would remove" if dry_run else "removed"
+            lines = [
+                f"LaTeXTools cache clean-up: {action} {len(removed)} caches "
+                f"({_format_size(sum(unit.size for unit, _ in removed))}), "
+                f"{_format_size(total_size)} remaining",
+                "",
+            ]
+            for unit, reason in removed:
+                lines.append(
+                    f"{_format_size(unit.size):>10}  {reason:<15}  {unit.source or unit.name}"
+                )
+            text = "\n".join(lines) + "\n"
+            sublime.set_timeout(lambda: show_report(self.window, text))
+
+        io_executor.submit(worker)
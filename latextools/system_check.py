@@ -25,6 +25,7 @@ from .latextools_plugin import NoSuchPluginException
 from .utils.activity_indicator import ActivityIndicator
 from .utils.distro_utils import using_miktex
 from .utils.external_command import get_texpath
+from .utils.kpsewhich import match_paths
 from .utils.logging import logger
 from .utils.output_directory import get_aux_directory
 from .utils.output_directory import get_jobname
@@ -320,8 +321,9 @@ class SystemCheckThread(threading.Thread):
             if packages:
                 table = [["Packages for equation preview", "Status"]]
 
+                found = self.kpsewhich_all(packages)
                 for package in packages:
-                    available = bool(self.kpsewhich(package))
+                    available = package in found
                     package_name = package.split(".")[0]
                     table.append([package_name, ("available" if available else "missing")])
 
@@ -480,7 +482,7 @@ class SystemCheckThread(threading.Thread):
             # create and print output in UI thread to avoid graphical glitches
             sublime.set_timeout(partial(self.on_done, results))
 
-    def check_output(self, cmd: list[str]) -> str | None:
+    def check_output(self, cmd: list[str], returncodes: tuple[int, ...] = (0,)) -> str | None:
         # manually lookup executable, as subprocess.run() ignores custom
         # environment's PATH, if shell=False is specified, and absolute path
         # may help analyzing debug log.
@@ -501,7 +503,7 @@ class SystemCheckThread(threading.Thread):
             timeout=30,
             universal_newlines=True,
         )
-        return result.stdout if result.returncode == 0 else None
+        return result.stdout if result.returncode in returncodes else None
 
     def get_version_info(self, executable: str) -> str | None:
         logger.info(f"Checking {executable}...")
@@ -536,8 +538,13 @@ class SystemCheckThread(threading.Thread):
         # return platform specific normalized paths
         return os.pathsep.join(map(os.path.normpath, stdout.strip().split(os.pathsep)))
 
-    def kpsewhich(self, file: str) -> str | None:
-        return self.check_output(["kpsewhich", file])
+    def kpsewhich_all(self, files: list[str]) -> dict[str, str]:
+        # kpsewhich fails, if any of the files is missing, but prints the
+        # paths of the others
+        stdout = self.check_output(["kpsewhich", *files], returncodes=(0, 1))
+        if stdout is None:
+            return {}
+        return match_paths(files, stdout.splitlines())
 
     @lru_cache(maxsize=64)
     def which(self, file: str) -> str | None:
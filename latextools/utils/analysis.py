@@ -1,18 +1,32 @@
+import collections
 import copy
+import bisect
 import itertools
 import os
 import regex
 import sublime
+import threading
 import traceback
 
+from array import array
 from collections.abc import Iterable
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from functools import partial
 
 from ...vendor.frozendict import frozendict
 
+from . import include_index
 from . import utils
+from .cache import InputRecorder
 from .cache import cache_local
+from .cache import hash_digest
+from .cache import immutable
+from .cache import record_input
+from .cache import record_unsaved_input
 from .logging import logger
+from .settings import get_setting
 from .tex_directives import get_tex_root
 
 # attributes of an entry (for documentation)
@@ -30,6 +44,9 @@ for each regex name:
 - start: the start position in the buffer
 - end: the end position in the buffer
 - region: a sublime region containing the whole entry
+
+The regions are created on access. The region of a part, which is missing
+in the entry, is (-1, -1).
 """
 
 # regex for a latex expression
@@ -82,6 +99,16 @@ _RE_COMMAND = regex.compile(
     cache_pattern=False,
     ignore_unused=True,
 )
+# the regex groups stored in a command entry
+_ENTRY_GROUPS = ("command", "star") + _COMMAND_ARG_NAMES
+# the scanner finds the same commands as _RE_COMMAND in a single pass
+# over the content, see _scan_commands()
+_RE_COMMAND_NAME = regex.compile(r"\\([A-Za-z]+)(\*?)", flags=regex.VERSION1)
+_RE_BRACES = regex.compile(r"[{}]", flags=regex.VERSION1)
+_RE_BRACKETS = regex.compile(r"[\[\]]", flags=regex.VERSION1)
+_RE_ARG_SEPARATOR = regex.compile(r"[ \t]*\n?[ \t]*", flags=regex.VERSION1)
+# the end of the preamble
+_RE_BEGIN_DOCUMENT = regex.compile(r"\\begin\*?[ \t]*\n?[ \t]*\{document\}", flags=regex.VERSION1)
 # this regex is used to remove comments
 _RE_COMMENT = regex.compile(
     r"((?<=^)|(?<=[^\\]))%.*",
@@ -134,12 +161,37 @@ _FLAG_FILTER = {
 
 DEFAULT_FLAGS = NO_BEGIN_END_COMMANDS | ONLY_COMMANDS_WITH_ARGS
 
+# the number of tex roots, whose latest analysis is kept to reuse the
+# results of unchanged files
+_MAX_PREVIOUS_ANALYSES = 4
+
 
 class FileNotAnalyzed(Exception):
     pass
 
 
+# the result of parsing a single file
+# content_hash: the hash of the raw content
+# matches: a tuple with a tuple of entries for each top-level command, the
+#     first entry being the command itself, followed by the nested commands
+# complete: False if only the preamble has been parsed
+_ParsedFile = collections.namedtuple(
+    "_ParsedFile", ["content_hash", "raw_content", "content", "matches", "complete"]
+)
+
+
+@immutable
 class Analysis:
+    """
+    The analysis of a document
+
+    Once frozen, i.e. when returned by analyze_document(), an analysis is
+    read-only and shared by all users of the cache.
+    """
+
+    # attributes, which are lazily computed and may be set when frozen
+    _LAZY_ATTRIBUTES = ("_graphics_path",)
+
     def __init__(self, tex_root):
         self._tex_root = tex_root
         self._content = {}
@@ -147,9 +199,20 @@ class Analysis:
 
         self._all_commands = []
         self._command_cache = {}
+        # flags -> command name -> positions of the commands in
+        # self._commands(flags)
+        self._command_index = {}
+        # file name -> _ParsedFile; a plain dict even when frozen, since a
+        # frozendict would copy the values
+        self._files = {}
+        # the files analyzed with unsaved content, see update_analysis()
+        self._unsaved_files = frozenset()
 
         self._import_base_paths = {}
         self._graphics_path = None
+        # file name -> read-only view of the line offsets, created on first
+        # use and not pickled
+        self._line_offsets = {}
 
         self.__frozen = False
 
@@ -191,16 +254,30 @@ class Analysis:
             raise FileNotAnalyzed(file_name)
         return self._raw_content[file_name]
 
+    def line_offsets(self, file_name):
+        """
+        The offsets of the lines of the file (see make_line_offsets) as a
+        read-only memoryview
+        """
+        try:
+            return self._line_offsets[file_name]
+        except KeyError:
+            pass
+        offsets = memoryview(make_line_offsets(self.raw_content(file_name))).toreadonly()
+        self._line_offsets[file_name] = offsets
+        return offsets
+
     def rowcol(self, file_name):
         """
         Returns a rowcol function for the file with the same behavior as the
         view.rowcol function from the sublime api
         """
-        return make_rowcol(self.raw_content(file_name))
+        return make_rowcol(line_offsets=self.line_offsets(file_name))
 
     def commands(self, flags=DEFAULT_FLAGS):
         """
-        Returns a list with copies of each command entry in the document
+        Returns a tuple of the command entries in the document, which is
+        shared by all users of the analysis
 
         Arguments:
         flags -- flags to filter the commands, which should for a be used over
@@ -214,14 +291,14 @@ class Analysis:
             NO_BEGIN_END_COMMANDS | ONLY_COMMANDS_WITH_ARGS
 
         Returns:
-        A list of all commands, which are preprocessed with the flags
+        A tuple of all commands, which are preprocessed with the flags
         """
         return self._commands(flags)
 
     def filter_commands(self, how, flags=DEFAULT_FLAGS):
         """
-        Returns a filtered list with copies of each command entry
-        in the document
+        Returns the command entries in the document, which match the
+        filter
 
         Arguments:
         how -- how it should be filtered, possible types are:
@@ -244,10 +321,21 @@ class Analysis:
         with the flags.
         """
         if isinstance(how, str):
-            return (c for c in self._commands(flags) if c.command == how)
+            commands = self._commands(flags)
+            positions = self._index(flags).get(how, ())
+            return (commands[i] for i in positions)
 
         elif isinstance(how, Iterable):
-            return (c for c in self._commands(flags) if c.command in how)
+            commands = self._commands(flags)
+            index = self._index(flags)
+            positions = [index[name] for name in set(how) if name in index]
+            if len(positions) == 1:
+                positions = positions[0]
+            else:
+                # keep the order of the document; sorting the concatenated
+                # sorted runs is faster than merging them
+                positions = sorted(itertools.chain.from_iterable(positions))
+            return (commands[i] for i in positions)
 
         elif callable(how):
             return (c for c in self._commands(flags) if how(c))
@@ -272,7 +360,7 @@ class Analysis:
                         result.add(p)
 
             # freeze result
-            self._graphics_path = sorted(result)
+            self._graphics_path = tuple(sorted(result))
 
         return self._graphics_path
 
@@ -301,18 +389,59 @@ class Analysis:
             self._build_cache(flags)
         return self._command_cache[flags]
 
+    def _build_index(self, flags):
+        index = {}
+        for i, c in enumerate(self._commands(flags)):
+            try:
+                index[c.command].append(i)
+            except KeyError:
+                index[c.command] = array("I", (i,))
+        self._command_index[flags] = index
+
+    def _index(self, flags):
+        if flags not in self._command_index:
+            self._build_index(flags)
+        return self._command_index[flags]
+
     def _freeze(self):
         if self.__frozen:
             return
         self._content = frozendict(**self._content)
         self._raw_content = frozendict(**self._raw_content)
+        self._import_base_paths = frozendict(**self._import_base_paths)
         self._all_commands = tuple(c for c in self._all_commands)
+        self._command_cache = {}
+        self._command_index = {}
+        self._build_index(DEFAULT_FLAGS)
         self.__frozen = True
         try:
             del self._state
         except AttributeError:
             pass
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # memoryviews cannot be pickled
+        state["_line_offsets"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # analyses pickled by older versions don't have an index
+        self.__dict__.setdefault("_command_index", {})
+        self.__dict__.setdefault("_line_offsets", {})
+        self.__dict__.setdefault("_unsaved_files", frozenset())
+        if isinstance(self.__dict__.get("_graphics_path"), list):
+            self.__dict__["_graphics_path"] = tuple(self.__dict__["_graphics_path"])
+        # the results of a loaded analysis can be reused by the next one
+        if self.__dict__.get("_Analysis__frozen"):
+            _remember_analysis(self)
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get("_Analysis__frozen") and name not in self._LAZY_ATTRIBUTES:
+            raise TypeError("cannot modify a frozen analysis")
+        super().__setattr__(name, value)
+
     def __copy__(self):
         return self
 
@@ -348,45 +477,143 @@ def get_analysis(tex_root):
     return cache_local(tex_root, "analysis", partial(analyze_document, tex_root))
 
 
-def _generate_entries(m, file_name, offset=0):
-    # insert all relevant information into this dict, which is based
-    # on the group dict, i.e. all regex matches
-    entryDict = m.groupdict()
+def get_preamble_analysis(tex_root):
+    """
+    Returns an analysis of the preamble of the document using a cache
+
+    Use this method instead of get_analysis() if you only need the commands
+    in the preamble, e.g. the loaded packages. The document is only parsed
+    up to \\begin{document}, which is much faster for large documents.
+
+    Arguments:
+    tex_root -- the path to the tex root as a string
+                if you use the view instead, the tex root will be extracted
+                automatically
+
+    Returns:
+    An Analysis of the preamble of the view
+    """
+    if not tex_root:
+        return
+    if isinstance(tex_root, sublime.View):
+        tex_root = get_tex_root(tex_root)
+        if not tex_root:
+            return
+    elif not isinstance(tex_root, str):
+        raise TypeError("tex_root must be a string or view")
+
+    return cache_local(tex_root, "preamble_analysis", partial(analyze_preamble, tex_root))
+
+
+def _matching_brackets(content, brackets_re, open_char):
+    """
+    returns a dict from the position of each opening bracket to the position
+    of the matching closing bracket; only brackets of one kind are counted,
+    as in _RE_COMMAND
+    """
+    matching = {}
+    stack = []
+    for m in brackets_re.finditer(content, concurrent=True):
+        pos = m.start()
+        if content[pos] == open_char:
+            stack.append(pos)
+        elif stack:
+            matching[stack.pop()] = pos
+    return matching
+
+
+def _is_balanced(content, end):
+    """
+    whether each bracket opened before the end is also closed before it
+    """
+    for brackets_re, open_char in ((_RE_BRACES, "{"), (_RE_BRACKETS, "[")):
+        depth = 0
+        for m in brackets_re.finditer(content, 0, end, concurrent=True):
+            if content[m.start()] == open_char:
+                depth += 1
+            elif depth:
+                depth -= 1
+        if depth:
+            return False
+    return True
+
+
+def _scan_commands(content, file_name, offset=0):
+    """
+    Finds all commands in the content with the same result as matching
+    _RE_COMMAND and matching it again on the content of each argument
+    to find the nested commands, but in linear time
+
+    The offset is added to the start of the entries, if the content is
+    a part of the file.
 
-    entryDict.update(
-        {
-            "file_name": file_name,
-            "text": m.group(0),
-            "start": offset + m.start(),
-            "end": offset + m.end(),
-            "region": sublime.Region(offset + m.start(), offset + m.end()),
-        }
+    Yields a tuple for each top level command, which contains its entry
+    followed by the entries of the nested commands in the order of the
+    document.
+    """
+    braces = _matching_brackets(content, _RE_BRACES, "{")
+    brackets = _matching_brackets(content, _RE_BRACKETS, "[")
+    args_spec = tuple(
+        (brackets, "[") if name.startswith("opt") else (braces, "{") for name in _COMMAND_ARG_NAMES
     )
-    # insert the regions of the matches into the entry dict
-    for k in m.groupdict().keys():
-        region_name = k + "_region"
-        reg = m.regs[m.re.groupindex[k]]
-        entryDict[region_name] = sublime.Region(offset + reg[0], offset + reg[1])
-    # create an object from the dict and insert it into the analysis
-    entry = objectview(frozendict(entryDict))
-    yield entry
-
-    # recursively add commands, which are inside arguments
-    for args_name in _COMMAND_ARG_NAMES:
-        args_content = entryDict[args_name]
-        if not args_content:
-            continue
-        for em in _RE_COMMAND.finditer(args_content):
-            if not em:
+    separator_match = _RE_ARG_SEPARATOR.match
+    content_len = len(content)
+    # the spans of the entries, which are equal for all entries with the
+    # same layout, e.g. all \ref{...} with labels of the same length; only
+    # shared within the content, so that they are released with it
+    shared_spans = {}
+
+    # the ends of the arguments enclosing the current position, innermost
+    # last; a command inside an argument can't extend beyond it
+    enclosing = []
+    group = []
+    for m in _RE_COMMAND_NAME.finditer(content, concurrent=True):
+        start = m.start()
+        while enclosing and enclosing[-1] <= start:
+            enclosing.pop()
+        if not enclosing and group:
+            yield tuple(group)
+            group = []
+        limit = enclosing[-1] if enclosing else content_len
+
+        values = [m.group(1), m.group(2)]
+        spans = [1, m.end(1) - start, m.start(2) - start, m.end(2) - start]
+        end = m.end()
+        args_ends = []
+        # the position of the next argument after the separator
+        pos = separator_match(content, end, limit).end()
+        for matching, open_char in args_spec:
+            close = None
+            if pos < limit and content[pos] == open_char:
+                close = matching.get(pos)
+            if close is None or close >= limit:
+                values.append(None)
+                spans.append(None)
+                spans.append(None)
                 continue
-            try:
-                offset = entryDict[args_name + "_region"].begin()
-            except KeyError:
-                continue
-            yield from _generate_entries(em, file_name, offset=offset)
+            values.append(content[pos + 1 : close])
+            spans.append(pos + 1 - start)
+            spans.append(close - start)
+            args_ends.append(close)
+            end = close + 1
+            pos = separator_match(content, end, limit).end()
+
+        spans = tuple(spans)
+        spans = shared_spans.setdefault(spans, spans)
+        values.append(file_name)
+        values.append(content[start:end])
+        values.append(start + offset)
+        values.append(spans)
+        group.append(CommandEntry._make(values))
 
+        # the commands in the arguments are nested in this one
+        enclosing.extend(reversed(args_ends))
 
-def analyze_document(tex_root):
+    if group:
+        yield tuple(group)
+
+
+def analyze_document(tex_root, workers=None):
     """
     Analyzes the document
 
@@ -394,6 +621,8 @@ def analyze_document(tex_root):
     tex_root -- the path to the tex root as a string
                 if you use the view instead, the tex root will be extracted
                 automatically
+    workers -- the number of threads parsing the files of the document,
+               defaults to the analysis.parallel_workers setting
 
     Returns:
     An Analysis of the view, which contains all relevant information and
@@ -408,12 +637,364 @@ def analyze_document(tex_root):
     elif not isinstance(tex_root, str):
         raise TypeError("tex_root must be a string or view")
 
-    result = _analyze_tex_file(tex_root)
+    previous = _get_previous_analysis(tex_root)
+    ana = Analysis(tex_root)
+    if workers is None:
+        workers = _get_parallel_workers()
+    if workers > 1:
+        ana._state["prefetched"] = _prefetch_files(tex_root, previous, workers)
+    result = _analyze_tex_file(tex_root, ana=ana, previous=previous)
     if result:
         result._freeze()
+        _remember_analysis(result)
+        include_index.update(tex_root, result._content)
     return result
 
 
+def analyze_preamble(tex_root):
+    """
+    Analyzes the preamble of the document, i.e. the commands of the tex root
+    and of the included files up to \\begin{document}
+
+    Arguments:
+    tex_root -- the path to the tex root as a string
+                if you use the view instead, the tex root will be extracted
+                automatically
+
+    Returns:
+    An Analysis of the preamble
+    """
+    if not tex_root:
+        return
+    if isinstance(tex_root, sublime.View):
+        tex_root = get_tex_root(tex_root)
+        if not tex_root:
+            return
+    elif not isinstance(tex_root, str):
+        raise TypeError("tex_root must be a string or view")
+
+    # the files of the full analysis can be reused, but not vice versa
+    previous = _get_previous_analysis(tex_root)
+    result = _analyze_tex_file(tex_root, only_preamble=True, previous=previous)
+    if result:
+        result._freeze()
+    return result
+
+
+def update_analysis(ana, file_name, raw_content):
+    """
+    Creates the analysis of the document with a changed content of one of
+    its files, e.g. the unsaved content of a view
+
+    Only the changed paragraphs of the file are parsed again and the other
+    files are not read again, unless the changes include other files. If
+    the file has not been analyzed, the whole document is analyzed again.
+
+    Arguments:
+    ana -- the analysis of the document before the change
+    file_name -- the name of the changed file
+    raw_content -- the new content of the file
+
+    Returns:
+    The new Analysis
+    """
+    file_name = _normalize_file_name(file_name)
+    # analyses loaded from older caches don't store their files
+    parsed = getattr(ana, "_files", {}).get(file_name)
+    if parsed is None:
+        return analyze_document(ana._tex_root)
+    if parsed.raw_content == raw_content:
+        return ana
+
+    parsed_files = dict(ana._files)
+    parsed_files[file_name] = _reparse_file(parsed, file_name, raw_content)
+    result = Analysis(ana._tex_root)
+    result._state["parsed_files"] = parsed_files
+    # the cached analysis is only valid as long as the content is unsaved
+    result._unsaved_files = getattr(ana, "_unsaved_files", frozenset()) | {file_name}
+    result = _analyze_tex_file(ana._tex_root, ana=result, previous=ana)
+    result._freeze()
+    _remember_analysis(result)
+    include_index.update(result._tex_root, result._content)
+    return result
+
+
+_previous_analyses = collections.OrderedDict()
+_previous_analyses_lock = threading.Lock()
+
+
+def _remember_analysis(ana):
+    with _previous_analyses_lock:
+        _previous_analyses[ana._tex_root] = ana
+        _previous_analyses.move_to_end(ana._tex_root)
+        while len(_previous_analyses) > _MAX_PREVIOUS_ANALYSES:
+            _previous_analyses.popitem(last=False)
+
+
+def _get_previous_analysis(tex_root):
+    with _previous_analyses_lock:
+        return _previous_analyses.get(tex_root)
+
+
+def _get_parallel_workers():
+    """
+    returns the analysis.parallel_workers setting, 1 meaning serial analysis
+    """
+    try:
+        return max(int(get_setting("analysis.parallel_workers", 1)), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def _normalize_file_name(file_name):
+    # if the file name has no extension use ".tex"
+    if not os.path.splitext(file_name)[1]:
+        file_name += ".tex"
+    return os.path.normpath(file_name)
+
+
+def _included_files(tex_root, parsed, base_path):
+    """
+    returns the files, which the analysis walks into from the parsed file,
+    as tuples of (file name, base path of the file)
+    """
+    root_path = os.path.dirname(tex_root)
+    for entries in parsed.matches:
+        entry = entries[0]
+        cmd = entry.command
+        args = entry.args
+        if args is None:
+            continue
+
+        # the same files as the walk of _analyze_tex_file()
+        if cmd in _input_commands:
+            args2 = entry.args2
+            if args2 is None:
+                open_file = decode_path(args.strip('"'), base_path)
+                if open_file:
+                    yield open_file, root_path
+            elif args2.strip('"'):
+                if cmd.startswith("sub"):
+                    import_path = decode_path(args.strip('"'), base_path)
+                else:
+                    import_path = decode_path(args.strip('"'))
+                open_file = decode_path(args2.strip('"'), import_path)
+                if open_file:
+                    yield open_file, import_path or root_path
+
+        elif cmd in ("documentclass", "usepackage"):
+            fn = decode_path(os.path.splitext(args.strip('"'))[0], base_path)
+            if fn:
+                for ext in (".cls",) if cmd == "documentclass" else (".sty", ".tex"):
+                    if os.path.isfile(fn + ext):
+                        yield fn + ext, root_path
+                        break
+
+
+def _prefetch_file(tex_root, file_name, base_path, previous):
+    with InputRecorder() as recorder:
+        parsed = _parse_file(file_name, None, previous)
+    return (
+        parsed,
+        tuple(recorder.inputs.values()),
+        tuple(_included_files(tex_root, parsed, base_path)),
+    )
+
+
+def _prefetch_files(tex_root, previous, workers):
+    """
+    discovers the files of the document and parses them concurrently
+
+    the serial walk of the analysis then only stitches the results together
+    in document order; files missed here, e.g. because they cannot be read,
+    are handled by the walk as usual
+
+    :returns:
+        a dict of file name -> (_ParsedFile, recorded input fingerprints)
+    """
+    prefetched = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        seen = set()
+
+        def submit(file_name, base_path):
+            file_name = _normalize_file_name(file_name)
+            if file_name not in seen:
+                seen.add(file_name)
+                future = pool.submit(_prefetch_file, tex_root, file_name, base_path, previous)
+                pending[future] = file_name
+
+        submit(tex_root, os.path.dirname(tex_root))
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_name = pending.pop(future)
+                try:
+                    parsed, inputs, included = future.result()
+                except Exception:
+                    continue
+                prefetched[file_name] = (parsed, inputs)
+                for included_file, base_path in included:
+                    submit(included_file, base_path)
+
+    return prefetched
+
+
+def _parse_file(file_name, ana, previous=None, only_preamble=False):
+    """
+    reads and parses the file; the result of the previous analysis or of an
+    earlier visit in the current analysis is reused, if the content of the
+    file is unchanged
+    """
+    if ana is not None and "parsed_files" in ana._state:
+        # the files of a live update are not read again
+        parsed = ana._state["parsed_files"].get(file_name)
+        if parsed is not None and (parsed.complete or only_preamble):
+            if file_name in ana._unsaved_files:
+                record_unsaved_input(file_name)
+            else:
+                record_input(file_name)
+            return parsed
+
+    if ana is not None and "prefetched" in ana._state:
+        try:
+            parsed, inputs = ana._state["prefetched"].pop(file_name)
+        except KeyError:
+            pass
+        else:
+            InputRecorder.add(inputs)
+            return parsed
+
+    raw_content = _read_file(file_name)
+    content_hash = hash_digest(raw_content)
+
+    for source in (ana, previous):
+        if source is None:
+            continue
+        # analyses loaded from older caches don't store their files
+        parsed = getattr(source, "_files", {}).get(file_name)
+        if (
+            parsed is not None
+            and parsed.content_hash == content_hash
+            and (parsed.complete or only_preamble)
+        ):
+            return parsed
+
+    return _parse_content(file_name, raw_content, content_hash, only_preamble)
+
+
+def _parse_content(file_name, raw_content, content_hash, only_preamble=False):
+    content = _strip_comments(raw_content)
+    matches = []
+    scanned = content
+    if only_preamble:
+        # only scan up to \begin{document}, if no argument can reach beyond
+        # it; the arguments following \begin{document} are omitted then
+        m = _RE_BEGIN_DOCUMENT.search(content)
+        if m and _is_balanced(content, m.start()):
+            scanned = content[: m.end()]
+    for group in _scan_commands(scanned, file_name):
+        # precancel if we only parse the preamble (for subfiles)
+        if only_preamble and group[0].command == "begin" and group[0].args == "document":
+            matches.append(group[:1])
+            complete = False
+            break
+        matches.append(group)
+    else:
+        complete = scanned is content
+    return _ParsedFile(content_hash, raw_content, content, tuple(matches), complete)
+
+
+def _common_prefix_length(a, b):
+    # compare slices in halving steps, which is much faster than comparing
+    # the characters one by one
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_length(a, b, max_length):
+    lo, hi = 0, max_length
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid : len(a) - lo] == b[len(b) - mid : len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _paragraph_start(content, pos):
+    # a paragraph starts with the second line break of an empty line
+    return content.rfind("\n\n", 0, pos) + 1
+
+
+def _paragraph_end(content, pos):
+    end = content.find("\n\n", pos)
+    return len(content) if end == -1 else end + 1
+
+
+def _shift_entry(entry, delta):
+    return CommandEntry._make((*entry[:-2], entry.start + delta, entry.spans))
+
+
+def _reparse_file(parsed, file_name, raw_content):
+    """
+    parses the changed content of a file and reuses the commands of the
+    parsed file outside of the changed paragraphs
+
+    Paragraphs are separated by empty lines. The changed paragraphs are
+    extended, such that no command crosses their bounds. If a bracket
+    opened in the paragraphs or before them is not closed in them resp.
+    before them, the whole content is parsed again, as an argument could
+    reach beyond the paragraphs.
+    """
+    content_hash = hash_digest(raw_content)
+    old_raw_content = parsed.raw_content
+    if not parsed.complete:
+        return _parse_content(file_name, raw_content, content_hash, only_preamble=True)
+
+    prefix = _common_prefix_length(old_raw_content, raw_content)
+    suffix = _common_suffix_length(
+        old_raw_content, raw_content, min(len(old_raw_content), len(raw_content)) - prefix
+    )
+    delta = len(raw_content) - len(old_raw_content)
+
+    # the changed paragraphs in the positions of the old content
+    start = _paragraph_start(old_raw_content, prefix)
+    end = _paragraph_end(old_raw_content, len(old_raw_content) - suffix)
+    matches = parsed.matches
+    starts = [group[0].start for group in matches]
+    while True:
+        i = bisect.bisect_left(starts, start) - 1
+        if i >= 0 and matches[i][0].end > start:
+            start = _paragraph_start(old_raw_content, starts[i])
+            continue
+        i = bisect.bisect_left(starts, end) - 1
+        if i >= 0 and matches[i][0].end > end:
+            end = _paragraph_end(old_raw_content, matches[i][0].end)
+            continue
+        break
+
+    region = _strip_comments(raw_content[start : end + delta])
+    if not _is_balanced(region, len(region)) or not _is_balanced(parsed.content, start):
+        return _parse_content(file_name, raw_content, content_hash)
+
+    first = bisect.bisect_left(starts, start)
+    last = bisect.bisect_left(starts, end)
+    after = matches[last:]
+    if delta:
+        after = tuple(tuple(_shift_entry(entry, delta) for entry in group) for group in after)
+    matches = matches[:first] + tuple(_scan_commands(region, file_name, start)) + after
+    content = parsed.content[:start] + region + parsed.content[end:]
+    return _ParsedFile(content_hash, raw_content, content, matches, True)
+
+
 def _analyze_tex_file(
     tex_root,
     file_name=None,
@@ -421,17 +1002,15 @@ def _analyze_tex_file(
     ana=None,
     import_path=None,
     only_preamble=False,
+    previous=None,
 ):
     # init ana and the file name
     if not ana:
         ana = Analysis(tex_root)
     if not file_name:
-        file_name = tex_root
-    # if the file name has no extension use ".tex"
-    elif not os.path.splitext(file_name)[1]:
-        file_name += ".tex"
-    # normalize the path
-    file_name = os.path.normpath(file_name)
+        file_name = os.path.normpath(tex_root)
+    else:
+        file_name = _normalize_file_name(file_name)
     # ensure not to go into infinite recursion
     if file_name in process_file_stack:
         logger.error(f"File appears cyclic: {file_name}\n{process_file_stack}")
@@ -450,9 +1029,9 @@ def _analyze_tex_file(
         else:
             ana._import_base_paths[file_name] = base_path
 
-    # read the content from the file
+    # read and parse the content from the file
     try:
-        raw_content, content = _preprocess_file(file_name)
+        parsed = _parse_file(file_name, ana, previous, only_preamble)
     except FileNotFoundError:
         logger.info(f"{file_name} not found! Continuing...")
         return ana
@@ -462,30 +1041,34 @@ def _analyze_tex_file(
         logger.info("Continuing...")
         return ana
 
-    ana._content[file_name] = content
-    ana._raw_content[file_name] = raw_content
+    ana._content[file_name] = parsed.content
+    ana._raw_content[file_name] = parsed.raw_content
+    if file_name not in ana._files or parsed.complete:
+        ana._files[file_name] = parsed
 
-    for m in _RE_COMMAND.finditer(content):
+    for entries in parsed.matches:
         # TODO maybe also handle all generated entries
-        g = m.group
+        entry = entries[0]
+        cmd = entry.command
+        args = entry.args
 
         # precancel if we only parse the preamble (for subfiles)
-        if only_preamble and g("command") == "begin" and g("args") == "document":
+        if only_preamble and cmd == "begin" and args == "document":
             ana._state["preamble_finished"] = True
             return ana
 
-        ana._extend_commands(_generate_entries(m, file_name))
-        cmd = g("command")
-        args = g("args")
+        ana._extend_commands(entries)
 
         # read child files if it is an input command
         if cmd in _input_commands and args is not None:
-            args2 = g("args2")
+            args2 = entry.args2
             if args2 is None:
-                process_file_stack.append(file_name)
                 open_file = decode_path(args.strip('"'), base_path)
                 if open_file:
-                    _analyze_tex_file(tex_root, open_file, process_file_stack, ana)
+                    process_file_stack.append(file_name)
+                    _analyze_tex_file(
+                        tex_root, open_file, process_file_stack, ana, previous=previous
+                    )
                     process_file_stack.pop()
                     # check that we still need to analyze
                     if only_preamble and ana._state.get("preamble_finished", False):
@@ -507,6 +1090,7 @@ def _analyze_tex_file(
                         ana,
                         import_path=next_import_path,
                         only_preamble=only_preamble,
+                        previous=previous,
                     )
                     process_file_stack.pop()
                     # check that we still need to analyze
@@ -520,7 +1104,7 @@ def _analyze_tex_file(
             # and have the command \documentclass[main.tex]{subfiles}
             # analyze the root file
             if tex_root != file_name and args == "subfiles":
-                main_file = decode_path(g("optargs"), base_path)
+                main_file = decode_path(entry.optargs, base_path)
                 if main_file:
                     process_file_stack.append(file_name)
                     _analyze_tex_file(
@@ -530,6 +1114,7 @@ def _analyze_tex_file(
                         ana,
                         import_path=None,
                         only_preamble=True,
+                        previous=previous,
                     )
                     process_file_stack.pop()
                     try:
@@ -547,7 +1132,9 @@ def _analyze_tex_file(
                         open_file = fn + ext
                         if os.path.isfile(open_file):
                             process_file_stack.append(file_name)
-                            _analyze_tex_file(tex_root, open_file, process_file_stack, ana)
+                            _analyze_tex_file(
+                                tex_root, open_file, process_file_stack, ana, previous=previous
+                            )
                             process_file_stack.pop()
                             break
 
@@ -564,7 +1151,9 @@ def _analyze_tex_file(
                     open_file = fn + ext
                     if os.path.isfile(open_file):
                         process_file_stack.append(file_name)
-                        _analyze_tex_file(tex_root, open_file, process_file_stack, ana)
+                        _analyze_tex_file(
+                            tex_root, open_file, process_file_stack, ana, previous=previous
+                        )
                         process_file_stack.pop()
                         break
 
@@ -580,47 +1169,112 @@ def _preprocess_file(file_name):
     reads and preprocesses a file, return the raw content
     and the content without comments
     """
-    raw_content = utils.get_file_content(file_name, force_lf_endings=True)
+    raw_content = _read_file(file_name)
+    return raw_content, _strip_comments(raw_content)
+
+
+def _read_file(file_name):
+    # the content of a modified view is only valid until it is saved,
+    # reverted or closed, the content of the file as long as it is unchanged
+    view = utils.get_open_view(file_name)
+    if view is not None and view.is_dirty():
+        record_unsaved_input(file_name)
+        return view.substr(sublime.Region(0, view.size()))
+    record_input(file_name)
+    return utils.get_file_content(file_name, force_lf_endings=True)
+
 
+def _blank(m):
+    return " " * (m.end() - m.start())
+
+
+def _strip_comments(raw_content):
     # replace all comments with spaces to not change the position
     # of the rest
-    comments = [c for c in _RE_COMMENT.finditer(raw_content)]
-    content = list(raw_content)
-    for m in comments:
-        for i in range(m.start(), m.end()):
-            content[i] = " "
-    content = "".join(content)
-    return raw_content, content
+    if "%" not in raw_content:
+        return raw_content
+    return _RE_COMMENT.sub(_blank, raw_content, concurrent=True)
+
+
+def make_line_offsets(string):
+    """
+    Creates the offsets of the lines of a string
+
+    Arguments:
+    string -- The string with the lines
+
+    Returns:
+    An array with the start position of each line followed by the length
+    of the string plus one
+    """
+    return array("I", itertools.accumulate((len(x) + 1 for x in string.split("\n")), initial=0))
 
 
-def make_rowcol(string):
+def make_rowcol(string=None, line_offsets=None):
     """
     Creates a rowcol function similar to the rowcol function of a view
 
     Arguments:
     string -- The string on which the rowcol function should hold
+    line_offsets -- The line offsets of the string, if they are already
+        known (see make_line_offsets)
 
     Returns:
     A function similar to the rowcol function of a sublime text view
     """
-    rowlens = [len(x) + 1 for x in string.split("\n")]
-    rowpos = []
-    acc = 0
-    for i in rowlens:
-        acc += i
-        rowpos.append(acc)
+    if line_offsets is None:
+        line_offsets = make_line_offsets(string)
+    end = line_offsets[-1]
+    bisect_right = bisect.bisect_right
 
     def rowcol(pos):
-        last = 0
-        for i, k in enumerate(rowpos, 0):
-            if pos < k:
-                return (i, pos - last)
-            last = k
-        return (-1, -1)
+        if pos >= end:
+            return (-1, -1)
+        row = max(bisect_right(line_offsets, pos) - 1, 0)
+        return (row, pos - line_offsets[row])
 
     return rowcol
 
 
+def _group_region(i):
+    def region(self):
+        begin = self.spans[2 * i]
+        if begin is None:
+            return sublime.Region(-1, -1)
+        return sublime.Region(self.start + begin, self.start + self.spans[2 * i + 1])
+
+    return property(region, doc=f"the region of the {_ENTRY_GROUPS[i]} part")
+
+
+@immutable
+class CommandEntry(
+    collections.namedtuple("CommandEntry", _ENTRY_GROUPS + ("file_name", "text", "start", "spans"))
+):
+    """
+    A command found in the document
+
+    See the top of this module for the attributes. In addition to them,
+    spans contains the begin and end of each part relative to the start of
+    the entry, from which the regions are created.
+    """
+
+    __slots__ = ()
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+    @property
+    def region(self):
+        return sublime.Region(self.start, self.end)
+
+
+for _i, _name in enumerate(_ENTRY_GROUPS):
+    setattr(CommandEntry, _name + "_region", _group_region(_i))
+del _i, _name
+
+
+@immutable
 class objectview:
     """
     Converts an dict into an object, such that every dict entry
@@ -4,6 +4,8 @@ import traceback
 
 from . import bibformat
 from . import cache
+from . import cache_store
+from . import io_executor
 from .logging import logger
 from .settings import get_setting
 
@@ -27,12 +29,15 @@ class BibCache(cache.InstanceTrackingCache, cache.GlobalCache):
 
     def __init__(self, bib_plugin_name, bib_file):
         self._inst_name = (bib_plugin_name, bib_file)
-        super(BibCache, self).__init__()
 
         file_hash = cache.hash_digest(bib_file)
         self.bib_file = bib_file
         self.cache_name = f"bib_{bib_plugin_name}_{file_hash}"
         self.formatted_cache_name = f"bib_{bib_plugin_name}_fmt_{file_hash}"
+        # records the bib file, so that caches of removed files can be found
+        self.source_name = self.cache_name + ".source"
+
+        super(BibCache, self).__init__()
 
     def get(self):
         try:
@@ -51,17 +56,20 @@ class BibCache(cache.InstanceTrackingCache, cache.GlobalCache):
     def set(self, bib_entries):
         def _write_bib_cache():
             with self._disk_lock:
-                os.makedirs(self.cache_path, exist_ok=True)
-                self._write(self.cache_name, {self.cache_name: bib_entries})
+                try:
+                    self._store.commit(
+                        {self.cache_name: bib_entries, self.source_name: self.bib_file}
+                    )
+                except cache_store.StoreError as e:
+                    logger.error(f"error while writing to {self.cache_name}: {e}")
 
         # write bib_entries to disk
-        self._pool.apply_async(_write_bib_cache)
+        io_executor.submit(_write_bib_cache)
 
         formatted_entries = self._create_formatted_entries(bib_entries)
 
         with self._write_lock:
-            self._objects[self.formatted_cache_name] = formatted_entries
-            self._dirty = True
+            self._put(self.formatted_cache_name, formatted_entries)
         self._schedule_save()
 
         return formatted_entries[1]
@@ -96,6 +104,13 @@ class BibCache(cache.InstanceTrackingCache, cache.GlobalCache):
 
         return formatted_entries
 
+    def _get_label(self):
+        return self.bib_file
+
+    def _get_store_name(self):
+        # each bibliography is stored separately from the global cache
+        return self.cache_name
+
     def _get_inst_key(self, *args, **kwargs):
         if not hasattr(self, "_inst_name"):
             if len(args) > 1:
@@ -107,7 +122,7 @@ class BibCache(cache.InstanceTrackingCache, cache.GlobalCache):
 
     def _get_bib_cache(self):
         try:
-            cache_mtime = os.path.getmtime(os.path.join(self.cache_path, self.cache_name))
+            cache_mtime = self._store.timestamp(self.cache_name)
 
             bib_mtime = os.path.getmtime(self.bib_file)
         except Exception:
@@ -119,8 +134,7 @@ class BibCache(cache.InstanceTrackingCache, cache.GlobalCache):
         bib_entries = self._read(self.cache_name)
         formatted_entries = self._create_formatted_entries(bib_entries)
         with self._write_lock:
-            self._objects[self.formatted_cache_name] = formatted_entries
-            self._dirty = True
+            self._put(self.formatted_cache_name, formatted_entries)
         self._schedule_save()
 
         return formatted_entries
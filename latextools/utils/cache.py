@@ -1,20 +1,25 @@
 import collections
 import copy
 import hashlib
+import itertools
 import os
-import pickle
 import re
-import shutil
+import sys
 import threading
 import time
 import traceback
 
+from collections.abc import Mapping
+from functools import partial
+
 import sublime
 
 from ...vendor.frozendict import frozendict
+from . import cache_stats
+from . import cache_store
+from . import io_executor
 from .logging import logger
 from .settings import get_setting
-from .utils import ThreadPool
 
 # the folder, if the local cache is not hidden, i.e. folder in the same
 # folder as the tex root
@@ -41,6 +46,31 @@ class CacheMiss(Exception):
     pass
 
 
+# types, whose instances are never modified once they are stored in a cache;
+# a cache hit returns the stored instance of these types instead of a copy
+_IMMUTABLE_TYPES = {
+    str,
+    bytes,
+    int,
+    float,
+    bool,
+    type(None),
+    tuple,
+    frozenset,
+    frozendict,
+}
+
+
+def immutable(cls):
+    """
+    class decorator, which declares that instances of the class are never
+    modified once they are stored in a cache, so that they can be shared
+    by all readers without being copied
+    """
+    _IMMUTABLE_TYPES.add(cls)
+    return cls
+
+
 def hash_digest(text):
     """
     Create the hash digest for a text. These digest can be used to
@@ -195,6 +225,370 @@ class InvalidObject:
         return not cls == other
 
 
+# number of items of a container used to estimate its size
+_SIZE_SAMPLE = 64
+
+
+def _approximate_size(obj, depth=4):
+    """
+    estimates the memory used by an object and the objects it references
+
+    large containers are sampled, so the result is only an approximation,
+    but it is cheap enough to be calculated whenever an entry is cached
+    """
+    size = sys.getsizeof(obj, 64)
+    if depth == 0 or isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+
+    if isinstance(obj, frozendict):
+        # avoid the copies frozendict creates on item access
+        obj = obj._dict
+        size += sys.getsizeof(obj, 64)
+
+    if isinstance(obj, Mapping):
+        items = list(itertools.chain.from_iterable(itertools.islice(obj.items(), _SIZE_SAMPLE)))
+        count = 2 * len(obj)
+    elif isinstance(obj, (tuple, list, set, frozenset)):
+        items = list(itertools.islice(obj, _SIZE_SAMPLE))
+        count = len(obj)
+    elif hasattr(obj, "__dict__"):
+        items = [vars(obj)]
+        count = 1
+    elif hasattr(obj, "__slots__"):
+        items = [getattr(obj, s, None) for s in obj.__slots__]
+        count = len(items)
+    else:
+        return size
+
+    if items:
+        sample = sum(_approximate_size(item, depth - 1) for item in items)
+        size += sample * count // len(items)
+    return size
+
+
+class _ResidentEntries:
+    """
+    keeps track of all entries held in memory by any cache and evicts the
+    least recently used ones once their approximate size exceeds the
+    cache.memory_budget setting
+
+    only entries, which have been saved to disk, are evicted; they are
+    transparently re-read from disk the next time they are requested; the
+    entries a cache is managed with are never tracked
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (id(state), key) -> [state, label, key, size, last access]
+        self._entries = collections.OrderedDict()
+        self._size = 0
+
+    def add(self, cache, key, obj):
+        if cache._is_pinned(key):
+            return
+        state = vars(cache)
+        size = _approximate_size(obj)
+        with self._lock:
+            old = self._entries.pop((id(state), key), None)
+            if old is not None:
+                self._size -= old[3]
+            self._entries[(id(state), key)] = [state, cache._get_label(), key, size, time.time()]
+            self._size += size
+
+    def touch(self, cache, key):
+        entry_key = (id(cache.__dict__), key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                return
+            entry[4] = now
+            self._entries.move_to_end(entry_key)
+
+    def remove(self, cache, key):
+        with self._lock:
+            old = self._entries.pop((id(vars(cache)), key), None)
+            if old is not None:
+                self._size -= old[3]
+
+    def forget(self, cache):
+        """
+        stops tracking all entries of the cache state
+        """
+        state_id = id(vars(cache))
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == state_id]:
+                self._size -= self._entries.pop(entry_key)[3]
+
+    def enforce(self):
+        """
+        evicts the least recently used entries until the memory budget is met
+        """
+        budget = _get_memory_budget()
+        if not budget or self._size <= budget:
+            return
+
+        with self._lock:
+            for entry_key, entry in list(self._entries.items()):
+                if self._size <= budget:
+                    break
+
+                state, _, key = entry[:3]
+                # never block here, the write lock might be held by a thread
+                # waiting for this tracker
+                write_lock = state["_write_lock"]
+                if not write_lock.acquire(blocking=False):
+                    continue
+                try:
+                    # unsaved entries cannot be restored from disk
+                    if key in state["_dirty_keys"]:
+                        continue
+                    state["_objects"].pop(key, None)
+                finally:
+                    write_lock.release()
+
+                del self._entries[entry_key]
+                self._size -= entry[3]
+                logger.debug(f"evicted {key} of {entry[1]} from memory")
+
+    def report(self):
+        """
+        returns a tuple of (label, key, size, last access) of all entries
+        from the most to the least recently used entry
+        """
+        with self._lock:
+            return tuple(tuple(e[1:]) for e in reversed(self._entries.values()))
+
+    def size(self):
+        return self._size
+
+
+_resident = _ResidentEntries()
+
+
+def resident_entries():
+    """
+    returns a tuple of (label, key, approximate size, last access) for all
+    cache entries currently held in memory, the most recently used first
+    """
+    return _resident.report()
+
+
+def resident_size():
+    """
+    returns the approximate size of all cache entries held in memory
+    """
+    return _resident.size()
+
+
+def _get_memory_budget():
+    """
+    returns the cache.memory_budget setting in bytes, 0 meaning unlimited
+    """
+    try:
+        return max(int(get_setting("cache.memory_budget", 0)), 0) * 1024 * 1024
+    except (TypeError, ValueError):
+        return 0
+
+
+class InputRecorder:
+    """
+    context manager recording the files a cached value is derived from
+
+    every file reported with record_input() while the recorder is active is
+    fingerprinted and added to the innermost recorder of the current thread;
+    recorders nest, i.e. the inputs of an inner recorder are inputs of the
+    enclosing recorders as well
+    """
+
+    _local = threading.local()
+
+    def __init__(self):
+        # file name -> fingerprint
+        self.inputs = {}
+
+    def __enter__(self):
+        self._stack().append(self)
+        return self
+
+    def __exit__(self, *exc):
+        stack = self._stack()
+        stack.pop()
+        if stack:
+            self.add(self.inputs.values())
+
+    @classmethod
+    def _stack(cls):
+        try:
+            return cls._local.stack
+        except AttributeError:
+            stack = cls._local.stack = []
+            return stack
+
+    @classmethod
+    def add(cls, fingerprints):
+        """
+        adds already recorded fingerprints to the active recorder
+        """
+        stack = cls._stack()
+        if stack:
+            inputs = stack[-1].inputs
+            for fingerprint in fingerprints:
+                # a value derived from unsaved content is never valid for
+                # the saved file
+                if fingerprint[3] == _UNSAVED_DIGEST:
+                    inputs[fingerprint[0]] = fingerprint
+                else:
+                    inputs.setdefault(fingerprint[0], fingerprint)
+
+
+def record_input(file_name):
+    """
+    reports that the value currently computed for a LocalCache depends on
+    the given file; does nothing if no value is being computed
+
+    the file SHOULD be reported before it is read, so that a change during
+    the computation is detected by the next validation
+
+    :param file_name:
+        the path of the file; the file need not exist
+    """
+    stack = InputRecorder._stack()
+    if stack and file_name not in stack[-1].inputs:
+        stack[-1].inputs[file_name] = _fingerprint(file_name)
+
+
+# the digest of the fingerprints of unsaved content
+_UNSAVED_DIGEST = "unsaved"
+# the files, whose unsaved content cached values may be derived from
+_unsaved_files = set()
+# the time the unsaved content of a file has been discarded last
+_last_discard = 0
+
+
+def record_unsaved_input(file_name):
+    """
+    reports that the value currently computed for a LocalCache depends on
+    the unsaved content of the given file, e.g. of a view
+
+    unlike the fingerprint of the saved file, the recorded fingerprint only
+    stays valid until discard_unsaved_input() is called for the file and
+    never after a restart
+
+    :param file_name:
+        the path of the file
+    """
+    _unsaved_files.add(file_name)
+    stack = InputRecorder._stack()
+    if stack:
+        stack[-1].inputs[file_name] = (file_name, None, None, _UNSAVED_DIGEST)
+
+
+def discard_unsaved_input(file_name):
+    """
+    invalidates the cached values derived from the unsaved content of the
+    file, e.g. when its view is closed or reverted without saving it
+
+    :param file_name:
+        the path of the file as passed to record_unsaved_input()
+    """
+    global _last_discard
+
+    if file_name in _unsaved_files:
+        _unsaved_files.discard(file_name)
+        _last_discard = time.time()
+
+
+def _fingerprint(file_name):
+    """
+    returns a tuple of (file_name, mtime, size, digest) describing the
+    current state of the file; mtime and size are None if it doesn't exist,
+    the digest is only calculated if the cache.validate_checksum setting is
+    enabled
+    """
+    try:
+        st = os.stat(file_name)
+    except OSError:
+        return (file_name, None, None, None)
+
+    digest = None
+    if get_setting("cache.validate_checksum", False):
+        digest = _file_digest(file_name)
+
+    return (file_name, st.st_mtime_ns, st.st_size, digest)
+
+
+def _file_digest(file_name):
+    digest = hashlib.md5()
+    try:
+        with open(file_name, "rb") as f:
+            for chunk in iter(partial(f.read, 65536), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _is_unchanged(fingerprint):
+    file_name, mtime, size, digest = fingerprint
+    if digest == _UNSAVED_DIGEST:
+        return file_name in _unsaved_files
+    try:
+        st = os.stat(file_name)
+    except OSError:
+        return mtime is None
+
+    if mtime is None or st.st_size != size:
+        return False
+
+    if st.st_mtime_ns == mtime:
+        return True
+
+    # only touched, but not modified
+    return digest is not None and _file_digest(file_name) == digest
+
+
+class _Flight:
+    """
+    a computation of a cache entry in progress, which other callers
+    requesting the same entry can wait for
+    """
+
+    def __init__(self):
+        self.owner = threading.get_ident()
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def resolve(self, result):
+        self._result = result
+        self._done.set()
+
+    def fail(self, error):
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+# key -> number of computations saved by waiting for a computation in progress
+_deduplicated = collections.Counter()
+_deduplicated_lock = threading.Lock()
+
+
+def deduplicated_computations():
+    """
+    returns a dict of the keys and the number of computations, which were
+    saved by waiting for the same computation already in progress
+    """
+    with _deduplicated_lock:
+        return dict(_deduplicated)
+
+
 class Cache:
     """
     default cache object and definition
@@ -219,12 +613,16 @@ class Cache:
             self._objects = {}
         if not hasattr(self, "_dirty"):
             self._dirty = False
-        if not hasattr(self, "_save_queue"):
-            self._save_queue = 0
-        if not hasattr(self, "_pool"):
-            self._pool = ThreadPool(2)
+        if not hasattr(self, "_dirty_keys"):
+            self._dirty_keys = set()
+        if not hasattr(self, "_flights"):
+            self._flights = {}
+        if not hasattr(self, "_flight_lock"):
+            self._flight_lock = threading.Lock()
 
         self.cache_path = self._get_cache_path()
+        if not hasattr(self, "_store"):
+            self._store = cache_store.get_store(self.cache_path, self._get_store_name())
 
     def get(self, key):
         """
@@ -238,22 +636,32 @@ class Cache:
         if key is None:
             raise ValueError("key cannot be None")
 
+        start = time.perf_counter()
         try:
-            result = self._objects[key]
-        except KeyError:
-            # note: will raise CacheMiss if can't be found
-            result = self.load(key)
+            try:
+                result = self._objects[key]
+            except KeyError:
+                # note: will raise CacheMiss if can't be found
+                result = self.load(key)
+            else:
+                _resident.touch(self, key)
 
-        if result == InvalidObject:
-            raise CacheMiss(f"{key} is invalid")
+            if result == InvalidObject:
+                raise CacheMiss(f"{key} is invalid")
+        except CacheMiss:
+            cache_stats.add_get(key, False, time.perf_counter() - start)
+            raise
 
-        # return a copy of any objects
-        try:
-            if hasattr(result, "__dict__") or hasattr(result, "__slots__"):
-                result = copy.copy(result)
-        except Exception:
-            pass
+        # immutable values are shared, other objects are copied to protect
+        # the cached value from changes
+        if type(result) not in _IMMUTABLE_TYPES:
+            try:
+                if hasattr(result, "__dict__") or hasattr(result, "__slots__"):
+                    result = copy.copy(result)
+            except Exception:
+                pass
 
+        cache_stats.add_get(key, True, time.perf_counter() - start)
         return result
 
     def has(self, key):
@@ -276,7 +684,10 @@ class Cache:
             the key to store the value under
 
         :param obj:
-            the value to store; note that obj *must* be picklable
+            the value to store; note that obj *must* be picklable and MUST
+            NOT be modified afterwards; lists, dicts and sets are converted
+            to their immutable counterparts, instances of classes declared
+            with @immutable are returned as they are by get()
         """
         if key is None:
             raise ValueError("key cannot be None")
@@ -289,8 +700,7 @@ class Cache:
             obj = frozenset(obj)
 
         with self._write_lock:
-            self._objects[key] = obj
-            self._dirty = True
+            self._put(key, obj)
         self._schedule_save()
 
     def cache(self, key, func):
@@ -312,10 +722,72 @@ class Cache:
         try:
             return self.get(key)
         except Exception:
-            result = func()
-            self.set(key, result)
+            # if the value is already being generated, wait for the result
+            return self._run_flight(key, func, join=True)
+
+    def refresh(self, key, func):
+        """
+        generates the value regardless of the cached one, stores it in the
+        cache and returns it
+
+        callers of cache() requesting the same key while the value is
+        generated wait for this result instead of generating it themselves
+
+        :param key:
+            the key to set
+
+        :param func:
+            a callable that takes no arguments and when invoked will return
+            the proper value
+        """
+        return self._run_flight(key, func, join=False)
+
+    def _run_flight(self, key, func, join):
+        with self._flight_lock:
+            flight = self._flights.get(key)
+            # a recursive request from the computing thread must not wait
+            # for itself
+            if join and flight is not None and flight.owner != threading.get_ident():
+                owner = False
+            else:
+                flight = _Flight()
+                self._flights[key] = flight
+                owner = True
+
+        if not owner:
+            with _deduplicated_lock:
+                _deduplicated[key] += 1
+            result = flight.wait()
+            self._on_flight_joined(key)
             return result
 
+        start = time.perf_counter()
+        try:
+            result = self._compute(key, func)
+        except BaseException as e:
+            flight.fail(e)
+            raise
+        else:
+            flight.resolve(result)
+            return result
+        finally:
+            cache_stats.add("computes", key)
+            cache_stats.add("compute_time", key, time.perf_counter() - start)
+            with self._flight_lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def _compute(self, key, func):
+        result = func()
+        self.set(key, result)
+        return result
+
+    def _on_flight_joined(self, key):
+        """
+        called after waiting for the value of the key being generated by
+        another caller
+        """
+
     def invalidate(self, key=None):
         """
         invalidates either this whole cache, a single entry or a list of
@@ -328,14 +800,25 @@ class Cache:
 
         def _invalidate(key):
             try:
+                if self._objects.get(key) != InvalidObject:
+                    cache_stats.add("invalidations", key)
                 self._objects[key] = InvalidObject
+                self._mark_dirty(key)
+                _resident.remove(self, key)
             except Exception:
                 logger.error(f"error occurred while invalidating {key}")
                 traceback.print_exc()
 
+        if key is None:
+            # entries, which have not been loaded yet, are invalidated too
+            try:
+                stored_keys = self._store.keys()
+            except Exception:
+                stored_keys = ()
+
         with self._write_lock:
             if key is None:
-                for k in self._objects.keys():
+                for k in set(self._objects.keys()).union(stored_keys):
                     _invalidate(k)
             else:
                 if isinstance(key, str):
@@ -349,6 +832,33 @@ class Cache:
     def _get_cache_path(self):
         return _global_cache_path()
 
+    def _get_store_name(self):
+        return "cache"
+
+    def _get_label(self):
+        """
+        a human readable name of the cache, used in reports
+        """
+        return "global"
+
+    def _is_pinned(self, key):
+        """
+        whether the entry is used to manage the cache and therefore must
+        never be evicted from memory
+        """
+        return False
+
+    def _mark_dirty(self, key):
+        # MUST be called with the write lock held
+        self._dirty_keys.add(key)
+        self._dirty = True
+
+    def _put(self, key, obj):
+        # MUST be called with the write lock held
+        self._objects[key] = obj
+        self._mark_dirty(key)
+        _resident.add(self, key, obj)
+
     def load(self, key=None):
         """
         loads the value specified from the disk and stores it in the in-memory
@@ -358,35 +868,49 @@ class Cache:
             the key to load from disk; if None, all entries in the cache
             will be read from disk
         """
+        if key is None:
+            with self._disk_lock:
+                try:
+                    entries = self._store.read_all()
+                except Exception:
+                    logger.error(f"error while loading {self._store.path}")
+                    traceback.print_exc()
+                    return
+
+            with self._write_lock:
+                for k, obj in entries.items():
+                    cache_stats.add("loads", k)
+                    # never override changes, which have not been saved yet
+                    if k not in self._dirty_keys:
+                        self._objects[k] = obj
+                        _resident.add(self, k, obj)
+            _resident.enforce()
+            return
+
+        obj = self._read(key)
+        cache_stats.add("loads", key)
         with self._write_lock:
-            if key is None:
-                for entry in os.listdir(self.cache_path):
-                    if os.path.isfile(entry):
-                        entry_name = os.path.basename(entry)
-                        try:
-                            self._objects[entry_name] = self._read(entry_name)
-                        except Exception:
-                            logger.error(f"error while loading {entry_name}")
+            if key in self._dirty_keys:
+                obj = self._objects[key]
             else:
-                self._objects[key] = self._read(key)
+                self._objects[key] = obj
+                _resident.add(self, key, obj)
+        _resident.enforce()
 
-        if key is not None:
-            return self._objects[key]
+        return obj
 
     def load_async(self, key=None):
         """
-        an async version of load; does the loading in a new thread
+        an async version of load; does the loading in the background
         """
-        self._pool.apply_async(self.load, key)
+        return io_executor.submit(self.load, key)
 
     def _read(self, key):
-        file_path = os.path.join(self.cache_path, key)
         with self._disk_lock:
             try:
-                with open(file_path, "rb") as f:
-                    return pickle.load(f)
+                return self._store.read(key)
             except Exception:
-                raise CacheMiss(f"cannot read cache file {key}")
+                raise CacheMiss(f"cannot read cache entry {key}")
 
     def save(self, key=None):
         """
@@ -402,86 +926,61 @@ class Cache:
         # lock is aquired here so that all keys being flushed reflect the
         # same state; note that this blocks disk reads, but not cache reads
         with self._disk_lock:
-            # operate on a stable copy of the object
+            # collect the changed entries from a stable state of the objects
             with self._write_lock:
-                _objs = self._objects.copy()
-                self._dirty = False
-
-            if key is None:
-                # remove all InvalidObjects
-                delete_keys = [k for k in _objs if _objs[k] == InvalidObject]
-
-                for k in delete_keys:
-                    del _objs[k]
-                    file_path = os.path.join(self.cache_path, k)
-                    try:
-                        os.remove(file_path)
-                    except OSError:
-                        pass
-
-                if _objs:
-                    os.makedirs(self.cache_path, exist_ok=True)
-                    for k in _objs.keys():
-                        try:
-                            self._write(k, _objs)
-                        except Exception:
-                            traceback.print_exc()
-                else:
-                    # cache has been emptied, so remove it
-                    try:
-                        shutil.rmtree(self.cache_path)
-                    except OSError as e:
-                        logger.error(f"error while deleting {self.cache_path}: {e}")
-
-            elif key in _objs:
-                if _objs[key] == InvalidObject:
-                    file_path = os.path.join(self.cache_path, key)
-                    try:
-                        os.remove(file_path)
-                    except OSError as e:
-                        logger.error(f"error while deleting {file_path}: {e}")
+                if key is None:
+                    keys = self._dirty_keys
+                    self._dirty_keys = set()
+                elif key in self._dirty_keys:
+                    keys = {key}
+                    self._dirty_keys.discard(key)
                 else:
-                    os.makedirs(self.cache_path, exist_ok=True)
-                    self._write(key, _objs)
+                    return
+                self._dirty = bool(self._dirty_keys)
+
+                updates = {}
+                deletes = []
+                for k in keys:
+                    obj = self._objects.get(k, InvalidObject)
+                    if obj == InvalidObject:
+                        deletes.append(k)
+                    else:
+                        updates[k] = obj
+
+            # only the changed entries are written; the store removes its
+            # files once it has been emptied
+            try:
+                self._store.commit(updates, deletes)
+            except Exception:
+                logger.error(f"error while saving {self._store.path}")
+                traceback.print_exc()
+                # the entries must neither be lost nor evicted until saved
+                with self._write_lock:
+                    self._dirty_keys |= keys
+                    self._dirty = True
+                self._schedule_save()
+                return
+
+            for k in updates:
+                cache_stats.add("saves", k)
+
+        # saved entries may now be evicted from memory
+        _resident.enforce()
 
     def save_async(self, key=None):
         """
-        an async version of save; does the save in a new thread
+        an async version of save; does the save in the background
         """
-        try:
-            self._pool.apply_async(self.save, key)
-        except ValueError:
-            pass
-
-    def _write(self, key, obj):
-        try:
-            _obj = obj[key]
-        except KeyError:
-            raise CacheMiss()
-
-        try:
-            with open(os.path.join(self.cache_path, key), "wb") as f:
-                pickle.dump(_obj, f, protocol=-1)
-        except OSError as e:
-            logger.error(f"error while writing to {key}: {e}")
-            raise CacheMiss()
+        return io_executor.submit(self.save, key)
 
     def _schedule_save(self):
-        def _debounce():
-            self._save_queue -= 1
-            if self._save_queue > 0:
-                sublime.set_timeout(_debounce, 1000)
-            else:
-                self._save_queue = 0
-                self.save_async()
-
-        self._save_queue += 1
-        sublime.set_timeout(_debounce, 1000)
+        # subsequent changes postpone the pending save of this cache state
+        io_executor.schedule(("save", id(self.__dict__)), self.save)
 
     # ensure cache is saved to disk when removed from memory
     def __del__(self):
-        self.save_async()
-        self._pool.terminate()
+        if getattr(self, "_dirty", False):
+            self._schedule_save()
 
 
 class GlobalCache(Cache):
@@ -548,6 +1047,7 @@ class ValidatingCache(Cache):
             self.validate_on_get(key)
         except ValueError as e:
             self.invalidate()
+            cache_stats.add("misses", key)
             raise CacheMiss(str(e))
 
         return super(ValidatingCache, self).get(key)
@@ -640,8 +1140,9 @@ class InstanceTrackingCache(Cache):
             self._REF_COUNTS[inst_key] = ref_count
 
             if ref_count <= 0:
-                self.save_async()
-                self._pool.terminate()
+                _resident.forget(self)
+                if self._dirty:
+                    self.save_async()
                 del self._REF_COUNTS[inst_key]
                 del self._INSTANCES[inst_key]
                 del self._LOCKS[inst_key]
@@ -658,24 +1159,157 @@ class LocalCache(ValidatingCache, InstanceTrackingCache):
     """
 
     _CACHE_TIMESTAMP = "created_time_stamp"
+    # records the tex root, so that caches of removed documents can be found
+    TEX_ROOT_KEY = "tex_root"
     _LIFE_SPAN_LOCK = threading.Lock()
 
+    # the inputs of an entry are stored under its key with this suffix
+    _INPUTS_SUFFIX = ".inputs"
+    # minimal delay in seconds between two checks of the inputs of an entry
+    _VALIDATION_INTERVAL = 1
+
     def __init__(self, tex_root):
         self.tex_root = tex_root
         super(LocalCache, self).__init__()
+        if not hasattr(self, "_validated"):
+            self._validated = {}
 
-    def validate_on_get(self, key):
-        try:
-            cache_time = Cache.get(self, self._CACHE_TIMESTAMP)
-        except Exception:
-            raise ValueError("cannot load created timestamp")
+    def get(self, key):
+        result = super(LocalCache, self).get(key)
+
+        # values derived from this one depend on the same inputs
+        inputs = self._get_inputs(key)
+        if inputs:
+            InputRecorder.add(inputs)
+
+        return result
+
+    def set(self, key, obj, inputs=None):
+        """
+        set the cache value for the given key
+
+        :param key:
+            the key to store the value under
+
+        :param obj:
+            the value to store; note that obj *must* be picklable
+
+        :param inputs:
+            the fingerprints of the files the value is derived from as
+            recorded by an InputRecorder; if None, the value is only
+            invalidated after the cache.life_span
+        """
+        super(LocalCache, self).set(key, obj)
+
+        self._validated.pop(key, None)
+        if inputs is None:
+            self.invalidate(key + self._INPUTS_SUFFIX)
         else:
-            if not self.is_up_to_date(key, cache_time):
-                raise ValueError("value outdated")
+            Cache.set(self, key + self._INPUTS_SUFFIX, tuple(inputs))
+
+    def _compute(self, key, func):
+        with InputRecorder() as recorder:
+            result = func()
+        self.set(key, result, recorder.inputs.values())
+        return result
+
+    def _on_flight_joined(self, key):
+        inputs = self._get_inputs(key)
+        if inputs:
+            InputRecorder.add(inputs)
+
+    def validate_on_get(self, key):
+        inputs = self._get_inputs(key)
+        if not inputs:
+            self._validate_life_span(key)
+            return
+
+        now = time.time()
+        validated = self._validated.get(key, 0)
+        if now - validated < self._VALIDATION_INTERVAL and validated > _last_discard:
+            return
+
+        if not all(_is_unchanged(fingerprint) for fingerprint in inputs):
+            self.invalidate([key, key + self._INPUTS_SUFFIX])
+            cache_stats.add("misses", key)
+            raise CacheMiss(f"inputs of {key} have changed")
+
+        self._validated[key] = now
 
     def validate_on_set(self, key, obj):
         if not self.has(self._CACHE_TIMESTAMP):
             Cache.set(self, self._CACHE_TIMESTAMP, int(time.time()))
+            Cache.set(self, self.TEX_ROOT_KEY, self.tex_root)
+
+    def _get_inputs(self, key):
+        try:
+            return Cache.get(self, key + self._INPUTS_SUFFIX)
+        except CacheMiss:
+            return None
+
+    def invalidate_dependents(self, file_name):
+        """
+        invalidates the entries, which have been derived from the file
+        according to their recorded inputs, and returns their keys
+
+        :param file_name:
+            the path of the file
+        """
+        file_name = os.path.normpath(file_name)
+        try:
+            stored_keys = self._store.keys()
+        except Exception:
+            stored_keys = ()
+
+        keys = []
+        for k in set(self._objects.keys()).union(stored_keys):
+            if not k.endswith(self._INPUTS_SUFFIX):
+                continue
+            inputs = self._get_inputs(k[: -len(self._INPUTS_SUFFIX)])
+            if inputs and any(fingerprint[0] == file_name for fingerprint in inputs):
+                keys.append(k[: -len(self._INPUTS_SUFFIX)])
+
+        if keys:
+            self.invalidate(keys + [k + self._INPUTS_SUFFIX for k in keys])
+            for k in keys:
+                self._validated.pop(k, None)
+        return keys
+
+    def _validate_life_span(self, key):
+        """
+        entries without recorded inputs expire after the cache.life_span
+        """
+        try:
+            cache_time = Cache.get(self, self._CACHE_TIMESTAMP)
+        except Exception:
+            cache_time = None
+
+        if self.is_up_to_date(key, cache_time):
+            return
+
+        # only expire the entries, which cannot be validated by their inputs
+        keys = set(self._objects.keys()).union(self._store.keys())
+        expired = [
+            k
+            for k in keys
+            if not k.endswith(self._INPUTS_SUFFIX)
+            and (k + self._INPUTS_SUFFIX not in keys or not self._get_inputs(k))
+        ]
+        expired += [k + self._INPUTS_SUFFIX for k in expired if k + self._INPUTS_SUFFIX in keys]
+        self.invalidate(expired)
+        cache_stats.add("misses", key)
+        raise CacheMiss("value outdated")
+
+    def _get_label(self):
+        return self.tex_root
+
+    def _is_pinned(self, key):
+        # evicting the time stamp would restart the life span of the cache
+        return (
+            key == self._CACHE_TIMESTAMP
+            or key == self.TEX_ROOT_KEY
+            or key.endswith(self._INPUTS_SUFFIX)
+        )
 
     def _get_inst_key(self, *args, **kwargs):
         if not hasattr(self, "tex_root"):
@@ -695,6 +1329,8 @@ class LocalCache(ValidatingCache, InstanceTrackingCache):
             return False
 
         cache_life_span = LocalCache._get_cache_life_span()
+        if cache_life_span is None:
+            return True
 
         current_time = int(time.time())
         if timestamp + cache_life_span < current_time:
@@ -713,6 +1349,8 @@ class LocalCache(ValidatingCache, InstanceTrackingCache):
         """
 
         def __parse_life_span_string(life_span_str):
+            if life_span_str == "infinite":
+                return None
             try:
                 return int(life_span_str)
             except ValueError:
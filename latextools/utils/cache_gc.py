@@ -0,0 +1,244 @@
+"""
+Garbage collection of the cache folder
+
+Removes the local caches of tex roots and the caches of bib files, which no
+longer exist, and keeps the size of these caches below the cache.size_limit
+by removing the least recently used ones. The global cache and the caches
+currently in use are never removed, but the tex roots of the removed local
+caches are dropped from the include index.
+"""
+
+import collections
+import os
+import re
+import shutil
+
+import sublime
+
+from . import cache
+from . import cache_store
+from . import include_index
+from . import io_executor
+from .bibcache import BibCache
+from .logging import logger
+from .settings import get_setting
+
+# the delay in seconds of the first collection after startup
+STARTUP_DELAY = 300
+
+_BIB_CACHE_RE = re.compile(r"^bib_([^_]+)_(?:fmt_)?([0-9a-f]{32})(?=\.|$)")
+
+# a removable cache
+# paths: the files and folders belonging to the cache
+# size: the size in bytes
+# last_access: the time the cache has been accessed last
+# source: the file the cache is derived from or None if unknown
+# active: whether the cache is currently in use
+CacheUnit = collections.namedtuple(
+    "CacheUnit", ["name", "paths", "size", "last_access", "source", "active"]
+)
+
+
+def _file_stats(path):
+    """
+    returns the total size and the latest access or modification time of
+    the file or of all files in the folder
+    """
+    if os.path.isfile(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return 0, 0
+        return st.st_size, max(st.st_atime, st.st_mtime)
+
+    size = 0
+    last_access = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                st = os.stat(os.path.join(dir_path, file_name))
+            except OSError:
+                continue
+            size += st.st_size
+            last_access = max(last_access, st.st_atime, st.st_mtime)
+    return size, last_access
+
+
+def _read_source(cache_path, store_name, key):
+    # the shared stores are kept for the lifetime of the plugin, which the
+    # stores of removed caches must not be
+    try:
+        return cache_store.open_store(cache_path, store_name).read(key)
+    except Exception:
+        return None
+
+
+def _active_instances(cache_class):
+    # InstanceTrackingCache only creates the registry on first use
+    return set(getattr(cache_class, "_INSTANCES", {}).keys())
+
+
+def _local_cache_units():
+    local_path = os.path.join(cache._global_cache_path(), cache.LOCAL_CACHE_FOLDER)
+    try:
+        names = os.listdir(local_path)
+    except OSError:
+        return
+
+    active = {cache.hash_digest(tex_root) for tex_root in _active_instances(cache.LocalCache)}
+    for name in names:
+        path = os.path.join(local_path, name)
+        if not os.path.isdir(path):
+            continue
+        tex_root = _read_source(path, "cache", cache.LocalCache.TEX_ROOT_KEY)
+        if tex_root is not None and cache.hash_digest(tex_root) != name:
+            tex_root = None
+        size, last_access = _file_stats(path)
+        yield CacheUnit(name, (path,), size, last_access, tex_root, name in active)
+
+
+def _bib_cache_units():
+    global_path = cache._global_cache_path()
+    try:
+        names = os.listdir(global_path)
+    except OSError:
+        return
+
+    # group the files of each bib cache, which are several in the legacy
+    # layout
+    files = collections.defaultdict(list)
+    for name in names:
+        m = _BIB_CACHE_RE.match(name)
+        if m and os.path.isfile(os.path.join(global_path, name)):
+            files[m.groups()].append(os.path.join(global_path, name))
+
+    active = {
+        (plugin, cache.hash_digest(bib_file)) for plugin, bib_file in _active_instances(BibCache)
+    }
+    for (plugin, file_hash), paths in files.items():
+        name = f"bib_{plugin}_{file_hash}"
+        bib_file = _read_source(global_path, name, name + ".source")
+        if bib_file is not None and cache.hash_digest(bib_file) != file_hash:
+            bib_file = None
+        size = 0
+        last_access = 0
+        for path in paths:
+            file_size, file_access = _file_stats(path)
+            size += file_size
+            last_access = max(last_access, file_access)
+        is_active = (plugin, file_hash) in active
+        yield CacheUnit(name, tuple(paths), size, last_access, bib_file, is_active)
+
+
+def _get_size_limit():
+    """
+    returns the cache.size_limit setting in bytes, 0 meaning unlimited
+    """
+    try:
+        return max(int(get_setting("cache.size_limit", 0)), 0) * 1024 * 1024
+    except (TypeError, ValueError):
+        return 0
+
+
+def collect(dry_run=False, size_limit=None):
+    """
+    removes orphaned caches and the least recently used caches exceeding
+    the size limit
+
+    :param dry_run:
+        if True, nothing is removed
+
+    :param size_limit:
+        the limit of the total size of the local and bib caches in bytes;
+        defaults to the cache.size_limit setting, 0 meaning unlimited
+
+    :returns:
+        a tuple of the removed (or to be removed in a dry run) caches as
+        (CacheUnit, reason) and the total size of the remaining ones
+    """
+    if size_limit is None:
+        size_limit = _get_size_limit()
+
+    local_units = list(_local_cache_units())
+    units = local_units + list(_bib_cache_units())
+
+    removed = []
+    remaining = []
+    for unit in units:
+        if not unit.active and unit.source is not None and not os.path.isfile(unit.source):
+            removed.append((unit, "source removed"))
+        else:
+            remaining.append(unit)
+
+    total_size = sum(unit.size for unit in remaining)
+    if size_limit and total_size > size_limit:
+        for unit in sorted(remaining, key=lambda u: u.last_access):
+            if total_size <= size_limit:
+                break
+            if unit.active:
+                continue
+            removed.append((unit, "size limit"))
+            total_size -= unit.size
+
+    if not dry_run:
+        for unit, reason in removed:
+            for path in unit.paths:
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.error(f"error while removing cache {path}: {e}")
+            logger.debug(f"removed cache {unit.name} of {unit.source}: {reason}")
+
+        local_names = {unit.name for unit in local_units}
+        include_index.prune(
+            unit.source
+            for unit, _ in removed
+            if unit.name in local_names and unit.source is not None
+        )
+
+    return removed, total_size
+
+
+def _get_interval():
+    """
+    returns the cache.gc_interval setting in seconds, 0 if disabled
+    """
+    try:
+        return max(float(get_setting("cache.gc_interval", 24)), 0) * 3600
+    except (TypeError, ValueError):
+        return 0
+
+
+def _schedule(delay):
+    def _submit():
+        # the plugin may have been unloaded in the meantime
+        if io_executor.is_running():
+            io_executor.submit(_run_periodically)
+
+    # scheduled via ST rather than the executor, which would run all pending
+    # tasks when shutting down
+    sublime.set_timeout(_submit, int(delay * 1000))
+
+
+def _run_periodically():
+    interval = _get_interval()
+    if not interval:
+        return
+
+    removed, total_size = collect()
+    if removed:
+        logger.info(
+            f"removed {len(removed)} caches of {sum(u.size for u, _ in removed) // 1024} KB, "
+            f"{total_size // 1024} KB remaining"
+        )
+    _schedule(interval)
+
+
+def latextools_plugin_loaded():
+    if _get_interval():
+        _schedule(STARTUP_DELAY)
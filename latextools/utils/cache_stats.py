@@ -0,0 +1,184 @@
+"""
+Counters describing the behavior of the caches
+
+The counters are aggregated per key class, e.g. all analyses of all tex
+roots are counted as "analysis", to tell whether slow features suffer from
+cache misses or from slow producers.
+"""
+
+import collections
+import functools
+import threading
+import time
+
+from . import io_executor
+from .logging import logger
+from .settings import get_setting
+
+# the counted fields in the order they are reported
+FIELDS = (
+    "hits",
+    "misses",
+    "invalidations",
+    "get_time",
+    "loads",
+    "bytes_read",
+    "saves",
+    "bytes_written",
+    "computes",
+    "compute_time",
+)
+
+_lock = threading.Lock()
+_counters = collections.defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+_started = time.time()
+
+
+@functools.lru_cache(maxsize=1024)
+def key_class(key):
+    """
+    returns the class of a cache key, used to aggregate the counters
+    """
+    if key.endswith(".inputs"):
+        return "inputs"
+    if key.startswith("bib_"):
+        return "bib_fmt" if "_fmt_" in key else "bib_entries"
+    if key.startswith("glocomp_"):
+        return "glossary"
+    if key in (
+        "analysis",
+        "preamble_analysis",
+        "bib_files",
+        "cwl_files",
+        "created_time_stamp",
+        "include_index",
+    ):
+        return key
+    return "other"
+
+
+def add(field, key, value=1):
+    """
+    adds the value to the field of the class of the key
+    """
+    with _lock:
+        _counters[key_class(key)][field] += value
+
+
+def add_get(key, hit, seconds):
+    """
+    counts a get of the key as hit or miss, which took the seconds
+    """
+    with _lock:
+        counters = _counters[key_class(key)]
+        counters["hits" if hit else "misses"] += 1
+        counters["get_time"] += seconds
+
+
+def snapshot():
+    """
+    returns a dict mapping each key class to a dict of its counters
+    """
+    with _lock:
+        return {k: dict(v) for k, v in _counters.items()}
+
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear()
+        _started = time.time()
+
+
+def format_table(stats=None):
+    """
+    formats the counters as a plain text table
+    """
+    if stats is None:
+        stats = snapshot()
+
+    def _ms(seconds):
+        return f"{seconds * 1000:.1f}"
+
+    header = (
+        "key class",
+        "hits",
+        "misses",
+        "hit %",
+        "inval",
+        "avg get ms",
+        "loads",
+        "read KB",
+        "saves",
+        "written KB",
+        "computes",
+        "avg compute ms",
+    )
+    rows = [header]
+    for name in sorted(stats):
+        s = stats[name]
+        gets = s["hits"] + s["misses"]
+        rows.append(
+            (
+                name,
+                str(s["hits"]),
+                str(s["misses"]),
+                f"{100 * s['hits'] / gets:.0f}" if gets else "-",
+                str(s["invalidations"]),
+                _ms(s["get_time"] / gets) if gets else "-",
+                str(s["loads"]),
+                f"{s['bytes_read'] / 1024:.0f}",
+                str(s["saves"]),
+                f"{s['bytes_written'] / 1024:.0f}",
+                str(s["computes"]),
+                _ms(s["compute_time"] / s["computes"]) if s["computes"] else "-",
+            )
+        )
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    lines = [
+        "  ".join(
+            cell.ljust(width) if i == 0 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))
+        )
+        for row in rows
+    ]
+    lines.insert(1, "-" * len(lines[0]))
+    lines.append("")
+    lines.append(f"collected over {time.time() - _started:.0f} s")
+    return "\n".join(lines)
+
+
+def _log_stats():
+    interval = _get_log_interval()
+    if not interval:
+        return
+
+    stats = snapshot()
+    if stats:
+        summary = ", ".join(
+            f"{name} {s['hits']}/{s['hits'] + s['misses']} hits "
+            f"{s['computes']} computes {s['compute_time']:.2f}s"
+            for name, s in sorted(stats.items())
+        )
+        logger.info(f"cache stats: {summary}")
+
+    if io_executor.is_running():
+        io_executor.schedule("cache_stats_log", _log_stats, delay=interval, max_delay=interval)
+
+
+def _get_log_interval():
+    """
+    returns the cache.stats_log_interval setting in seconds, 0 if disabled
+    """
+    try:
+        return max(float(get_setting("cache.stats_log_interval", 0)), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def latextools_plugin_loaded():
+    # the log is rescheduled by itself as long as the interval is set
+    interval = _get_log_interval()
+    if interval:
+        io_executor.schedule("cache_stats_log", _log_stats, delay=interval, max_delay=interval)
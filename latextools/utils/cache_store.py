@@ -0,0 +1,682 @@
+"""
+Storage backends for the LaTeXTools caches
+
+A store persists the entries of a single cache state, i.e. the GlobalCache,
+one LocalCache or one BibCache. Stores are shared per path, so every cache
+object pointing to the same data uses the same store instance.
+
+Two backends are provided:
+
+- ``pack``: all entries are kept in a single append-only file with an
+  in-memory index; a save only appends the changed entries followed by a
+  commit marker, so a partially written batch is simply ignored on the next
+  load; the values are compressed with the codec given in the file header
+- ``files``: the legacy layout, one pickle file per key
+
+The backend is selected with the ``cache.backend`` setting, the codec of
+the pack backend with the ``cache.compression`` setting.
+"""
+
+import io
+import lzma
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+from . import cache_stats
+from .logging import logger
+from .settings import get_setting
+
+DEFAULT_BACKEND = "pack"
+
+# file extension of pack stores
+PACK_EXTENSION = ".pack"
+
+DEFAULT_CODEC = "zlib"
+
+# codec name -> (id stored in the file header, compress, decompressor factory)
+CODECS = {
+    "none": (0, None, None),
+    "zlib": (1, zlib.compress, zlib.decompressobj),
+    "lzma": (2, lzma.compress, lzma.LZMADecompressor),
+}
+_CODEC_NAMES = {codec_id: name for name, (codec_id, _, _) in CODECS.items()}
+
+# the size of the chunks compressed values are read in
+_CHUNK_SIZE = 64 * 1024
+
+
+class StoreError(Exception):
+    """exception to indicate that a store is damaged or cannot be written"""
+
+    pass
+
+
+def get_codec():
+    """
+    returns the name of the codec selected by the cache.compression setting
+    """
+    codec = get_setting("cache.compression", DEFAULT_CODEC)
+    if codec not in CODECS:
+        logger.error(f"unknown cache.compression {codec}, using {DEFAULT_CODEC}")
+        codec = DEFAULT_CODEC
+    return codec
+
+
+def compress(codec, data):
+    compress_func = CODECS[codec][1]
+    return compress_func(data) if compress_func else data
+
+
+def decompress(codec, data):
+    decompressor_factory = CODECS[codec][2]
+    if decompressor_factory is None:
+        return data
+    decompressor = decompressor_factory()
+    result = decompressor.decompress(data)
+    if hasattr(decompressor, "flush"):
+        result += decompressor.flush()
+    return result
+
+
+class _DecompressingReader(io.RawIOBase):
+    """
+    file-like object, which decompresses a value while it is read, so that
+    a value can be unpickled without holding the whole compressed and
+    decompressed data in memory
+    """
+
+    def __init__(self, f, length, decompressor):
+        self._f = f
+        self._remaining = length
+        self._decompressor = decompressor
+        self._buffer = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            if self._remaining <= 0:
+                return 0
+            chunk = self._f.read(min(_CHUNK_SIZE, self._remaining))
+            if not chunk:
+                raise EOFError("compressed value is truncated")
+            self._remaining -= len(chunk)
+            self._buffer = memoryview(self._decompressor.decompress(chunk))
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class CacheStore:
+    """
+    abstract storage backend
+
+    a store maps string keys to picklable values; implementations MUST be
+    thread-safe
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+
+    def keys(self):
+        """
+        returns a tuple of all keys stored in this store
+        """
+        raise NotImplementedError
+
+    def read(self, key):
+        """
+        returns the value stored for the key
+
+        raises KeyError if the key is not stored
+        """
+        raise NotImplementedError
+
+    def read_all(self):
+        """
+        returns a dict with all entries of this store
+        """
+        raise NotImplementedError
+
+    def timestamp(self, key):
+        """
+        returns the time the entry has been written
+
+        raises KeyError if the key is not stored
+        """
+        raise NotImplementedError
+
+    def commit(self, updates, deletes=()):
+        """
+        atomically writes the updated entries and removes the deleted ones
+
+        :param updates:
+            a dict of the entries to write
+
+        :param deletes:
+            an iterable of keys to remove
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        removes all entries and the underlying files
+        """
+        raise NotImplementedError
+
+
+class FileStore(CacheStore):
+    """
+    legacy backend, which stores each entry as a pickle file named after the
+    key in the cache folder
+    """
+
+    def _file_path(self, key):
+        return os.path.join(self.path, key)
+
+    def keys(self):
+        try:
+            entries = os.listdir(self.path)
+        except OSError:
+            return ()
+        return tuple(e for e in entries if os.path.isfile(self._file_path(e)))
+
+    def read(self, key):
+        try:
+            with open(self._file_path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+        cache_stats.add("bytes_read", key, len(data))
+        return pickle.loads(data)
+
+    def read_all(self):
+        result = {}
+        for key in self.keys():
+            try:
+                result[key] = self.read(key)
+            except Exception:
+                logger.error(f"error while loading {key}")
+        return result
+
+    def timestamp(self, key):
+        try:
+            return os.path.getmtime(self._file_path(key))
+        except OSError:
+            raise KeyError(key)
+
+    def commit(self, updates, deletes=()):
+        with self._lock:
+            for key in deletes:
+                try:
+                    os.remove(self._file_path(key))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.error(f"error while deleting {key}: {e}")
+
+            if not updates:
+                return
+
+            os.makedirs(self.path, exist_ok=True)
+            for key, obj in updates.items():
+                file_path = self._file_path(key)
+                tmp_path = file_path + ".tmp"
+                try:
+                    with open(tmp_path, "wb") as f:
+                        pickle.dump(obj, f, protocol=-1)
+                        cache_stats.add("bytes_written", key, f.tell())
+                    os.replace(tmp_path, file_path)
+                except OSError as e:
+                    raise StoreError(f"error while writing to {key}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self.commit({}, self.keys())
+            try:
+                os.rmdir(self.path)
+            except OSError:
+                pass
+
+
+class PackStore(CacheStore):
+    """
+    backend, which stores all entries in a single append-only file
+
+    file layout::
+
+        header: MAGIC, format version, codec, crc32 of the header
+        record: kind, timestamp, key length, value length, key, value, crc32
+
+    all values of a file are compressed with the codec of its header.
+    Records are written in batches, each terminated by a COMMIT record;
+    records following the last COMMIT record are incomplete and ignored.
+    Superseded records are dropped by rewriting the file once they take up
+    more space than the live ones.
+
+    files of an older format version are migrated, i.e. rewritten in the
+    current format, before anything is appended to them; files of unknown
+    versions are discarded.
+    """
+
+    MAGIC = b"LTXPACK\n"
+    VERSION = 2
+
+    # MAGIC and format version, shared by all versions
+    _PREFIX = struct.Struct(">8sH")
+    # codec and crc32 of the header, since version 2
+    _HEADER_TAIL = struct.Struct(">BI")
+    _HEADER_SIZE = _PREFIX.size + _HEADER_TAIL.size
+    _RECORD = struct.Struct(">BdHI")
+    _CRC = struct.Struct(">I")
+
+    _PUT = 1
+    _DELETE = 2
+    _COMMIT = 3
+
+    # don't bother compacting files smaller than this
+    _COMPACT_MIN_SIZE = 256 * 1024
+
+    def __init__(self, path, codec=None):
+        super(PackStore, self).__init__(path)
+        # the codec to write with, None to use the cache.compression setting
+        self.codec = codec
+        # key -> (value offset, value length, timestamp)
+        self._index = {}
+        # offset directly after the last committed record
+        self._end = 0
+        # size of all records, which are still referenced by the index
+        self._live = 0
+        # (size, mtime) of the file as last seen by this store
+        self._stat = None
+        # format version and codec of the file
+        self._version = self.VERSION
+        self._codec = DEFAULT_CODEC
+
+    # - Public API
+    def keys(self):
+        with self._lock:
+            self._refresh()
+            return tuple(self._index.keys())
+
+    def read(self, key):
+        with self._lock:
+            self._refresh()
+            offset, length, _ = self._index[key]
+            decompressor_factory = CODECS[self._codec][2]
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(offset)
+                    cache_stats.add("bytes_read", key, length)
+                    if decompressor_factory is None:
+                        return pickle.loads(f.read(length))
+                    reader = _DecompressingReader(f, length, decompressor_factory())
+                    return pickle.load(io.BufferedReader(reader, _CHUNK_SIZE))
+            except FileNotFoundError:
+                raise KeyError(key)
+
+    def read_all(self):
+        with self._lock:
+            try:
+                with open(self.path, "rb") as f:
+                    values = self._scan(f, with_values=True)
+            except FileNotFoundError:
+                self._reset()
+                return {}
+            self._update_stat()
+            codec = self._codec
+        result = {}
+        for key, data in values.items():
+            cache_stats.add("bytes_read", key, len(data))
+            try:
+                result[key] = pickle.loads(decompress(codec, data))
+            except Exception:
+                logger.error(f"error while loading {key}")
+        return result
+
+    def timestamp(self, key):
+        with self._lock:
+            self._refresh()
+            return self._index[key][2]
+
+    def commit(self, updates, deletes=()):
+        timestamp = time.time()
+        codec = self.codec or get_codec()
+        records = []
+        for key in deletes:
+            records.append(self._pack_record(self._DELETE, timestamp, key, b""))
+        for key, obj in updates.items():
+            data = compress(codec, pickle.dumps(obj, protocol=-1))
+            cache_stats.add("bytes_written", key, len(data))
+            records.append(self._pack_record(self._PUT, timestamp, key, data))
+        if not records:
+            return
+
+        with self._lock:
+            self._refresh()
+            if not updates and not any(k in self._index for k in deletes):
+                return
+
+            if self._end >= self._HEADER_SIZE and (
+                self._version != self.VERSION or self._codec != codec
+            ):
+                # all values of a file must use the same format
+                if self._version != self.VERSION:
+                    logger.info(
+                        f"migrating {self.path} from format {self._version} to {self.VERSION}"
+                    )
+                self._compact(codec)
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            try:
+                with open(self.path, "r+b" if self._stat else "w+b") as f:
+                    if self._end < self._HEADER_SIZE:
+                        # new or unusable file, start from scratch
+                        f.truncate()
+                        f.write(self._pack_header(codec))
+                        self._end = self._HEADER_SIZE
+                        self._version = self.VERSION
+                        self._codec = codec
+                    # drop any incomplete batch of an interrupted write
+                    f.seek(self._end)
+                    f.truncate()
+
+                    offset = self._end
+                    changes = []
+                    for kind, key, record, value_offset, value_length in records:
+                        changes.append((kind, key, offset + value_offset, value_length, record))
+                        f.write(record)
+                        offset += len(record)
+                    f.write(self._pack_record(self._COMMIT, timestamp, "", b"")[2])
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._end = f.tell()
+            except OSError as e:
+                self._stat = None
+                raise StoreError(f"error while writing to {self.path}: {e}")
+
+            for kind, key, value_offset, value_length, record in changes:
+                self._apply(kind, key, (value_offset, value_length, timestamp), len(record))
+            self._update_stat()
+
+            if not self._index:
+                self.clear()
+            elif self._end > self._COMPACT_MIN_SIZE and self._end > 2 * self._live:
+                try:
+                    self._compact(codec)
+                except StoreError as e:
+                    # the batch is committed, the file is merely bigger
+                    logger.error(str(e))
+
+    def clear(self):
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"error while deleting {self.path}: {e}")
+            try:
+                os.rmdir(os.path.dirname(self.path))
+            except OSError:
+                pass
+            self._reset()
+
+    # - Internal API
+    def _reset(self):
+        self._index = {}
+        self._end = 0
+        self._live = 0
+        self._stat = None
+        self._version = self.VERSION
+        self._codec = DEFAULT_CODEC
+
+    def _update_stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._stat = None
+        else:
+            self._stat = (st.st_size, st.st_mtime_ns)
+
+    def _refresh(self):
+        """
+        re-reads the index if the file has been changed by someone else
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._reset()
+            return
+
+        if self._stat == (st.st_size, st.st_mtime_ns):
+            return
+
+        try:
+            with open(self.path, "rb") as f:
+                self._scan(f)
+        except OSError:
+            self._reset()
+            return
+        self._update_stat()
+
+    def _apply(self, kind, key, entry, record_size):
+        old = self._index.pop(key, None)
+        if old is not None:
+            self._live -= old[1] + len(key.encode("utf-8")) + self._RECORD.size + self._CRC.size
+        if kind == self._PUT:
+            self._index[key] = entry
+            self._live += record_size
+
+    def _scan(self, f, with_values=False):
+        """
+        rebuilds the index from the file and optionally returns the values
+        of all live entries
+        """
+        self._reset()
+        values = {}
+
+        header_size = self._read_header(f)
+        if not header_size:
+            return values
+
+        offset = self._end = header_size
+        pending = []
+        while True:
+            head = f.read(self._RECORD.size)
+            if len(head) < self._RECORD.size:
+                break
+            kind, timestamp, key_length, value_length = self._RECORD.unpack(head)
+            body = f.read(key_length + value_length + self._CRC.size)
+            if len(body) < key_length + value_length + self._CRC.size:
+                break
+            (crc,) = self._CRC.unpack(body[-self._CRC.size :])
+            if crc != zlib.crc32(head + body[: -self._CRC.size]):
+                logger.error(f"damaged record in {self.path}, discarding remainder")
+                break
+
+            record_size = len(head) + len(body)
+            if kind == self._COMMIT:
+                for p_kind, p_key, p_entry, p_size, p_value in pending:
+                    self._apply(p_kind, p_key, p_entry, p_size)
+                    if with_values:
+                        if p_kind == self._PUT:
+                            values[p_key] = p_value
+                        else:
+                            values.pop(p_key, None)
+                pending = []
+                self._end = offset + record_size
+            else:
+                key = body[:key_length].decode("utf-8")
+                value_offset = offset + len(head) + key_length
+                value = body[key_length : key_length + value_length] if with_values else None
+                pending.append(
+                    (kind, key, (value_offset, value_length, timestamp), record_size, value)
+                )
+            offset += record_size
+
+        return values
+
+    def _read_header(self, f):
+        """
+        reads the header, sets the format version and codec of the store
+        and returns the size of the header or 0 if the file is unusable
+        """
+        prefix = f.read(self._PREFIX.size)
+        if len(prefix) < self._PREFIX.size:
+            return 0
+        magic, version = self._PREFIX.unpack(prefix)
+        if magic != self.MAGIC:
+            logger.error(f"discarding unknown cache file {self.path}")
+            return 0
+
+        if version == 1:
+            # version 1 files are uncompressed and carry no header checksum
+            self._version = version
+            self._codec = "none"
+            return self._PREFIX.size
+
+        if version != self.VERSION:
+            logger.error(f"discarding cache file {self.path} of unknown format {version}")
+            return 0
+
+        tail = f.read(self._HEADER_TAIL.size)
+        if len(tail) < self._HEADER_TAIL.size:
+            return 0
+        codec_id, crc = self._HEADER_TAIL.unpack(tail)
+        if crc != zlib.crc32(prefix + bytes((codec_id,))) or codec_id not in _CODEC_NAMES:
+            logger.error(f"discarding cache file {self.path} with damaged header")
+            return 0
+
+        self._version = version
+        self._codec = _CODEC_NAMES[codec_id]
+        return self._HEADER_SIZE
+
+    def _pack_header(self, codec):
+        prefix = self._PREFIX.pack(self.MAGIC, self.VERSION)
+        codec_id = CODECS[codec][0]
+        crc = zlib.crc32(prefix + bytes((codec_id,)))
+        return prefix + self._HEADER_TAIL.pack(codec_id, crc)
+
+    def _pack_record(self, kind, timestamp, key, data):
+        key_bytes = key.encode("utf-8")
+        head = self._RECORD.pack(kind, timestamp, len(key_bytes), len(data))
+        crc = zlib.crc32(data, zlib.crc32(key_bytes, zlib.crc32(head)))
+        record = b"".join((head, key_bytes, data, self._CRC.pack(crc)))
+        return kind, key, record, len(head) + len(key_bytes), len(data)
+
+    def _compact(self, codec):
+        """
+        rewrites the file in the current format with only the live entries,
+        whose values are compressed with the codec
+
+        raises StoreError if the file cannot be rewritten
+        """
+        tmp_path = self.path + ".tmp"
+        timestamp = time.time()
+        try:
+            with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+                dst.write(self._pack_header(codec))
+                index = {}
+                for key, (offset, length, key_time) in self._index.items():
+                    src.seek(offset)
+                    data = src.read(length)
+                    if codec != self._codec:
+                        data = compress(codec, decompress(self._codec, data))
+                    _, _, record, value_offset, value_length = self._pack_record(
+                        self._PUT, key_time, key, data
+                    )
+                    index[key] = (dst.tell() + value_offset, value_length, key_time)
+                    dst.write(record)
+                dst.write(self._pack_record(self._COMMIT, timestamp, "", b"")[2])
+                dst.flush()
+                os.fsync(dst.fileno())
+                end = dst.tell()
+            os.replace(tmp_path, self.path)
+        except (OSError, zlib.error, lzma.LZMAError) as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise StoreError(f"error while compacting {self.path}: {e}")
+
+        self._index = index
+        self._end = self._live = end
+        self._version = self.VERSION
+        self._codec = codec
+        self._update_stat()
+
+
+_BACKENDS = {"pack": PackStore, "files": FileStore}
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def register_backend(name, store_class):
+    """
+    registers an additional storage backend, which can be selected with the
+    cache.backend setting
+
+    :param name:
+        the name of the backend
+
+    :param store_class:
+        a subclass of CacheStore
+    """
+    _BACKENDS[name] = store_class
+
+
+def _store_location(cache_path, name, backend):
+    if backend is None:
+        backend = get_setting("cache.backend", DEFAULT_BACKEND)
+    if backend not in _BACKENDS:
+        logger.error(f"unknown cache.backend {backend}, using {DEFAULT_BACKEND}")
+        backend = DEFAULT_BACKEND
+
+    store_class = _BACKENDS[backend]
+    if store_class is FileStore:
+        path = cache_path
+    else:
+        path = os.path.join(cache_path, name + PACK_EXTENSION)
+    return backend, store_class, path
+
+
+def get_store(cache_path, name, backend=None):
+    """
+    returns the store for the named cache in the cache folder
+
+    :param cache_path:
+        the folder the cache is stored in
+
+    :param name:
+        the name of the cache; used as file name by the pack backend
+
+    :param backend:
+        the name of the backend; defaults to the cache.backend setting
+    """
+    backend, store_class, path = _store_location(cache_path, name, backend)
+    with _STORES_LOCK:
+        store = _STORES.get((backend, path))
+        if store is None:
+            store = _STORES[(backend, path)] = store_class(path)
+        return store
+
+
+def open_store(cache_path, name, backend=None):
+    """
+    returns a new store for the named cache in the cache folder, which is
+    not shared with the caches, e.g. to inspect a cache, which isn't in use
+
+    see get_store() for the parameters
+    """
+    _, store_class, path = _store_location(cache_path, name, backend)
+    return store_class(path)
@@ -0,0 +1,97 @@
+"""
+Reverse index of the files included by the analyzed documents
+
+Maps each file of an analysis to the tex roots including it, so that
+saving a file shared by several documents, e.g. a chapter or a package,
+can refresh the caches of all of them. The index is persisted in the global
+cache, updated whenever a document has been analyzed and pruned by the
+garbage collection of the cache folder.
+"""
+
+import os
+import threading
+
+from .cache import CacheMiss
+from .cache import GlobalCache
+
+__all__ = ["dependent_roots", "prune", "update"]
+
+# the key of the index in the global cache
+INDEX_KEY = "include_index"
+
+_lock = threading.Lock()
+
+
+def _get_index():
+    try:
+        return GlobalCache().get(INDEX_KEY)
+    except CacheMiss:
+        return {}
+
+
+def update(tex_root, file_names):
+    """
+    records the files, which the analysis of the tex root consists of,
+    replacing the files recorded before
+
+    :param tex_root:
+        the path of the tex root
+
+    :param file_names:
+        the normalized paths of the files of the analysis
+    """
+    file_names = set(file_names)
+    with _lock:
+        index = _get_index()
+        recorded = {f for f, roots in index.items() if tex_root in roots}
+        if recorded == file_names:
+            return
+
+        result = dict(index)
+        for file_name in recorded - file_names:
+            roots = result[file_name] - {tex_root}
+            if roots:
+                result[file_name] = roots
+            else:
+                del result[file_name]
+        for file_name in file_names - recorded:
+            result[file_name] = result.get(file_name, frozenset()) | {tex_root}
+
+        GlobalCache().set(INDEX_KEY, result)
+
+
+def dependent_roots(file_name):
+    """
+    returns the tex roots, whose analyses include the file
+
+    :param file_name:
+        the path of the file
+    """
+    file_name = os.path.normpath(file_name)
+    with _lock:
+        return _get_index().get(file_name, frozenset())
+
+
+def prune(removed_roots=()):
+    """
+    removes the tex roots, whose caches have been removed, as well as the
+    tex roots and files, which no longer exist, from the index
+
+    :param removed_roots:
+        the paths of the tex roots, whose local caches have been removed
+    """
+    removed_roots = set(removed_roots)
+    with _lock:
+        index = _get_index()
+        result = {}
+        for file_name, roots in index.items():
+            if not os.path.isfile(file_name):
+                continue
+            roots = frozenset(
+                root for root in roots if root not in removed_roots and os.path.isfile(root)
+            )
+            if roots:
+                result[file_name] = roots
+
+        if result != index:
+            GlobalCache().set(INDEX_KEY, result)
@@ -0,0 +1,244 @@
+"""
+A process-wide executor for background I/O, e.g. persisting the caches
+
+All caches share this executor instead of maintaining threads of their own.
+Tasks submitted with a key are coalesced, i.e. scheduling the save of a
+cache, which is already scheduled, only postpones the pending save.
+"""
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+import traceback
+
+from concurrent.futures import Future
+
+from .logging import logger
+
+# the maximal number of tasks waiting to be executed
+MAX_QUEUE_SIZE = 256
+# the number of worker threads
+WORKERS = 2
+
+
+class IOExecutor:
+    """
+    a small executor with a bounded queue and coalescing delayed tasks
+    """
+
+    def __init__(self, workers=WORKERS, max_queue_size=MAX_QUEUE_SIZE):
+        self._workers = workers
+        self._max_queue_size = max_queue_size
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        # key -> [deadline, latest deadline, func, args, future]
+        self._delayed = {}
+        # heap of (deadline, counter, key)
+        self._deadlines = []
+        self._counter = itertools.count()
+        self._threads = []
+        self._stopped = False
+
+    # - Public API
+    def submit(self, func, *args, **kwargs):
+        """
+        executes the function in a worker thread
+
+        blocks while the queue is full; if called from a worker thread or
+        after the executor has been shut down, the function is executed
+        directly
+
+        :returns:
+            a concurrent.futures.Future for the result
+        """
+        future = Future()
+        with self._condition:
+            if self._stopped or self._is_worker():
+                inline = True
+            else:
+                inline = False
+                while len(self._queue) >= self._max_queue_size and not self._stopped:
+                    self._condition.wait()
+                self._queue.append((func, args, kwargs, future))
+                self._ensure_workers()
+                self._condition.notify_all()
+
+        if inline:
+            self._run(func, args, kwargs, future)
+        return future
+
+    def schedule(self, key, func, *args, delay=1.0, max_delay=10.0):
+        """
+        executes the function in a worker thread after the delay
+
+        if a task with the same key is pending, it is replaced and its
+        execution is postponed by the delay, but not beyond max_delay after
+        the task was scheduled first
+
+        :returns:
+            a concurrent.futures.Future for the result, shared by all
+            coalesced calls
+        """
+        now = time.monotonic()
+        with self._condition:
+            if self._stopped:
+                future = Future()
+                inline = True
+            else:
+                inline = False
+                pending = self._delayed.get(key)
+                if pending is None:
+                    future = Future()
+                    pending = self._delayed[key] = [
+                        now + delay,
+                        now + max_delay,
+                        func,
+                        args,
+                        future,
+                    ]
+                else:
+                    pending[0] = min(now + delay, pending[1])
+                    pending[2] = func
+                    pending[3] = args
+                    future = pending[4]
+                heapq.heappush(self._deadlines, (pending[0], next(self._counter), key))
+                self._ensure_workers()
+                self._condition.notify_all()
+
+        if inline:
+            self._run(func, args, {}, future)
+        return future
+
+    def shutdown(self, timeout=5.0):
+        """
+        executes all pending tasks, including the delayed ones, and stops the
+        worker threads
+        """
+        with self._condition:
+            if self._stopped:
+                return
+            self._stopped = True
+            for deadline, _, func, args, future in self._delayed.values():
+                self._queue.append((func, args, {}, future))
+            self._delayed.clear()
+            self._deadlines = []
+            self._condition.notify_all()
+            threads = list(self._threads)
+
+        for thread in threads:
+            thread.join(timeout)
+
+        # run whatever the workers could not handle in time
+        with self._condition:
+            remaining = list(self._queue)
+            self._queue.clear()
+        for func, args, kwargs, future in remaining:
+            self._run(func, args, kwargs, future)
+
+    def is_running(self):
+        return not self._stopped
+
+    def pending(self):
+        """
+        returns the number of queued and delayed tasks
+        """
+        with self._condition:
+            return len(self._queue) + len(self._delayed)
+
+    # - Internal API
+    def _is_worker(self):
+        return threading.current_thread() in self._threads
+
+    def _ensure_workers(self):
+        # MUST be called with the condition held
+        self._threads = [t for t in self._threads if t.is_alive()]
+        for _ in range(self._workers - len(self._threads)):
+            thread = threading.Thread(target=self._work, name="LaTeXTools I/O")
+            thread.daemon = True
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_task(self):
+        with self._condition:
+            while True:
+                # move due delayed tasks to the queue
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    deadline, _, key = heapq.heappop(self._deadlines)
+                    pending = self._delayed.get(key)
+                    # skip outdated heap entries of postponed tasks
+                    if pending is not None and pending[0] == deadline:
+                        del self._delayed[key]
+                        self._queue.append((pending[2], pending[3], {}, pending[4]))
+
+                if self._queue:
+                    task = self._queue.popleft()
+                    self._condition.notify_all()
+                    return task
+
+                if self._stopped:
+                    return None
+
+                timeout = self._deadlines[0][0] - now if self._deadlines else None
+                self._condition.wait(timeout)
+
+    def _work(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                break
+            self._run(*task)
+            # don't keep the function and its arguments alive while waiting
+            task = None
+
+    @staticmethod
+    def _run(func, args, kwargs, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            logger.error(f"error in background task {func}")
+            traceback.print_exc()
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+
+_executor = IOExecutor()
+
+
+def submit(func, *args, **kwargs):
+    """
+    executes the function in the shared background I/O executor
+    """
+    return _executor.submit(func, *args, **kwargs)
+
+
+def schedule(key, func, *args, delay=1.0, max_delay=10.0):
+    """
+    executes the function in the shared background I/O executor after the
+    delay, coalescing it with pending tasks of the same key
+    """
+    return _executor.schedule(key, func, *args, delay=delay, max_delay=max_delay)
+
+
+def is_running():
+    """
+    returns whether the shared executor accepts tasks, i.e. has not been
+    shut down
+    """
+    return _executor.is_running()
+
+
+def shutdown():
+    """
+    executes all pending tasks and stops the shared executor
+    """
+    _executor.shutdown()
+
+
+def latextools_plugin_unloaded():
+    shutdown()
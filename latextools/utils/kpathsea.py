@@ -0,0 +1,426 @@
+"""
+Looks up files in the ls-R filename databases of the TeX distribution
+
+kpathsea finds the files of the TeX trees in the ls-R databases listing all
+their files. The databases are loaded once into an index mapping the file
+names to their directories, which answers lookups without running
+kpsewhich. A lookup, which cannot be answered from the databases, e.g.
+because a file is missing or a search path element is not covered by any
+database, is left to kpsewhich.
+
+Loading the databases of a full TeX distribution takes a while. Therefore,
+lookup_all loads them in a background thread and leaves all lookups to
+kpsewhich until the index is ready.
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from subprocess import PIPE
+
+from .external_command import execute_command
+from .external_command import get_texpath
+from .logging import logger
+
+__all__ = ["FileIndex", "environment_key", "get_index", "lookup_all", "search_path"]
+
+# the names of the filename databases
+DATABASE_NAMES = ("ls-R", "ls-r")
+
+# seconds between two checks whether the databases have been updated
+CHECK_INTERVAL = 10
+
+# the suffix kpathsea appends to file names of a format without it
+_FORMAT_SUFFIXES = {
+    "bib": ".bib",
+    "mlbib": ".bib",
+    "bst": ".bst",
+    "mlbst": ".bst",
+    "tex": ".tex",
+}
+
+# the formats of file names looked up without a format
+_EXTENSION_FORMATS = {
+    ".bib": "bib",
+    ".bst": "bst",
+    ".cls": "tex",
+    ".sty": "tex",
+    ".tex": "tex",
+}
+
+# returned, if a file is found in several directories of a search path
+# element, as the file kpathsea returns depends on its hashing
+_AMBIGUOUS = object()
+
+_lock = threading.Lock()
+# the environment the index and search paths have been created in
+_environment = None
+_index = None
+_checked = 0
+# the future of the index, while it is loaded
+_loading = None
+# maps formats to their search path elements
+_search_paths = {}
+
+
+def _is_search_path_variable(name):
+    return "TEX" in name or name.endswith("INPUTS") or name.startswith("KPATHSEA")
+
+
+def environment_key():
+    """
+    returns a key describing the environment, which the search paths and
+    the results of kpsewhich depend on
+    """
+    variables = tuple(sorted((k, v) for k, v in os.environ.items() if _is_search_path_variable(k)))
+    # kpsewhich searches the working directory for most formats
+    return (get_texpath(), os.getcwd(), variables)
+
+
+class FileIndex:
+    """
+    the files listed by ls-R databases
+
+    maps each file name to the indices of the directories containing it
+    """
+
+    def __init__(self, databases=()):
+        # the normalized directories of the databases
+        self.roots = []
+        self._dirs = []
+        # maps names to a directory index or a list of them
+        self._names = {}
+        # maps the paths of the databases to their modification times
+        self.databases = {}
+        for database in databases:
+            self._read(database)
+
+    def __len__(self):
+        return len(self._names)
+
+    def _read(self, database):
+        try:
+            mtime = os.stat(database).st_mtime_ns
+            f = open(database, encoding="utf-8", errors="surrogateescape")
+        except OSError as e:
+            logger.debug(f"cannot read {database}: {e}")
+            return
+
+        root = os.path.dirname(database)
+        self.roots.append(os.path.normcase(os.path.normpath(root)))
+        self.databases[database] = mtime
+
+        dirs = self._dirs
+        names = self._names
+        current = None
+        with f:
+            for line in f:
+                line = line.rstrip("\r\n")
+                if not line or line[0] == "%":
+                    continue
+                # directories are listed as "./path:" relative to the root
+                if line[-1] == ":" and (line[0] in "./" or line[1:2] == ":"):
+                    current = len(dirs)
+                    dirs.append(os.path.normpath(os.path.join(root, line[:-1])))
+                elif current is not None:
+                    entry = names.get(line)
+                    if entry is None:
+                        names[line] = current
+                    elif type(entry) is int:
+                        names[line] = [entry, current]
+                    else:
+                        entry.append(current)
+
+    def is_outdated(self):
+        """
+        whether any database has been changed since it has been read
+        """
+        for database, mtime in self.databases.items():
+            try:
+                if os.stat(database).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def covers(self, path):
+        """
+        whether the directory belongs to the tree of a database
+        """
+        path = os.path.normcase(os.path.normpath(path))
+        return any(path == root or path.startswith(root + os.sep) for root in self.roots)
+
+    def directories(self, name):
+        """
+        returns the directories containing the file name
+        """
+        entry = self._names.get(name)
+        if entry is None:
+            return ()
+        if type(entry) is int:
+            return (self._dirs[entry],)
+        return [self._dirs[i] for i in entry]
+
+    def files(self, path, recursive=True, extensions=None):
+        """
+        yields the names of the files in the directory
+
+        :param recursive:
+            whether the files in its subdirectories are included
+
+        :param extensions:
+            if given, only the names with one of these extensions, e.g.
+            ".sty", are yielded
+        """
+        path = os.path.normcase(os.path.normpath(path))
+        selected = set()
+        for i, directory in enumerate(self._dirs):
+            key = os.path.normcase(directory)
+            if key == path or recursive and key.startswith(path + os.sep):
+                selected.add(i)
+        if not selected:
+            return
+
+        for name, entry in self._names.items():
+            if extensions is not None and os.path.splitext(name)[1] not in extensions:
+                continue
+            if type(entry) is int:
+                if entry in selected:
+                    yield name
+            elif not selected.isdisjoint(entry):
+                yield name
+
+    def find(self, filename, search_path, suffix=None):
+        """
+        returns the path of the file in the first element of the search path
+        containing it like kpathsea or None, if it is not found or cannot be
+        found without searching the disk recursively
+
+        :param filename:
+            the name of the file, which may include directories
+
+        :param search_path:
+            the elements of the search path of the format as printed by
+            kpsewhich -show-path; elements prefixed with !! are only
+            searched in the databases, elements ending with // include
+            their subdirectories
+
+        :param suffix:
+            the suffix, which is tried first, if the file name lacks it
+        """
+        if suffix and not filename.endswith(suffix):
+            candidates = (filename + suffix, filename)
+        else:
+            candidates = (filename,)
+
+        for element in search_path:
+            only_database = element.startswith("!!")
+            if only_database:
+                element = element[2:]
+            if not element:
+                continue
+            recursive = element.endswith("//")
+            base = os.path.normpath(element)
+
+            if self.covers(base):
+                path = self._find_in_index(candidates, base, recursive)
+                if path is _AMBIGUOUS:
+                    return None
+                if path is not None:
+                    return path
+            if only_database:
+                continue
+
+            if recursive:
+                # only a recursive disk search could tell
+                if os.path.isdir(base):
+                    return None
+                continue
+
+            for candidate in candidates:
+                path = os.path.join(element, candidate)
+                if os.path.isfile(path):
+                    return path
+
+        return None
+
+    def _find_in_index(self, candidates, base, recursive):
+        base = os.path.normcase(base)
+        for candidate in candidates:
+            subdir, name = os.path.split(candidate)
+            tail = os.sep + os.path.normcase(os.path.normpath(subdir)) if subdir else ""
+            matches = []
+            for directory in self.directories(name):
+                key = os.path.normcase(directory)
+                if tail:
+                    if not key.endswith(tail):
+                        continue
+                    key = key[: -len(tail)]
+                if key == base or recursive and key.startswith(base + os.sep):
+                    matches.append(os.path.join(directory, name))
+            if len(matches) > 1:
+                return _AMBIGUOUS
+            if matches:
+                return matches[0]
+        return None
+
+
+def _kpsewhich_output(args):
+    try:
+        returncode, stdout, _ = execute_command(["kpsewhich"] + args, stderr=PIPE)
+    except OSError:
+        return None
+    return stdout if returncode == 0 else None
+
+
+def _find_databases():
+    """
+    returns the ls-R files of the TeX trees
+    """
+    paths = _kpsewhich_output(["-show-path=ls-R"])
+    if not paths:
+        return ()
+
+    result = []
+    for element in paths.split(os.pathsep):
+        element = element.lstrip("!").rstrip("/")
+        if not element:
+            continue
+        for name in DATABASE_NAMES:
+            database = os.path.join(element, name)
+            if os.path.isfile(database):
+                result.append(database)
+                break
+    return result
+
+
+def _check_environment():
+    # MUST be called with the lock held
+    global _environment, _index, _loading
+
+    key = environment_key()
+    if key != _environment:
+        _environment = key
+        _index = None
+        # an index being loaded belongs to the former environment
+        _loading = None
+        _search_paths.clear()
+
+
+def _load_index(future, environment):
+    global _index, _checked, _loading
+
+    try:
+        start = time.perf_counter()
+        index = FileIndex(_find_databases())
+        logger.debug(
+            f"loaded {len(index)} file names from ls-R in "
+            f"{time.perf_counter() - start:.2f} seconds"
+        )
+    except Exception as e:
+        logger.error("error while loading the ls-R databases")
+        traceback.print_exc()
+        with _lock:
+            if _loading is future:
+                _loading = None
+        future.set_exception(e)
+        return
+
+    with _lock:
+        if _loading is future:
+            _loading = None
+            if _environment == environment:
+                _index = index
+                _checked = time.time()
+    future.set_result(index)
+
+
+def get_index(wait=True):
+    """
+    returns the index of the databases of the TeX distribution, which is
+    loaded when it is used first and after the databases have been updated
+
+    :param wait:
+        whether to wait for the index to be loaded; if False, None is
+        returned while the index is loaded in the background
+    """
+    global _index, _checked, _loading
+
+    with _lock:
+        _check_environment()
+        if _index is not None:
+            now = time.time()
+            if now - _checked < CHECK_INTERVAL:
+                return _index
+            _checked = now
+            if not _index.is_outdated():
+                return _index
+            _index = None
+
+        future = _loading
+        if future is None:
+            future = _loading = Future()
+            environment = _environment
+        else:
+            environment = None
+
+    # the index is loaded without holding the lock, which would block the
+    # callers of search_path
+    if environment is not None:
+        # not in the I/O executor, whose workers would load it inline
+        threading.Thread(
+            target=_load_index, args=(future, environment), name="kpathsea index", daemon=True
+        ).start()
+    if not wait:
+        return None
+    return future.result()
+
+
+def search_path(file_format):
+    """
+    returns the elements of the search path of the kpathsea format
+    """
+    with _lock:
+        _check_environment()
+        try:
+            return _search_paths[file_format]
+        except KeyError:
+            pass
+
+    paths = _kpsewhich_output([f"-show-path={file_format}"])
+    result = tuple(paths.split(os.pathsep)) if paths else ()
+    with _lock:
+        _search_paths[file_format] = result
+    return result
+
+
+def lookup_all(filenames, file_format=None):
+    """
+    looks up the files in the databases and returns a dict of the found
+    ones; files, which are not found, are left to kpsewhich like all files
+    while the databases are loaded
+
+    :param filenames:
+        the names of the files as passed to kpsewhich
+
+    :param file_format:
+        the kpathsea format, e.g. "mlbib"; if None, it is derived from the
+        extension of the file names
+    """
+    index = get_index(wait=False)
+    if index is None or not index.roots:
+        return {}
+
+    result = {}
+    for filename in filenames:
+        if os.path.isabs(filename):
+            continue
+        name_format = file_format or _EXTENSION_FORMATS.get(os.path.splitext(filename)[1])
+        if name_format is None:
+            continue
+        path = index.find(filename, search_path(name_format), _FORMAT_SUFFIXES.get(name_format))
+        if path is not None:
+            result[filename] = path
+    return result
@@ -0,0 +1,171 @@
+"""
+Resolves file names in the search paths of the TeX distribution
+
+All names, which have not been resolved before, are looked up in the ls-R
+filename databases and the remaining ones with a single kpsewhich process.
+The results are kept for the lifetime of the plugin host until the texpath
+setting or the kpathsea environment variables change. Files, which have
+not been found, are looked up again after a while, so that newly installed
+files are found.
+"""
+
+import os
+import threading
+import time
+from subprocess import PIPE
+
+from . import kpathsea
+from .external_command import execute_command
+from .logging import logger
+
+__all__ = ["kpsewhich", "kpsewhich_all", "clear_cache", "match_paths"]
+
+# seconds, after which a file, which has not been found, is looked up again
+MISS_LIFE_SPAN = 60
+
+_lock = threading.Lock()
+# the environment the results have been looked up in
+_environment = None
+# maps (file_format, file_name) to (path or None, time of the lookup)
+_results = {}
+
+
+def clear_cache():
+    """
+    forgets all results, so that files are looked up again
+    """
+    global _environment
+    with _lock:
+        _results.clear()
+        _environment = None
+
+
+def kpsewhich(filename, file_format=None):
+    """
+    returns the path of the file in the search paths of the TeX distribution
+    or None, if it cannot be found
+
+    :param filename:
+        the name of the file as passed to kpsewhich
+
+    :param file_format:
+        the kpathsea format, e.g. "mlbib"; if None, it is derived from the
+        extension of the file name
+    """
+    return kpsewhich_all((filename,), file_format).get(filename)
+
+
+def kpsewhich_all(filenames, file_format=None):
+    """
+    resolves several files of the same format with at most one kpsewhich
+    process and returns a dict mapping each name to its path or None
+
+    :param filenames:
+        the names of the files as passed to kpsewhich
+
+    :param file_format:
+        the kpathsea format, e.g. "mlbib"; if None, it is derived from the
+        extension of the file names
+    """
+    global _environment
+
+    filenames = list(dict.fromkeys(filenames))
+    if not filenames:
+        return {}
+
+    key = kpathsea.environment_key()
+    now = time.time()
+    result = {}
+    missing = []
+    with _lock:
+        if key != _environment:
+            _results.clear()
+            _environment = key
+
+        for filename in filenames:
+            path, looked_up = _results.get((file_format, filename), (None, None))
+            if path is not None and os.path.exists(path):
+                result[filename] = path
+            elif path is None and looked_up is not None and now - looked_up < MISS_LIFE_SPAN:
+                result[filename] = None
+            else:
+                missing.append(filename)
+
+    if not missing:
+        return result
+
+    # the filename databases answer most lookups without running kpsewhich
+    found = kpathsea.lookup_all(missing, file_format)
+    unresolved = [filename for filename in missing if filename not in found]
+    if unresolved:
+        resolved = _run_kpsewhich(unresolved, file_format)
+        if resolved is None:
+            result.update(found)
+            result.update(dict.fromkeys(unresolved))
+            return result
+        found.update(resolved)
+
+    with _lock:
+        if _environment == key:
+            for filename in missing:
+                _results[(file_format, filename)] = (found.get(filename), now)
+
+    for filename in missing:
+        result[filename] = found.get(filename)
+    return result
+
+
+def _run_kpsewhich(filenames, file_format):
+    """
+    returns a dict of the found files or None, if kpsewhich failed
+    """
+    command = ["kpsewhich"]
+    if file_format is not None:
+        command.append(f"-format={file_format}")
+    command.extend(filenames)
+
+    try:
+        returncode, stdout, stderr = execute_command(command, stderr=PIPE)
+    except OSError as e:
+        logger.error("Could not run kpsewhich. Please ensure that your texpath setting is correct.")
+        logger.debug(e)
+        return None
+
+    # kpsewhich fails with 1, if any of the files cannot be found
+    if returncode not in (0, 1):
+        logger.error(
+            "An error occurred while trying to run kpsewhich. "
+            "Files in your TEXINPUTS could not be accessed."
+        )
+        if stderr:
+            logger.debug(stderr)
+        return None
+
+    return match_paths(filenames, stdout.splitlines())
+
+
+def match_paths(filenames, paths):
+    """
+    assigns the paths printed by kpsewhich to the file names
+
+    kpsewhich prints the paths of the found files in the order of the file
+    names and omits the files it cannot find
+    """
+    result = {}
+    remaining = iter(filenames)
+    for path in paths:
+        path = path.strip()
+        if not path:
+            continue
+        for filename in remaining:
+            if _is_path_of(path, filename):
+                result[filename] = path
+                break
+    return result
+
+
+def _is_path_of(path, filename):
+    path_name = os.path.normcase(os.path.basename(path))
+    name = os.path.normcase(os.path.basename(filename))
+    # kpsewhich appends the default suffix of the format, if it is missing
+    return path_name == name or path_name.startswith(name + ".")
@@ -86,6 +86,9 @@ from .latextools.latextools_cache_listener import (
     LatextoolsCacheUpdateListener,
     LatextoolsAnalysisUpdateCommand,
     LatextoolsBibcacheUpdateCommand,
+    LatextoolsCacheMemoryReportCommand,
+    LatextoolsCacheStatsCommand,
+    LatextoolsCacheGcCommand,
 )
 from .latextools.make_pdf import (
     LatextoolsMakePdfCommand,
@@ -156,10 +156,12 @@ class NewBibliographyPlugin(LaTeXToolsPlugin):
 
                 # decode bytes
                 text = content.decode(encoding=encoding)
+                del content, charset_match
                 text = text.replace("\r\n", "\n").replace("\r", "\n")
 
-                # parse text
-                for key, entry in parser.parse(text).items():
+                # parse text; the entries are processed as they are parsed
+                # without keeping the tokens of the whole file in memory
+                for entry in parser.iter_entries(text):
                     if entry.entry_type in excluded_types:
                         continue
 
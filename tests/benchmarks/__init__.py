@@ -0,0 +1,31 @@
+"""
+Benchmarks of LaTeXTools, which are run from the Sublime Text console
+"""
+
+import time
+
+
+def best_of(func, repeat=5):
+    """
+    returns the shortest time in seconds of several runs of the function
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def per_call(func, number, repeat=5):
+    """
+    returns the time in seconds per call of the function of the best of
+    several runs, each calling it number times
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number
@@ -0,0 +1,103 @@
+"""
+Measures the time of a full analysis of a synthetic project with 500
+included files depending on the number of parsing threads, of its
+preamble and of a large generated file
+
+Run from the Sublime Text console:
+
+    from LaTeXTools.tests.benchmarks import bench_analysis
+    bench_analysis.run()
+"""
+
+import os
+import shutil
+import tempfile
+
+from LaTeXTools.latextools.utils import analysis
+from LaTeXTools.tests.benchmarks import best_of
+
+CHAPTER = r"""
+\section{Section %(i)d}\label{sec:%(i)d}
+Some text with a reference to \ref{sec:%(j)d} and a citation \cite[p.~%(i)d]{key%(i)d}.
+%% a comment with \label{commented%(i)d}
+\begin{figure}[htbp]
+  \centering
+  \includegraphics[width=0.5\textwidth]{figures/figure%(i)d}
+  \caption{A figure with \emph{emphasis} and $\alpha + \beta$}\label{fig:%(i)d}
+\end{figure}
+\begin{equation}
+  \frac{a_{%(i)d}}{b} = \sum_{k=1}^{n} \mathrm{x}_k \label{eq:%(i)d}
+\end{equation}
+"""
+
+
+def make_project(path, files=500, sections=20):
+    with open(os.path.join(path, "main.tex"), "w") as f:
+        f.write("\\documentclass{book}\n\\usepackage{amsmath}\n\\begin{document}\n")
+        for n in range(files):
+            f.write(f"\\input{{chapters/chapter{n}}}\n")
+        f.write("\\end{document}\n")
+
+    os.makedirs(os.path.join(path, "chapters"))
+    for n in range(files):
+        with open(os.path.join(path, "chapters", f"chapter{n}.tex"), "w") as f:
+            f.write(f"\\chapter{{Chapter {n}}}\n")
+            for s in range(sections):
+                i = n * sections + s
+                f.write(CHAPTER % {"i": i, "j": (i * 7) % (files * sections)})
+    return os.path.join(path, "main.tex")
+
+
+def make_generated_file(path, size=4 * 1024 * 1024):
+    """
+    creates a file resembling a large generated table with comments
+    """
+    file_name = os.path.join(path, "table.tex")
+    with open(file_name, "w") as f:
+        f.write("\\begin{tabular}{rrrr}\n")
+        row = 0
+        while f.tell() < size:
+            f.write(f"% row {row}\n{row} & {row * 0.5} & \\num{{{row * 7}}} & 50\\% \\\\ % {row}\n")
+            row += 1
+        f.write("\\end{tabular}\n")
+    return file_name
+
+
+def _analyze(func, tex_root, **kwargs):
+    # don't reuse the results of the previous run
+    analysis._previous_analyses.pop(tex_root, None)
+    func(tex_root, **kwargs)
+
+
+def _analysis_time(tex_root, repeat, workers=1):
+    best = best_of(lambda: _analyze(analysis.analyze_document, tex_root, workers=workers), repeat)
+    return analysis._get_previous_analysis(tex_root), best
+
+
+def run(worker_counts=(1, 2, 4, 8), repeat=3):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        tex_root = make_project(tmp_dir)
+        commands = None
+        print(f"{'workers':>8} {'seconds':>10}")
+        for workers in worker_counts:
+            ana, best = _analysis_time(tex_root, repeat, workers)
+            result = list(ana.commands(analysis.ALL_COMMANDS))
+            if commands is None:
+                commands = result
+            elif result != commands:
+                print("results differ!")
+            print(f"{workers:>8} {best:>10.2f}")
+
+        best = best_of(lambda: _analyze(analysis.analyze_preamble, tex_root), repeat)
+        print(f"preamble: {best * 1000:.1f} ms")
+
+        table = make_generated_file(tmp_dir)
+        _, best = _analysis_time(table, repeat)
+        print(f"generated file of {os.path.getsize(table) // 1024} KB: {best:.2f} seconds")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,110 @@
+"""
+Measures the peak memory and the throughput of parsing a generated
+bibliography with 100k entries, streaming the tokens and entries and
+tokenizing the whole file before parsing it as before
+
+Run from the Sublime Text console:
+
+    from LaTeXTools.tests.benchmarks import bench_bibtex
+    bench_bibtex.run()
+"""
+
+import time
+import tracemalloc
+
+from LaTeXTools.vendor.bibtex import Lexer
+from LaTeXTools.vendor.bibtex import Parser
+
+PREAMBLE = """% generated bibliography
+@preamble{ "\\newcommand{\\noopsort}[1]{}" }
+@string{ acm = "Association for Computing Machinery" }
+@string{ jgg = {Journal of Geometry and Graphics} }
+@comment{ the entries below are generated }
+"""
+
+ENTRY = """@article{key%(i)d,
+  author = {M\\"{u}ller, Hans and van der Berg, Jan and Doe, J.},
+  title = "A {Study} of {\\LaTeX} Number %(i)d
+           spanning two lines",
+  journal = jgg # " (Online)",
+  publisher = acm,
+  year = %(year)d,
+  month = jan,
+  pages = {%(i)d--%(j)d},
+  keywords = {parsing, {nested {braces}}, bibliography},
+  abstract = {Some longer text describing the entry with {nested} braces
+              and a line break, which is not shown in the completions.},
+}
+
+@inproceedings{proc%(i)d,
+  editor = "Smith, A. and Jones, B.",
+  title = {Proceedings %(i)d},
+  crossref = {key%(i)d},
+  year = "%(year)d"
+}
+
+"""
+
+
+def make_bib(entries=100000):
+    """
+    returns the content of a bibliography with the number of entries
+    """
+    parts = [PREAMBLE]
+    for i in range(entries // 2):
+        parts.append(ENTRY % {"i": i, "j": i + 10, "year": 1950 + i % 70})
+    return "".join(parts)
+
+
+class _TokenList:
+    """
+    a lexer returning tokens, which have been created beforehand
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def tokenize(self, code):
+        return self.tokens
+
+
+def _parse_token_list(text):
+    # the whole token list is created before the entries are parsed
+    parser = Parser(_TokenList(Lexer().tokenize(text)))
+    return [e for e in parser.parse(text).values()]
+
+
+def _parse_streaming(text):
+    return list(Parser().iter_entries(text))
+
+
+def _measure(func, text):
+    start = time.perf_counter()
+    result = func(text)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        func(text)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def run(entries=100000):
+    text = make_bib(entries)
+    size = len(text) / 1024 / 1024
+    print(f"{entries} entries, {size:.1f} MB")
+    print(f"{'parser':<12} {'seconds':>8} {'MB/s':>6} {'peak MB':>8}")
+    results = []
+    for label, func in (("token list", _parse_token_list), ("streaming", _parse_streaming)):
+        result, seconds, peak = _measure(func, text)
+        results.append([(e.cite_key, e.entry_type, dict(e)) for e in result])
+        print(f"{label:<12} {seconds:>8.2f} {size / seconds:>6.2f} {peak / 1024 / 1024:>8.0f}")
+    if results[0] != results[1]:
+        print("results differ!")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,86 @@
+"""
+Measures the throughput of the bibtex lexer scanning a generated
+bibliography with its master regexes and trying the token methods one after
+another as before
+
+Run from the Sublime Text console:
+
+    from LaTeXTools.tests.benchmarks import bench_bibtex_lexer
+    bench_bibtex_lexer.run()
+"""
+
+import time
+
+from LaTeXTools.vendor.bibtex import Lexer
+
+from .bench_bibtex import make_bib
+
+
+def _scan_token_methods(code):
+    # the former loop of the lexer, which runs a match for each token method
+    lexer = Lexer()
+    lexer.code = code
+    lexer.code_len = len(code)
+    tokens = []
+    while lexer.current_index < lexer.code_len:
+        if not lexer.in_entry:
+            consumed = (
+                lexer.whitespace_token()
+                or lexer.comment_token()
+                or lexer.preamble_token()
+                or lexer.string_token()
+                or lexer.entry_token()
+                or lexer.line_ignored_token()
+            )
+        else:
+            consumed = (
+                lexer.whitespace_token()
+                or lexer.line_comment_token()
+                or lexer.comma_token()
+                or lexer.key_token()
+                or lexer.value_token()
+                or lexer.quoted_string_token()
+                or lexer.identifier_token()
+                or lexer.number_token()
+                or lexer.hash_token()
+                or lexer.entry_end_token()
+                or lexer.token_error()
+            )
+        lexer.current_index += consumed
+        tokens.extend(lexer.tokens)
+        lexer.tokens = []
+    tokens.append(("EOF", "", {}))
+    return tokens
+
+
+def _scan_master_regex(code):
+    return Lexer().tokenize(code)
+
+
+def _stream_master_regex(code):
+    # the parser consumes the tokens without keeping them
+    return [token[:2] for token in Lexer().iter_tokens(code)]
+
+
+def run(entries=100000):
+    text = make_bib(entries)
+    size = len(text) / 1024 / 1024
+    print(f"{entries} entries, {size:.1f} MB")
+    print(f"{'lexer':<14} {'seconds':>8} {'MB/s':>6}")
+    results = []
+    for label, func in (
+        ("token methods", _scan_token_methods),
+        ("master regex", _scan_master_regex),
+        ("streaming", _stream_master_regex),
+    ):
+        start = time.perf_counter()
+        tokens = func(text)
+        seconds = time.perf_counter() - start
+        results.append([token[:2] for token in tokens])
+        print(f"{label:<14} {seconds:>8.2f} {size / seconds:>6.2f}")
+    if any(result != results[0] for result in results):
+        print("tokens differ!")
+
+
+if __name__ == "__main__":
+    run()
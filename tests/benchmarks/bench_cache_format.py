@@ -0,0 +1,99 @@
+"""
+Compares the size and load time of cache entries stored as raw pickle files
+with the pack store using the different codecs
+
+Run from the Sublime Text console:
+
+    from LaTeXTools.tests.benchmarks import bench_cache_format
+    bench_cache_format.run()
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+
+from LaTeXTools.latextools.utils.cache_store import CODECS
+from LaTeXTools.latextools.utils.cache_store import PackStore
+from LaTeXTools.tests.benchmarks import best_of
+
+
+def make_analysis_like(files=300, commands=200):
+    """
+    creates a value resembling the pickled analysis of a large document
+    """
+    return tuple(
+        {
+            "file_name": f"/home/user/book/chapters/chapter{f:03d}.tex",
+            "commands": tuple(
+                (
+                    ("label", "ref", "cite", "section")[c % 4],
+                    f"{{sec:chapter{f:03d}-{c}}}",
+                    f"chapter{f:03d}-{c}",
+                    f * commands + c,
+                )
+                for c in range(commands)
+            ),
+        }
+        for f in range(files)
+    )
+
+
+def make_bib_like(entries=20000):
+    """
+    creates a value resembling the parsed entries of a large bib file
+    """
+    return tuple(
+        {
+            "keyword": f"author{i}:{1950 + i % 70}",
+            "entry_type": "article",
+            "author": f"Lastname{i}, Firstname and Other{i % 97}, Second",
+            "title": f"On the properties of the structure number {i}",
+            "journal": f"Journal of Examples {i % 31}",
+            "year": str(1950 + i % 70),
+        }
+        for i in range(entries)
+    )
+
+
+def bench_value(name, value, tmp_dir, repeat=5):
+    rows = []
+
+    raw_path = os.path.join(tmp_dir, name + ".pickle")
+    with open(raw_path, "wb") as f:
+        pickle.dump(value, f, protocol=-1)
+
+    def load_raw():
+        with open(raw_path, "rb") as f:
+            pickle.load(f)
+
+    rows.append(("pickle", os.path.getsize(raw_path), best_of(load_raw, repeat)))
+
+    for codec in CODECS:
+        path = os.path.join(tmp_dir, f"{name}-{codec}.pack")
+        PackStore(path, codec).commit({name: value})
+        rows.append(
+            (
+                f"pack ({codec})",
+                os.path.getsize(path),
+                best_of(lambda: PackStore(path).read(name), repeat),
+            )
+        )
+
+    print(f"{name}:")
+    print(f"  {'format':<14} {'size KB':>10} {'load ms':>10}")
+    for label, size, seconds in rows:
+        print(f"  {label:<14} {size / 1024:>10.0f} {seconds * 1000:>10.1f}")
+
+
+def run():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        bench_value("analysis", make_analysis_like(), tmp_dir)
+        bench_value("bib_entries", make_bib_like(), tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
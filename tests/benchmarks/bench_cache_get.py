@@ -0,0 +1,50 @@
+"""
+Measures the overhead of a cache hit for values, which are shared, and for
+values, which are copied on every hit as all objects used to be
+
+Run from the Sublime Text console:
+
+    from LaTeXTools.tests.benchmarks import bench_cache_get
+    bench_cache_get.run()
+"""
+
+from LaTeXTools.latextools.utils import analysis
+from LaTeXTools.latextools.utils.cache import GlobalCache
+from LaTeXTools.tests.benchmarks import per_call
+
+
+class CopiedValue:
+    """a value of a class, which is not declared as immutable"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+def run(number=100000):
+    ana = analysis.Analysis("/tmp/main.tex")
+    ana._freeze()
+
+    cache = GlobalCache()
+    values = {
+        "bench_analysis": ana,
+        "bench_tuple": tuple(range(100)),
+        "bench_copied": CopiedValue(tuple(range(100))),
+    }
+    for key, value in values.items():
+        cache.set(key, value)
+
+    objects = {"key": ana}
+    baseline = per_call(lambda: objects["key"], number)
+    print(f"{'value':<16} {'us per hit':>10} {'shared':>8}")
+    print(f"{'dict lookup':<16} {baseline * 1e6:>10.2f}")
+    try:
+        for key, value in values.items():
+            seconds = per_call(lambda: cache.get(key), number)
+            shared = cache.get(key) is value
+            print(f"{key[6:]:<16} {seconds * 1e6:>10.2f} {str(shared):>8}")
+    finally:
+        cache.invalidate(list(values))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,62 @@
+"""
+Compares the memory and pickle size of the command entries of an analysis
+with the objectview(frozendict) entries with regions used before
+
+Run from the Sublime Text console:
+
+    from LaTeXTools.tests.benchmarks import bench_command_entries
+    bench_command_entries.run()
+"""
+
+import pickle
+import shutil
+import tempfile
+import tracemalloc
+
+from LaTeXTools.vendor.frozendict import frozendict
+from LaTeXTools.latextools.utils import analysis
+from LaTeXTools.tests.benchmarks.bench_analysis import make_project
+
+
+def _as_objectview(entry):
+    d = entry._asdict()
+    del d["spans"]
+    d["end"] = entry.end
+    d["region"] = entry.region
+    for name in analysis._ENTRY_GROUPS:
+        d[name + "_region"] = getattr(entry, name + "_region")
+    return analysis.objectview(frozendict(d))
+
+
+def _measure(make_entries):
+    tracemalloc.start()
+    try:
+        entries = make_entries()
+        memory = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return entries, memory, len(pickle.dumps(entries, protocol=-1))
+
+
+def run(files=100):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        tex_root = make_project(tmp_dir, files=files)
+        ana = analysis.analyze_document(tex_root, workers=1)
+        entries = ana.commands(analysis.ALL_COMMANDS)
+        print(f"{len(entries)} entries")
+        print(f"{'entries':<12} {'memory KB':>10} {'pickle KB':>10}")
+        for label, make_entries in (
+            ("objectview", lambda: [_as_objectview(e) for e in entries]),
+            # copy the entries to measure them without the analysis
+            ("slotted", lambda: [analysis.CommandEntry(*e) for e in entries]),
+        ):
+            _, memory, pickle_size = _measure(make_entries)
+            print(f"{label:<12} {memory / 1024:>10.0f} {pickle_size / 1024:>10.0f}")
+    finally:
+        analysis._previous_analyses.pop(tex_root, None)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
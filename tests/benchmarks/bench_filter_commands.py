@@ -0,0 +1,58 @@
+"""
+Compares filtering the commands of an analysis by name using the command
+index with a scan over all commands and measures the memory of the index
+
+Run from the Sublime Text console:
+
+    from LaTeXTools.tests.benchmarks import bench_filter_commands
+    bench_filter_commands.run()
+"""
+
+import shutil
+import tempfile
+import tracemalloc
+
+from LaTeXTools.latextools.utils import analysis
+from LaTeXTools.tests.benchmarks import per_call
+from LaTeXTools.tests.benchmarks.bench_analysis import make_project
+
+QUERIES = (
+    "label",
+    "documentclass",
+    ["bibliography", "nobibliography", "addbibresource"],
+    ["section", "subsection", "label"],
+)
+
+
+def _scan(ana, how):
+    if isinstance(how, str):
+        return [c for c in ana.commands() if c.command == how]
+    return [c for c in ana.commands() if c.command in how]
+
+
+def run(files=100, number=20):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        tex_root = make_project(tmp_dir, files=files)
+        ana = analysis.analyze_document(tex_root, workers=1)
+
+        tracemalloc.start()
+        try:
+            ana._build_index(analysis.DEFAULT_FLAGS)
+            memory = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        print(f"{len(ana.commands())} commands, index {memory / 1024:.0f} KB")
+
+        print(f"{'query':<48} {'scan ms':>8} {'index ms':>8}")
+        for how in QUERIES:
+            scan = per_call(lambda: _scan(ana, how), number)
+            index = per_call(lambda: list(ana.filter_commands(how)), number)
+            print(f"{str(how)[:48]:<48} {scan * 1000:>8.3f} {index * 1000:>8.3f}")
+    finally:
+        analysis._previous_analyses.pop(tex_root, None)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
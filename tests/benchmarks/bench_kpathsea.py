@@ -0,0 +1,77 @@
+"""
+Compares looking up files in the index of the ls-R databases with running
+kpsewhich and measures loading a synthetic database of the size of a full
+TeX Live installation
+
+Run from the Sublime Text console:
+
+    from LaTeXTools.tests.benchmarks import bench_kpathsea
+    bench_kpathsea.run()
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from LaTeXTools.latextools.utils import kpathsea
+from LaTeXTools.latextools.utils import kpsewhich
+from LaTeXTools.tests.benchmarks import per_call
+
+# files of a TeX Live installation
+NAMES = ("article.cls", "amsmath.sty", "hyperref.sty", "plain.bst", "xampl.bib", "biblatex.sty")
+
+
+def make_database(path, dirs=15000, files_per_dir=10):
+    database = os.path.join(path, "ls-R")
+    with open(database, "w") as f:
+        f.write("% ls-R -- filename database for kpathsea; do not change this line.\n")
+        for d in range(dirs):
+            f.write(f"\n./tex/latex/package{d}:\n")
+            for n in range(files_per_dir):
+                f.write(f"file{d}-{n}.sty\nREADME\n")
+    return database
+
+
+def run(number=1000):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        database = make_database(tmp_dir)
+        tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            index = kpathsea.FileIndex([database])
+            load_time = time.perf_counter() - start
+            memory = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        print(
+            f"synthetic ls-R of {os.path.getsize(database) // 1024} KB: {len(index)} names, "
+            f"loaded in {load_time:.2f} s, {memory / 1024 / 1024:.1f} MB"
+        )
+
+        search_path = ("!!" + os.path.join(tmp_dir, "tex") + "//",)
+        lookup = per_call(lambda: index.find("file7000-3", search_path, ".sty"), number)
+        print(f"synthetic lookup: {lookup * 1e6:.1f} us")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    index = kpathsea.get_index()
+    if not index.roots:
+        print("no ls-R databases found, skipping the comparison with kpsewhich")
+        return
+
+    found = kpathsea.lookup_all(NAMES)
+    print(f"{len(found)} of {len(NAMES)} files found in {len(index.roots)} databases")
+    lookup = per_call(lambda: kpathsea.lookup_all(NAMES), number)
+    each = per_call(lambda: [kpsewhich._run_kpsewhich([n], None) for n in NAMES], 3, repeat=1)
+    batched = per_call(lambda: kpsewhich._run_kpsewhich(list(NAMES), None), 3, repeat=1)
+    print(f"{'method':<28} {'ms':>10}")
+    print(f"{'ls-R index':<28} {lookup * 1000:>10.3f}")
+    print(f"{'kpsewhich per file':<28} {each * 1000:>10.3f}")
+    print(f"{'kpsewhich batched':<28} {batched * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    run()
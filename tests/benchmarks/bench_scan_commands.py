@@ -0,0 +1,66 @@
+"""
+Compares finding the commands of large single files with the command
+scanner and with matching _RE_COMMAND recursively on the arguments
+
+Run from the Sublime Text console:
+
+    from LaTeXTools.tests.benchmarks import bench_scan_commands
+    bench_scan_commands.run()
+"""
+
+from LaTeXTools.latextools.utils import analysis
+from LaTeXTools.tests.benchmarks import best_of
+from LaTeXTools.tests.benchmarks.bench_analysis import CHAPTER
+from LaTeXTools.tests.test_analysis import _regex_entries
+
+
+def make_document(size=2 * 1024 * 1024):
+    parts = []
+    length = 0
+    i = 0
+    while length < size:
+        part = CHAPTER % {"i": i, "j": i // 2}
+        parts.append(part)
+        length += len(part)
+        i += 1
+    return "".join(parts)
+
+
+def make_nested(depth=400):
+    return "\\a{" * depth + "x" + "}" * depth
+
+
+def make_unclosed(commands=5000):
+    return "\\textbf{" + " \\emph{text}" * commands
+
+
+def _regex_scan(content):
+    return [tuple(_regex_entries(m, "main.tex")) for m in analysis._RE_COMMAND.finditer(content)]
+
+
+def _scan(content):
+    return list(analysis._scan_commands(content, "main.tex"))
+
+
+def run(repeat=3):
+    documents = (
+        ("2 MB document", make_document()),
+        ("nested 400", make_nested()),
+        ("unclosed arg", make_unclosed()),
+    )
+    print(f"{'content':<16} {'KB':>6} {'commands':>9} {'regex s':>8} {'scanner s':>9}")
+    for label, content in documents:
+        groups = _scan(content)
+        if groups != _regex_scan(content):
+            print(f"{label}: results differ!")
+        commands = sum(len(g) for g in groups)
+        regex_time = best_of(lambda: _regex_scan(content), repeat)
+        scan_time = best_of(lambda: _scan(content), repeat)
+        print(
+            f"{label:<16} {len(content) // 1024:>6} {commands:>9} "
+            f"{regex_time:>8.2f} {scan_time:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,499 @@
+import itertools
+import os
+import random
+import shutil
+import tempfile
+from functools import partial
+from unittest import TestCase
+from unittest.mock import patch
+
+from LaTeXTools.latextools.utils import analysis
+from LaTeXTools.latextools.utils import include_index
+from LaTeXTools.latextools.utils import utils
+from LaTeXTools.latextools.utils.cache import CacheMiss
+from LaTeXTools.latextools.utils.cache import LocalCache
+from LaTeXTools.latextools.utils.cache import discard_unsaved_input
+
+MAIN = r"""\documentclass{article}
+\usepackage{local}
+\begin{document}
+\input{chapters/one}
+\include{chapters/two}
+\input{parts/three}
+% \input{commented}
+\end{document}
+"""
+
+FILES = {
+    "local.sty": "\\newcommand{\\foo}{bar}\n",
+    "chapters/one.tex": "\\section{One}\\label{sec:one}\n\\ref{sec:two}\n",
+    "chapters/two.tex": "\\section{Two}\\label{sec:two}\n\\cite{a,b}\n",
+    "parts/three.tex": "\\section{Three}\\label{sec:three}\\input{parts/four}\n",
+    "parts/four.tex": "\\label{sec:four} % \\label{commented}\n",
+}
+
+
+def _commands(ana):
+    return list(ana.commands(analysis.ALL_COMMANDS))
+
+
+class IncrementalAnalysisTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.tex_root = os.path.join(self.tmp_dir, "main.tex")
+        self._write("main.tex", MAIN)
+        for name, content in FILES.items():
+            self._write(name, content)
+
+    def tearDown(self):
+        analysis._previous_analyses.pop(self.tex_root, None)
+        LocalCache(self.tex_root).invalidate()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def _full_analysis(self):
+        analysis._previous_analyses.pop(self.tex_root, None)
+        return analysis.analyze_document(self.tex_root)
+
+    def assertSameAnalysis(self, ana, expected):
+        self.assertEqual(_commands(ana), _commands(expected))
+        self.assertEqual(dict(ana._content), dict(expected._content))
+        self.assertEqual(dict(ana._raw_content), dict(expected._raw_content))
+        self.assertEqual(ana._import_base_paths, expected._import_base_paths)
+
+    def test_unchanged_files_are_reused(self):
+        first = analysis.analyze_document(self.tex_root)
+        self._write("chapters/two.tex", "\\section{Changed}\\label{sec:changed}\n")
+        second = analysis.analyze_document(self.tex_root)
+
+        two = os.path.join(self.tmp_dir, "chapters", "two.tex")
+        for file_name, parsed in second._files.items():
+            if file_name == two:
+                self.assertIsNot(parsed, first._files[file_name])
+            else:
+                self.assertIs(parsed, first._files[file_name])
+
+    def test_incremental_equals_full_analysis(self):
+        analysis.analyze_document(self.tex_root)
+        self._write("parts/four.tex", "\\label{sec:new}\n\\input{chapters/one}\n")
+        self._write("chapters/one.tex", "\\section{One}\n\\usepackage{local}\n")
+        incremental = analysis.analyze_document(self.tex_root)
+        self.assertSameAnalysis(incremental, self._full_analysis())
+        labels = [c.args for c in incremental.filter_commands("label")]
+        self.assertEqual(labels, ["sec:two", "sec:three", "sec:new"])
+
+    def test_parallel_equals_serial_analysis(self):
+        serial = self._full_analysis()
+        analysis._previous_analyses.pop(self.tex_root, None)
+        parallel = analysis.analyze_document(self.tex_root, workers=4)
+        self.assertSameAnalysis(parallel, serial)
+
+
+class FilterCommandsTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.tex_root = os.path.join(self.tmp_dir, "main.tex")
+        with open(self.tex_root, "w") as f:
+            f.write(
+                "\\section{A}\\label{a}\\ref{b}\n\\begin{equation}\\label{b}\\end{equation}\n"
+                "\\section{B}\\ref{a}\\emph{\\label{c}}\\label{}\n"
+            )
+        self.ana = analysis.analyze_document(self.tex_root)
+
+    def tearDown(self):
+        analysis._previous_analyses.pop(self.tex_root, None)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def assertSameAsScan(self, how, flags=analysis.DEFAULT_FLAGS):
+        if isinstance(how, str):
+            expected = [c for c in self.ana.commands(flags) if c.command == how]
+        else:
+            expected = [c for c in self.ana.commands(flags) if c.command in how]
+        self.assertEqual(list(self.ana.filter_commands(how, flags)), expected)
+        return expected
+
+    def test_filter_by_name(self):
+        labels = self.assertSameAsScan("label")
+        self.assertEqual([c.args for c in labels], ["a", "b", "c", ""])
+        self.assertSameAsScan("label", analysis.ONLY_COMMANDS_WITH_ARG_CONTENT)
+        self.assertSameAsScan("begin", analysis.ALL_COMMANDS)
+        self.assertSameAsScan("undefined")
+
+    def test_filter_by_names_keeps_document_order(self):
+        commands = self.assertSameAsScan(["ref", "section", "label"])
+        self.assertEqual(
+            [c.command for c in commands],
+            ["section", "label", "ref", "label", "section", "ref", "label", "label"],
+        )
+        self.assertSameAsScan(("ref", "ref", "undefined"))
+        self.assertSameAsScan([])
+
+
+def _regex_entries(m, file_name, offset=0):
+    """the entries found by _RE_COMMAND, which the scanner replaces"""
+    start = m.start()
+    spans = []
+    for name in analysis._ENTRY_GROUPS:
+        if m.group(name) is None:
+            spans += [None, None]
+        else:
+            spans += [m.start(name) - start, m.end(name) - start]
+    values = [m.group(name) for name in analysis._ENTRY_GROUPS]
+    entry = analysis.CommandEntry(*values, file_name, m.group(0), offset + start, tuple(spans))
+    yield entry
+
+    for i, args_name in enumerate(analysis._COMMAND_ARG_NAMES, 2):
+        args_content = getattr(entry, args_name)
+        if not args_content:
+            continue
+        for em in analysis._RE_COMMAND.finditer(args_content):
+            yield from _regex_entries(em, file_name, offset=entry.start + spans[2 * i])
+
+
+SNIPPETS = [
+    "\\section*{Title}\\label{sec:title}",
+    "\\cite[p.~5][see]{a,b} \\cite [x]\n [y]\n\n{z}",
+    "\\newcommand{\\foo}[2][default]{\\textbf{#1} and \\emph{#2}}",
+    "\\newenvironment{env}[1][opt]{\\begin{center}}{\\end{center}}",
+    "\\textbf{unclosed \\emph{nested} text",
+    "\\foo[\\textbf{a]b}] \\bar{[}] \\baz[{]}",
+    "\\\\section{after a line break} \\a\\b\\c{\\d{\\e[\\f]}}",
+    "\\href{http://a.b/c\\#d}{\\texttt{\\{x\\}}}\\\\[2pt]",
+    "\\x{a}{b}[c]{d}{e}[f]{g}{h} \\y \t{a}\t \n \t[b]",
+    "",
+    "no commands { [ ] } at all",
+]
+
+
+class ReadOnlyAnalysisTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.tex_root = os.path.join(self.tmp_dir, "main.tex")
+        with open(self.tex_root, "w") as f:
+            f.write("\\graphicspath{{figures/}}\n\\section{A}\\label{a}\n")
+        self.cache = LocalCache(self.tex_root)
+
+    def tearDown(self):
+        analysis._previous_analyses.pop(self.tex_root, None)
+        self.cache.invalidate()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_cache_hits_share_the_analysis(self):
+        ana = self.cache.cache("analysis", partial(analysis.analyze_document, self.tex_root))
+        self.cache._validated.clear()
+        self.assertIs(self.cache.get("analysis"), ana)
+        self.assertIs(self.cache.cache("analysis", lambda: None), ana)
+
+    def test_returned_collections_are_read_only(self):
+        ana = self.cache.cache("analysis", partial(analysis.analyze_document, self.tex_root))
+        with self.assertRaises(AttributeError):
+            ana.commands().append(None)
+        with self.assertRaises(AttributeError):
+            next(ana.filter_commands("label")).args = "b"
+        with self.assertRaises(AttributeError):
+            ana.graphics_paths().append("other")
+        with self.assertRaises(TypeError):
+            ana.line_offsets(self.tex_root)[0] = 1
+        with self.assertRaises(TypeError):
+            ana._import_base_paths[self.tex_root] = self.tmp_dir
+        with self.assertRaises(TypeError):
+            ana._all_commands = ()
+
+        self.assertEqual([c.args for c in ana.filter_commands("label")], ["a"])
+        self.assertEqual(ana.graphics_paths(), (os.path.join(self.tmp_dir, "figures"),))
+
+
+class ScanCommandsTest(TestCase):
+    def assertSameAsRegex(self, content):
+        expected = [
+            tuple(_regex_entries(m, "file.tex")) for m in analysis._RE_COMMAND.finditer(content)
+        ]
+        actual = list(analysis._scan_commands(content, "file.tex"))
+        self.assertEqual(actual, expected, content)
+
+    def test_snippets(self):
+        for content in SNIPPETS:
+            self.assertSameAsRegex(content)
+
+    def test_fixtures(self):
+        fixtures = os.path.join(os.path.dirname(__file__), "fixtures")
+        for dir_path, _, file_names in os.walk(fixtures):
+            for file_name in file_names:
+                if file_name.endswith((".tex", ".sty", ".cls")):
+                    with open(os.path.join(dir_path, file_name), encoding="utf-8") as f:
+                        self.assertSameAsRegex(analysis._strip_comments(f.read()))
+
+    def test_random_content(self):
+        tokens = ["\\a", "\\bc", "\\d*", "\\\\", "{", "}", "[", "]", " ", "\t", "\n", "*", "x"]
+        rand = random.Random(42)
+        for _ in range(2000):
+            self.assertSameAsRegex("".join(rand.choices(tokens, k=rand.randint(1, 40))))
+
+
+def _strip_comments_by_chars(raw_content):
+    """the character-wise comment stripping replaced by _strip_comments"""
+    content = list(raw_content)
+    for m in analysis._RE_COMMENT.finditer(raw_content):
+        for i in range(m.start(), m.end()):
+            content[i] = " "
+    return "".join(content)
+
+
+class StripCommentsTest(TestCase):
+    def test_same_as_blanking_characters(self):
+        contents = [
+            "",
+            "no comment",
+            "% comment\ntext % comment\n\\% no comment\\\\% comment",
+            "50\\%%%\n%\n\n%ä€\ttext",
+        ]
+        tokens = ["%", "\\", "\\%", "a", "ä", " ", "\n", "\t", "{"]
+        rand = random.Random(42)
+        contents += ["".join(rand.choices(tokens, k=rand.randint(1, 50))) for _ in range(1000)]
+        for content in contents:
+            self.assertEqual(
+                analysis._strip_comments(content), _strip_comments_by_chars(content), content
+            )
+
+
+def _rowcol_by_scan(string):
+    """the linear rowcol replaced by the bisect based one"""
+    rowpos = list(itertools.accumulate(len(x) + 1 for x in string.split("\n")))
+
+    def rowcol(pos):
+        last = 0
+        for i, k in enumerate(rowpos):
+            if pos < k:
+                return (i, pos - last)
+            last = k
+        return (-1, -1)
+
+    return rowcol
+
+
+class RowcolTest(TestCase):
+    def test_same_as_scanning_lines(self):
+        rand = random.Random(42)
+        strings = ["", "\n", "a", "ab\n\ncd\n", "\n\nx"]
+        strings += ["".join(rand.choices("ab\n", k=rand.randint(1, 30))) for _ in range(200)]
+        for string in strings:
+            rowcol = analysis.make_rowcol(string)
+            expected = _rowcol_by_scan(string)
+            for pos in range(-2, len(string) + 3):
+                self.assertEqual(rowcol(pos), expected(pos), (string, pos))
+
+    def test_line_offsets_of_analysis(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        tex_root = os.path.join(tmp_dir, "main.tex")
+        with open(tex_root, "w") as f:
+            f.write("\\section{A}\n\n  \\label{a}\n")
+        self.addCleanup(analysis._previous_analyses.pop, tex_root, None)
+        ana = analysis.analyze_document(tex_root)
+
+        self.assertEqual(list(ana.line_offsets(tex_root)), [0, 12, 13, 25, 26])
+        self.assertIs(ana.line_offsets(tex_root), ana.line_offsets(tex_root))
+        label = next(ana.filter_commands("label"))
+        self.assertEqual(ana.rowcol(tex_root)(label.start), (2, 2))
+
+
+class PreambleAnalysisTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.tex_root = os.path.join(self.tmp_dir, "main.tex")
+
+    def tearDown(self):
+        analysis._previous_analyses.pop(self.tex_root, None)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.tmp_dir, name), "w") as f:
+            f.write(content)
+
+    def test_preamble_commands(self):
+        self._write(
+            "main.tex",
+            "\\documentclass{article}\n\\input{packages}\n"
+            "\\newenvironment{env}{[}{]}\n"
+            "% \\begin{document}\n\\begin{document}\n\\input{body}\\usepackage{late}\n",
+        )
+        self._write("packages.tex", "\\usepackage{amsmath}\\usepackage[x]{y}\n")
+        self._write("body.tex", "\\usepackage{inbody}\n")
+
+        preamble = analysis.analyze_preamble(self.tex_root)
+        full = analysis.analyze_document(self.tex_root)
+        self.assertEqual(
+            list(preamble.commands(analysis.ALL_COMMANDS)),
+            list(full.commands(analysis.ALL_COMMANDS | analysis.ONLY_PREAMBLE)),
+        )
+        self.assertEqual([c.args for c in preamble.filter_commands("usepackage")], ["amsmath", "y"])
+        body = os.path.join(self.tmp_dir, "body.tex")
+        self.assertNotIn(body, preamble._files)
+
+    def test_unbalanced_preamble(self):
+        # the argument of \foo contains \begin{document}
+        self._write(
+            "main.tex", "\\usepackage{a}\\foo{\n\\begin{document}\n}\\begin{document}\\label{a}"
+        )
+        preamble = analysis.analyze_preamble(self.tex_root)
+        self.assertEqual(
+            [(c.command, c.args) for c in preamble.commands(analysis.ALL_COMMANDS)],
+            [("usepackage", "a"), ("foo", "\n\\begin{document}\n"), ("begin", "document")],
+        )
+
+
+class LiveUpdateTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.tex_root = os.path.join(self.tmp_dir, "main.tex")
+        self.main = (
+            "\\documentclass{article}\n\\begin{document}\n\\input{one}\n\n"
+            "\\section{A}\\label{a}\n\nText \\ref{a}.\n\n\\section{B}\\label{b}\n"
+        )
+        self._write("main.tex", self.main)
+        self._write("one.tex", "\\label{one}\n")
+
+    def tearDown(self):
+        analysis._previous_analyses.pop(self.tex_root, None)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.tmp_dir, name), "w") as f:
+            f.write(content)
+
+    def test_update_equals_full_analysis(self):
+        ana = analysis.analyze_document(self.tex_root)
+        content = self.main.replace("Text", "\\label{new} Text \\input{two}")
+        self._write("two.tex", "\\label{two}\n")
+        updated = analysis.update_analysis(ana, self.tex_root, content)
+
+        one = os.path.join(self.tmp_dir, "one.tex")
+        self.assertIs(updated._files[one], ana._files[one])
+        self.assertEqual(
+            [c.args for c in updated.filter_commands("label")], ["one", "a", "new", "two", "b"]
+        )
+        self._write("main.tex", content)
+        analysis._previous_analyses.pop(self.tex_root, None)
+        self.assertEqual(
+            list(updated.commands(analysis.ALL_COMMANDS)),
+            list(analysis.analyze_document(self.tex_root).commands(analysis.ALL_COMMANDS)),
+        )
+
+    def test_reparse_equals_parse(self):
+        tokens = ["\\a", "\\bc", "{", "}", "[", "]", " ", "\n", "\n\n", "x", "%", "\\ref{x}"]
+        rand = random.Random(42)
+        for _ in range(2000):
+            old = "".join(rand.choices(tokens, k=rand.randint(0, 60)))
+            parsed = analysis._parse_content("f.tex", old, analysis.hash_digest(old))
+            start = rand.randint(0, len(old))
+            end = rand.randint(start, min(len(old), start + 8))
+            new = old[:start] + "".join(rand.choices(tokens, k=rand.randint(0, 4))) + old[end:]
+            self.assertEqual(
+                analysis._reparse_file(parsed, "f.tex", new),
+                analysis._parse_content("f.tex", new, analysis.hash_digest(new)),
+                (old, new),
+            )
+
+    def test_empty_input(self):
+        ana = analysis.analyze_document(self.tex_root)
+        content = self.main.replace("Text", "\\input{}")
+        updated = analysis.update_analysis(ana, self.tex_root, content)
+        self.assertEqual(len(list(updated.filter_commands("input"))), 2)
+        # the tex root must not be considered as cyclic afterwards
+        analysis._previous_analyses.pop(self.tex_root, None)
+        ana = analysis.analyze_document(self.tex_root)
+        self.assertEqual([c.args for c in ana.filter_commands("label")], ["one", "a", "b"])
+
+    def test_discarded_update_is_not_cached(self):
+        cache = LocalCache(self.tex_root)
+        ana = cache.cache("analysis", partial(analysis.analyze_document, self.tex_root))
+        content = self.main.replace("Text", "\\label{unsaved} Text")
+        cache.refresh("analysis", partial(analysis.update_analysis, ana, self.tex_root, content))
+
+        # the unsaved content is valid while it is shown
+        cache._validated.clear()
+        labels = [c.args for c in cache.get("analysis").filter_commands("label")]
+        self.assertIn("unsaved", labels)
+
+        # e.g. the view is closed without saving it
+        discard_unsaved_input(self.tex_root)
+        with self.assertRaises(CacheMiss):
+            cache.get("analysis")
+
+    def test_modified_view_is_not_cached_as_the_file(self):
+        class View:
+            def __init__(self, content):
+                self.content = content
+
+            def is_dirty(self):
+                return True
+
+            def size(self):
+                return len(self.content)
+
+            def substr(self, region):
+                return self.content[region.begin() : region.end()]
+
+        one = os.path.join(self.tmp_dir, "one.tex")
+        views = {one: View("\\label{modified}\n")}
+        cache = LocalCache(self.tex_root)
+        self.addCleanup(cache.invalidate)
+        with patch.object(utils, "get_open_view", views.get):
+            ana = cache.cache("analysis", partial(analysis.analyze_document, self.tex_root))
+        self.assertEqual([c.args for c in ana.filter_commands("label")], ["modified", "a", "b"])
+
+        # the file is unchanged, but the view has been closed without saving
+        discard_unsaved_input(one)
+        with self.assertRaises(CacheMiss):
+            cache.get("analysis")
+
+
+class IncludeIndexTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.roots = [os.path.join(self.tmp_dir, name) for name in ("book.tex", "thesis.tex")]
+        self.shared = os.path.join(self.tmp_dir, "shared.tex")
+        self.own = os.path.join(self.tmp_dir, "own.tex")
+        self._write("book.tex", "\\documentclass{book}\n\\input{shared}\n\\input{own}\n")
+        self._write("thesis.tex", "\\documentclass{report}\n\\input{shared}\n")
+        self._write("shared.tex", "\\label{shared}\n")
+        self._write("own.tex", "\\label{own}\n")
+
+    def tearDown(self):
+        for tex_root in self.roots:
+            analysis._previous_analyses.pop(tex_root, None)
+            include_index.update(tex_root, ())
+            LocalCache(tex_root).invalidate()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.tmp_dir, name), "w") as f:
+            f.write(content)
+
+    def test_dependent_roots(self):
+        for tex_root in self.roots:
+            analysis.analyze_document(tex_root)
+        self.assertEqual(include_index.dependent_roots(self.shared), set(self.roots))
+        self.assertEqual(include_index.dependent_roots(self.own), {self.roots[0]})
+
+        self._write("book.tex", "\\documentclass{book}\n\\input{shared}\n")
+        analysis.analyze_document(self.roots[0])
+        self.assertEqual(include_index.dependent_roots(self.own), set())
+
+    def test_invalidate_dependents(self):
+        caches = [LocalCache(tex_root) for tex_root in self.roots]
+        for cache in caches:
+            cache.refresh("analysis", partial(analysis.analyze_document, cache.tex_root))
+            cache.set("unrelated", 1)
+
+        self.assertEqual(caches[1].invalidate_dependents(self.own), [])
+        self.assertTrue(caches[1].has("analysis"))
+        for cache in caches:
+            self.assertEqual(cache.invalidate_dependents(self.shared), ["analysis"])
+            self.assertFalse(cache.has("analysis"))
+            self.assertTrue(cache.has("unrelated"))
@@ -0,0 +1,366 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from LaTeXTools.latextools import latextools_cache_listener
+from LaTeXTools.latextools.utils import cache
+from LaTeXTools.latextools.utils import cache_stats
+from LaTeXTools.latextools.utils.cache import Cache
+from LaTeXTools.latextools.utils.cache import CacheMiss
+from LaTeXTools.latextools.utils.cache import LocalCache
+from LaTeXTools.latextools.utils.cache import deduplicated_computations
+from LaTeXTools.latextools.utils.cache import record_input
+
+
+def _settings(**settings):
+    # cache.get_setting with the given settings, e.g. validate_checksum=True
+    def get_setting(key, default=None, view=None):
+        return settings.get(key.split(".", 1)[1], default)
+
+    return patch.object(cache, "get_setting", get_setting)
+
+
+def _wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class LocalCacheTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.tex_root = os.path.join(self.tmp_dir, "main.tex")
+        self.chapter = os.path.join(self.tmp_dir, "chapter.tex")
+        self._write(self.tex_root, "\\input{chapter}\n")
+        self._write(self.chapter, "\\label{a}\n")
+        self.cache = LocalCache(self.tex_root)
+
+    def tearDown(self):
+        self.cache.invalidate()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, file_name, content, mtime_ns=None):
+        with open(file_name, "w") as f:
+            f.write(content)
+        if mtime_ns is not None:
+            os.utime(file_name, ns=(mtime_ns, mtime_ns))
+
+    def _read(self, file_name):
+        record_input(file_name)
+        with open(file_name) as f:
+            return f.read()
+
+    def _get(self, key):
+        # skip the delay between two validations
+        self.cache._validated.clear()
+        return self.cache.get(key)
+
+
+class InputsTest(LocalCacheTest):
+    def test_changed_input_is_a_miss(self):
+        self.cache.cache("chapter", lambda: self._read(self.chapter))
+        self.assertEqual(self._get("chapter"), "\\label{a}\n")
+
+        mtime = os.stat(self.chapter).st_mtime_ns
+        self._write(self.chapter, "\\label{b}\n", mtime + 10**9)
+        self.assertRaises(CacheMiss, self._get, "chapter")
+        self.assertFalse(self.cache.has("chapter.inputs"))
+
+    def test_changed_content_with_same_mtime_is_a_miss(self):
+        self.cache.cache("chapter", lambda: self._read(self.chapter))
+        mtime = os.stat(self.chapter).st_mtime_ns
+        self._write(self.chapter, "\\label{changed}\n", mtime)
+        self.assertRaises(CacheMiss, self._get, "chapter")
+
+    def test_touched_input_with_checksum(self):
+        with _settings(validate_checksum=True):
+            self.cache.cache("chapter", lambda: self._read(self.chapter))
+            mtime = os.stat(self.chapter).st_mtime_ns
+
+            # only touched
+            os.utime(self.chapter, ns=(mtime + 10**9, mtime + 10**9))
+            self.assertEqual(self._get("chapter"), "\\label{a}\n")
+
+            # changed with the same size
+            self._write(self.chapter, "\\label{b}\n", mtime + 2 * 10**9)
+            self.assertRaises(CacheMiss, self._get, "chapter")
+
+    def test_touched_input_without_checksum(self):
+        with _settings(validate_checksum=False):
+            self.cache.cache("chapter", lambda: self._read(self.chapter))
+            mtime = os.stat(self.chapter).st_mtime_ns
+            os.utime(self.chapter, ns=(mtime + 10**9, mtime + 10**9))
+            self.assertRaises(CacheMiss, self._get, "chapter")
+
+    def test_derived_entries_inherit_inputs(self):
+        self.cache.cache("chapter", lambda: self._read(self.chapter))
+        self.cache.cache("labels", lambda: self.cache.get("chapter").split())
+        self.assertEqual(
+            [fingerprint[0] for fingerprint in self.cache._get_inputs("labels")], [self.chapter]
+        )
+
+        # a derived entry is computed from a cached value without reading
+        # the file again, but is invalidated by its changes
+        mtime = os.stat(self.chapter).st_mtime_ns
+        self._write(self.chapter, "\\label{b}\n", mtime + 10**9)
+        self.assertRaises(CacheMiss, self._get, "labels")
+
+    def test_only_affected_key_is_dropped(self):
+        self.cache.cache("chapter", lambda: self._read(self.chapter))
+        self.cache.cache("main", lambda: self._read(self.tex_root))
+        self.cache.set("unrelated", 1)
+
+        mtime = os.stat(self.chapter).st_mtime_ns
+        self._write(self.chapter, "\\label{b}\n", mtime + 10**9)
+        self.assertRaises(CacheMiss, self._get, "chapter")
+        self.assertEqual(self._get("main"), "\\input{chapter}\n")
+        self.assertEqual(self._get("unrelated"), 1)
+
+    def test_empty_inputs_expire(self):
+        self.cache.set("no_files", 1, inputs=())
+        self.assertEqual(self._get("no_files"), 1)
+
+        Cache.set(self.cache, LocalCache._CACHE_TIMESTAMP, int(time.time()) - 100)
+        with patch.object(LocalCache, "_get_cache_life_span", return_value=10):
+            self.assertRaises(CacheMiss, self._get, "no_files")
+        self.assertFalse(self.cache.has("no_files.inputs"))
+
+
+class SaveTest(LocalCacheTest):
+    def test_failed_save_keeps_entries_dirty(self):
+        commit = self.cache._store.commit
+        calls = []
+
+        def failing_commit(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OSError("disk full")
+            return commit(*args)
+
+        with patch.object(self.cache._store, "commit", failing_commit):
+            self.cache.set("a", "a" * 1000)
+            self.cache.save()
+            self.assertTrue(self.cache._dirty)
+            self.assertIn("a", self.cache._dirty_keys)
+
+            # unsaved entries are not evicted from memory
+            with patch.object(cache, "_get_memory_budget", return_value=1):
+                cache._resident.enforce()
+            self.assertIn("a", self.cache._objects)
+
+            # the save is retried
+            _wait_until(lambda: len(calls) == 2)
+        self.assertFalse(self.cache._dirty)
+        self.assertEqual(self.cache._store.read("a"), "a" * 1000)
+
+
+class FlightTest(LocalCacheTest):
+    def _start(self, target, count=1):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        return threads
+
+    def _join(self, threads):
+        for thread in threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive(), "deadlock")
+
+    def _joined(self, key):
+        return deduplicated_computations().get(key, 0)
+
+    def test_concurrent_callers_share_one_computation(self):
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def produce():
+            calls.append(1)
+            release.wait(5)
+            return ("value",)
+
+        joined = self._joined("shared")
+        threads = self._start(lambda: results.append(self.cache.cache("shared", produce)), 5)
+        _wait_until(lambda: self._joined("shared") == joined + 4)
+        release.set()
+        self._join(threads)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [("value",)] * 5)
+
+    def test_error_reaches_every_waiter(self):
+        release = threading.Event()
+        calls = []
+        errors = []
+
+        def produce():
+            calls.append(1)
+            release.wait(5)
+            raise RuntimeError("failed")
+
+        def run():
+            try:
+                self.cache.cache("failing", produce)
+            except RuntimeError as e:
+                errors.append(e)
+
+        joined = self._joined("failing")
+        threads = self._start(run, 3)
+        _wait_until(lambda: self._joined("failing") == joined + 2)
+        release.set()
+        self._join(threads)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(errors), 3)
+        self.assertFalse(self.cache.has("failing"))
+        self.assertNotIn("failing", self.cache._flights)
+
+    def test_recursive_request_does_not_deadlock(self):
+        results = []
+
+        def produce():
+            # e.g. a value derived from an older value of the same key
+            return self.cache.cache("recursive", lambda: 1) + 1
+
+        self._join(self._start(lambda: results.append(self.cache.cache("recursive", produce))))
+        self.assertEqual(results, [2])
+
+    def test_refresh_is_joined_by_cache(self):
+        release = threading.Event()
+        results = []
+
+        def produce():
+            release.wait(5)
+            return "refreshed"
+
+        threads = self._start(lambda: results.append(self.cache.refresh("refreshed", produce)))
+        _wait_until(lambda: "refreshed" in self.cache._flights)
+        joined = self._joined("refreshed")
+        threads += self._start(
+            lambda: results.append(self.cache.cache("refreshed", lambda: "computed"))
+        )
+        _wait_until(lambda: self._joined("refreshed") == joined + 1)
+        release.set()
+        self._join(threads)
+
+        self.assertEqual(results, ["refreshed", "refreshed"])
+
+
+class ResidentEntriesTest(LocalCacheTest):
+    def setUp(self):
+        super().setUp()
+        # only track the entries of this test
+        patcher = patch.object(cache, "_resident", cache._ResidentEntries())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _budget(self, size):
+        return patch.object(cache, "_get_memory_budget", return_value=size)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        values = {key: key * 1000 for key in ("a", "b", "c")}
+        size = cache._approximate_size(values["a"])
+        with self._budget(int(2.5 * size)):
+            self.cache.set("a", values["a"])
+            self.cache.set("b", values["b"])
+            self.cache.save()
+            self.cache.get("a")
+            self.cache.set("c", values["c"])
+            self.cache.save()
+
+            self.assertNotIn("b", self.cache._objects)
+            self.assertEqual(self.cache._objects["a"], values["a"])
+            self.assertEqual(self.cache._objects["c"], values["c"])
+            self.assertLessEqual(cache.resident_size(), 2.5 * size)
+
+            # evicted entries are read from disk again
+            self.assertEqual(self.cache.get("b"), values["b"])
+            self.assertIn("b", self.cache._objects)
+
+    def test_dirty_entries_are_kept_until_saved(self):
+        with self._budget(1):
+            self.cache.set("a", "a" * 1000)
+            self.cache.set("b", "b" * 1000)
+            cache._resident.enforce()
+            self.assertIn("a", self.cache._objects)
+            self.assertIn("b", self.cache._objects)
+
+            self.cache.save()
+            self.assertNotIn("a", self.cache._objects)
+            self.assertNotIn("b", self.cache._objects)
+            self.assertEqual(self.cache.get("a"), "a" * 1000)
+
+    def test_bookkeeping_entries_are_never_evicted(self):
+        with self._budget(1):
+            self.cache.cache("chapter", lambda: self._read(self.chapter))
+            self.cache.save()
+            timestamp = self.cache._objects[LocalCache._CACHE_TIMESTAMP]
+            self.assertNotIn("chapter", self.cache._objects)
+            for key in (LocalCache._CACHE_TIMESTAMP, LocalCache.TEX_ROOT_KEY, "chapter.inputs"):
+                self.assertIn(key, self.cache._objects)
+
+            # the life span of the cache is not restarted
+            self.cache.set("b", 1)
+            self.assertEqual(self.cache._objects[LocalCache._CACHE_TIMESTAMP], timestamp)
+
+    def test_entries_are_reported(self):
+        self.cache.set("a", "a" * 1000)
+        self.cache.set("b", 1)
+        self.assertEqual(
+            [entry[:2] for entry in cache.resident_entries() if entry[1] in ("a", "b")],
+            [(self.tex_root, "b"), (self.tex_root, "a")],
+        )
+
+
+class CacheStatsTest(LocalCacheTest):
+    def setUp(self):
+        super().setUp()
+        cache_stats.reset()
+        self.addCleanup(cache_stats.reset)
+
+    def test_key_class(self):
+        self.assertEqual(cache_stats.key_class("analysis"), "analysis")
+        self.assertEqual(cache_stats.key_class("preamble_analysis"), "preamble_analysis")
+        self.assertEqual(cache_stats.key_class("analysis.inputs"), "inputs")
+        self.assertEqual(cache_stats.key_class("bib_traditional_fmt_0123"), "bib_fmt")
+        self.assertEqual(cache_stats.key_class("bib_new_0123"), "bib_entries")
+        self.assertEqual(cache_stats.key_class("glocomp_acronym"), "glossary")
+        self.assertEqual(cache_stats.key_class("ref_list"), "other")
+
+    def test_counters(self):
+        self.cache.cache("analysis", lambda: 1)
+        self.assertEqual(self._get("analysis"), 1)
+        self.assertRaises(CacheMiss, self._get, "preamble_analysis")
+        self.cache.save()
+
+        stats = cache_stats.snapshot()
+        # the miss of cache() before the computation and the hit of get()
+        self.assertEqual(stats["analysis"]["hits"], 1)
+        self.assertEqual(stats["analysis"]["misses"], 1)
+        self.assertEqual(stats["analysis"]["computes"], 1)
+        self.assertEqual(stats["analysis"]["saves"], 1)
+        self.assertEqual(stats["preamble_analysis"]["misses"], 1)
+        self.assertEqual(stats["preamble_analysis"]["saves"], 0)
+
+    def test_command_reports_and_resets(self):
+        reports = []
+        command = latextools_cache_listener.LatextoolsCacheStatsCommand()
+        command.window = None
+        self.cache.cache("analysis", lambda: 1)
+
+        with patch.object(
+            latextools_cache_listener, "show_report", lambda window, text: reports.append(text)
+        ):
+            command.run()
+            self.assertIn("analysis", reports[0])
+            self.assertTrue(cache_stats.snapshot())
+
+            command.run(reset=True)
+        self.assertEqual(cache_stats.snapshot(), {})
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from LaTeXTools.latextools.utils import cache
+from LaTeXTools.latextools.utils import cache_gc
+from LaTeXTools.latextools.utils import cache_store
+from LaTeXTools.latextools.utils import include_index
+from LaTeXTools.latextools.utils.cache import LocalCache
+
+
+class CollectTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, "cache")
+        patcher = patch.object(cache, "_global_cache_path", return_value=self.cache_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _create(self, name, size=10000, age=0):
+        """
+        creates the tex root and a persisted local cache of it, which is not
+        in use
+        """
+        tex_root = os.path.join(self.tmp_dir, name)
+        with open(tex_root, "w") as f:
+            f.write("\\documentclass{article}\n")
+        path = os.path.join(self.cache_path, cache.LOCAL_CACHE_FOLDER, cache.hash_digest(tex_root))
+        cache_store.open_store(path, "cache").commit(
+            {LocalCache.TEX_ROOT_KEY: tex_root, "analysis": os.urandom(size)}
+        )
+
+        # the time the cache has been used last
+        last_access = time.time() - age
+        for file_name in os.listdir(path):
+            os.utime(os.path.join(path, file_name), (last_access, last_access))
+        return tex_root, path
+
+    def _sources(self, removed):
+        return [(unit.source, reason) for unit, reason in removed]
+
+    def test_orphaned_cache_is_removed(self):
+        removed_root, removed_path = self._create("removed.tex")
+        kept_root, kept_path = self._create("kept.tex")
+        os.remove(removed_root)
+
+        removed, _ = cache_gc.collect(dry_run=True, size_limit=0)
+        self.assertEqual(self._sources(removed), [(removed_root, "source removed")])
+        self.assertTrue(os.path.exists(removed_path))
+
+        removed, _ = cache_gc.collect(size_limit=0)
+        self.assertEqual(self._sources(removed), [(removed_root, "source removed")])
+        self.assertFalse(os.path.exists(removed_path))
+        self.assertTrue(os.path.exists(kept_path))
+
+    def test_least_recently_used_caches_exceeding_the_limit_are_removed(self):
+        old_root, old_path = self._create("old.tex", age=3600)
+        new_root, new_path = self._create("new.tex", age=60)
+        size = cache_gc._file_stats(new_path)[0]
+
+        removed, total_size = cache_gc.collect(size_limit=int(1.5 * size))
+        self.assertEqual(self._sources(removed), [(old_root, "size limit")])
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(new_path))
+        self.assertEqual(total_size, size)
+
+    def test_active_cache_is_kept(self):
+        tex_root, path = self._create("active.tex", age=3600)
+        os.remove(tex_root)
+        active = LocalCache(tex_root)
+
+        removed, _ = cache_gc.collect(size_limit=1)
+        self.assertEqual(removed, [])
+        self.assertTrue(os.path.exists(path))
+        del active
+
+    def test_source_is_read_without_registering_stores(self):
+        tex_root, path = self._create("removed.tex")
+        os.remove(tex_root)
+        stores = set(cache_store._STORES)
+
+        cache_gc.collect(size_limit=0)
+        self.assertEqual(set(cache_store._STORES), stores)
+
+    def test_removed_roots_are_dropped_from_the_include_index(self):
+        removed_root, _ = self._create("removed.tex", age=3600)
+        kept_root, kept_path = self._create("kept.tex", age=60)
+        deleted_root = os.path.join(self.tmp_dir, "deleted.tex")
+        chapter = os.path.join(self.tmp_dir, "chapter.tex")
+        open(chapter, "w").close()
+        for tex_root in (removed_root, kept_root, deleted_root):
+            include_index.update(tex_root, (tex_root, chapter))
+            self.addCleanup(include_index.update, tex_root, ())
+
+        cache_gc.collect(dry_run=True, size_limit=1)
+        self.assertEqual(
+            include_index.dependent_roots(chapter), {removed_root, kept_root, deleted_root}
+        )
+
+        # the deleted root has no cache, but no longer exists
+        size = cache_gc._file_stats(kept_path)[0]
+        removed, _ = cache_gc.collect(size_limit=int(1.5 * size))
+        self.assertEqual(self._sources(removed), [(removed_root, "size limit")])
+        self.assertEqual(include_index.dependent_roots(chapter), {kept_root})
+        self.assertEqual(include_index.dependent_roots(removed_root), set())
+        self.assertEqual(include_index.dependent_roots(deleted_root), set())
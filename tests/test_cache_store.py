@@ -0,0 +1,74 @@
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import zlib
+from unittest import TestCase
+
+from LaTeXTools.latextools.utils.cache_store import PackStore
+
+
+class PackStoreTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "root", "cache.pack")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_read_written_entries(self):
+        store = PackStore(self.path)
+        store.commit({"a": 1, "b": (1, 2)})
+        store.commit({"a": 2}, ["b"])
+        self.assertEqual(store.read("a"), 2)
+        self.assertRaises(KeyError, store.read, "b")
+        self.assertEqual(PackStore(self.path).read_all(), {"a": 2})
+
+    def test_incomplete_batch_is_ignored(self):
+        store = PackStore(self.path)
+        store.commit({"a": 1})
+        with open(self.path, "ab") as f:
+            f.write(b"\x01incomplete record")
+
+        store = PackStore(self.path)
+        self.assertEqual(store.read_all(), {"a": 1})
+        store.commit({"b": 2})
+        self.assertEqual(PackStore(self.path).read_all(), {"a": 1, "b": 2})
+
+    def test_compaction_keeps_entries(self):
+        store = PackStore(self.path)
+        store.commit({"a": 1})
+        for i in range(100):
+            store.commit({"b": b"x" * 10000, "c": i})
+        self.assertLess(os.path.getsize(self.path), 100 * 10000)
+        self.assertEqual(PackStore(self.path).read_all(), {"a": 1, "b": b"x" * 10000, "c": 99})
+
+    def test_emptied_store_is_removed(self):
+        store = PackStore(self.path)
+        store.commit({"a": 1})
+        store.commit({}, ["a"])
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(os.path.dirname(self.path)))
+
+    def test_values_are_compressed(self):
+        value = "LaTeXTools " * 10000
+        PackStore(self.path).commit({"a": value})
+        self.assertLess(os.path.getsize(self.path), len(pickle.dumps(value)) / 10)
+        self.assertEqual(PackStore(self.path).read("a"), value)
+
+    def test_version_1_file_is_migrated(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "wb") as f:
+            f.write(struct.pack(">8sH", PackStore.MAGIC, 1))
+            for kind, key, data in ((1, b"a", pickle.dumps(1)), (3, b"", b"")):
+                head = struct.pack(">BdHI", kind, 0.0, len(key), len(data))
+                crc = zlib.crc32(data, zlib.crc32(key, zlib.crc32(head)))
+                f.write(head + key + data + struct.pack(">I", crc))
+
+        store = PackStore(self.path)
+        self.assertEqual(store.read("a"), 1)
+        store.commit({"b": 2})
+        store = PackStore(self.path)
+        self.assertEqual(store.read_all(), {"a": 1, "b": 2})
+        self.assertEqual(store._version, PackStore.VERSION)
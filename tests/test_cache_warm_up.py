@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from LaTeXTools.latextools import latextools_cache_listener
+from LaTeXTools.latextools.latextools_cache_listener import CacheWarmUp
+from LaTeXTools.latextools.utils.cache import LocalCache
+
+
+class _Window:
+    def __init__(self, valid=True):
+        self.valid = valid
+
+    def is_valid(self):
+        return self.valid
+
+
+class _View:
+    _ids = iter(range(-1, -1000, -1))
+
+    def __init__(self, window):
+        self._id = next(self._ids)
+        self._window = window
+
+    def id(self):
+        return self._id
+
+    def window(self):
+        return self._window
+
+    def is_valid(self):
+        return True
+
+
+class CacheWarmUpTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.tex_root = os.path.join(self.tmp_dir, "main.tex")
+        self.cache = LocalCache(self.tex_root)
+        self.warm_up = CacheWarmUp()
+        self.views = []
+
+    def tearDown(self):
+        for view in self.views:
+            latextools_cache_listener._BIB_CACHES.pop(view.id(), None)
+        self.cache.invalidate()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _view(self, window):
+        view = _View(window)
+        self.views.append(view)
+        return view
+
+    def _add(self, view, cache, calls):
+        done = threading.Event()
+
+        def callback():
+            calls.append((view.id(), cache.has("analysis")))
+            done.set()
+
+        self.warm_up.add(view, cache, callback)
+        return done
+
+    def test_persisted_cache_is_loaded(self):
+        self.cache.set("analysis", ("analysis",))
+        self.cache.save()
+        # the saved entry has been evicted from memory
+        self.cache._objects.pop("analysis")
+
+        calls = []
+        view = self._view(_Window())
+        self.assertTrue(self._add(view, self.cache, calls).wait(5))
+        self.assertEqual(calls, [(view.id(), True)])
+        self.assertEqual(self.cache._objects["analysis"], ("analysis",))
+        # no bibliography has been cached
+        self.assertEqual(latextools_cache_listener._BIB_CACHES[view.id()], ())
+
+    def test_views_are_handled_in_order(self):
+        calls = []
+        views = [self._view(_Window()) for _ in range(3)]
+        events = [self._add(view, self.cache, calls) for view in views]
+        self.assertTrue(events[-1].wait(5))
+        self.assertEqual([view_id for view_id, _ in calls], [view.id() for view in views])
+
+    def test_views_of_closed_windows_are_skipped(self):
+        calls = []
+        closed = self._view(_Window(valid=False))
+        self._add(closed, self.cache, calls)
+        self.assertTrue(self._add(self._view(_Window()), self.cache, calls).wait(5))
+
+        self.assertNotIn(closed.id(), [view_id for view_id, _ in calls])
+        self.assertNotIn(closed.id(), latextools_cache_listener._BIB_CACHES)
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from LaTeXTools.latextools.latex_installed_packages import collect_packages
+from LaTeXTools.latextools.utils.kpathsea import FileIndex
+
+LS_R = """% ls-R -- filename database for kpathsea; do not change this line.
+./tex/latex/base:
+article.cls
+size10.clo
+
+./tex/latex/amsmath:
+amsmath.sty
+README
+
+./bibtex/bst/base:
+plain.bst
+"""
+
+
+class CollectPackagesTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.dist = os.path.join(self.tmp_dir, "texmf-dist")
+        os.makedirs(self.dist)
+        with open(os.path.join(self.dist, "ls-R"), "w") as f:
+            f.write(LS_R)
+        self.index = FileIndex([os.path.join(self.dist, "ls-R")])
+
+        self.home = os.path.join(self.tmp_dir, "texmf")
+        for name in ("tex/latex/mine/mine.sty", "tex/latex/mine/deep/Deep.cls", "mine.sty"):
+            path = os.path.join(self.home, *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_database_and_scanned_directories(self):
+        search_paths = {
+            "tex": (
+                ".",
+                os.path.join(self.home, "tex") + "//",
+                "!!" + os.path.join(self.dist, "tex") + "//",
+                "!!" + os.path.join(self.tmp_dir, "missing") + "//",
+            ),
+            "bst": ("!!" + os.path.join(self.dist, "bibtex", "bst") + "//",),
+        }
+        updates = []
+        found = collect_packages(search_paths, self.index, lambda f: updates.append(1))
+        self.assertEqual(
+            found,
+            {"pkg": {"amsmath", "mine"}, "cls": {"article", "Deep"}, "bst": {"plain"}},
+        )
+        self.assertEqual(len(updates), 3)
+
+    def test_non_recursive_element(self):
+        found = collect_packages({"tex": (self.home, os.path.join(self.dist, "tex"))}, self.index)
+        self.assertEqual(found, {"pkg": {"mine"}, "cls": set(), "bst": set()})
@@ -0,0 +1,74 @@
+import time
+from unittest import TestCase
+
+from LaTeXTools.latextools.utils.io_executor import IOExecutor
+
+
+class IOExecutorTest(TestCase):
+    def setUp(self):
+        self.executor = IOExecutor(workers=1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_submit(self):
+        self.assertEqual(self.executor.submit(lambda x: x * 2, 21).result(5), 42)
+
+    def test_scheduled_tasks_are_coalesced(self):
+        calls = []
+        futures = [
+            self.executor.schedule("key", calls.append, i, delay=0.1, max_delay=5) for i in range(5)
+        ]
+        futures[0].result(5)
+        # the latest arguments are used
+        self.assertEqual(calls, [4])
+        self.assertTrue(all(future is futures[0] for future in futures))
+
+    def test_tasks_with_different_keys_are_not_coalesced(self):
+        calls = []
+        futures = [self.executor.schedule(key, calls.append, key, delay=0.05) for key in ("a", "b")]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(sorted(calls), ["a", "b"])
+
+    def test_postponing_is_bounded_by_max_delay(self):
+        calls = []
+        start = time.monotonic()
+
+        def schedule():
+            return self.executor.schedule(
+                "key", lambda: calls.append(time.monotonic()), delay=0.2, max_delay=0.5
+            )
+
+        future = schedule()
+        # each change postpones the task, which is still executed in time
+        while not future.done() and time.monotonic() - start < 5:
+            schedule()
+            time.sleep(0.02)
+
+        self.assertEqual(len(calls), 1)
+        self.assertGreaterEqual(calls[0] - start, 0.45)
+        self.assertLess(calls[0] - start, 2)
+
+    def test_shutdown_runs_delayed_tasks(self):
+        calls = []
+        self.executor.schedule("key", calls.append, 1, delay=60)
+        self.executor.shutdown()
+        self.assertEqual(calls, [1])
+        self.assertFalse(self.executor.is_running())
+
+        # tasks are executed directly after the shutdown
+        self.assertEqual(self.executor.submit(lambda: 42).result(0), 42)
+
+    def test_submit_from_worker_runs_inline(self):
+        def outer():
+            return self.executor.submit(lambda: 42).result(0)
+
+        self.assertEqual(self.executor.submit(outer).result(5), 42)
+
+    def test_error_is_set_on_future(self):
+        def fail():
+            raise RuntimeError("failed")
+
+        with self.assertRaises(RuntimeError):
+            self.executor.submit(fail).result(5)
@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from LaTeXTools.latextools.utils import io_executor
+from LaTeXTools.latextools.utils import kpathsea
+from LaTeXTools.latextools.utils.kpathsea import FileIndex
+
+LS_R = """% ls-R -- filename database for kpathsea; do not change this line.
+./:
+bibtex
+tex
+
+./bibtex/bib/base:
+refs.bib
+xampl.bib
+
+./bibtex/bib/other:
+xampl.bib
+
+./tex/latex/foo:
+foo.sty
+"""
+
+
+class FileIndexTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp_dir, "texmf-dist")
+        os.makedirs(self.root)
+        self.database = os.path.join(self.root, "ls-R")
+        with open(self.database, "w") as f:
+            f.write(LS_R)
+        self.index = FileIndex([self.database])
+        self.bib_path = ["!!" + os.path.join(self.root, "bibtex", "bib") + "//"]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def test_find_in_database(self):
+        refs = self._path("bibtex", "bib", "base", "refs.bib")
+        self.assertEqual(self.index.find("refs.bib", self.bib_path), refs)
+        self.assertEqual(self.index.find("refs", self.bib_path, ".bib"), refs)
+        self.assertEqual(
+            self.index.find("other/xampl.bib", self.bib_path),
+            self._path("bibtex", "bib", "other", "xampl.bib"),
+        )
+        self.assertIsNone(self.index.find("missing.bib", self.bib_path))
+        self.assertIsNone(self.index.find("foo.sty", self.bib_path))
+
+    def test_ambiguous_file_is_left_to_kpsewhich(self):
+        self.assertIsNone(self.index.find("xampl.bib", self.bib_path))
+
+    def test_non_recursive_element(self):
+        base = "!!" + self._path("bibtex", "bib", "base")
+        self.assertEqual(
+            self.index.find("xampl.bib", [base]), self._path("bibtex", "bib", "base", "xampl.bib")
+        )
+        self.assertIsNone(self.index.find("refs.bib", ["!!" + self._path("bibtex", "bib")]))
+
+    def test_disk_elements(self):
+        local = os.path.join(self.tmp_dir, "local")
+        os.makedirs(os.path.join(local, "sub"))
+        open(os.path.join(local, "refs.bib"), "w").close()
+        self.assertEqual(
+            self.index.find("refs.bib", [local] + self.bib_path), os.path.join(local, "refs.bib")
+        )
+        # files in a directory without database can only be found by a
+        # recursive disk search
+        self.assertIsNone(self.index.find("refs.bib", [local + "//"] + self.bib_path))
+        missing = os.path.join(self.tmp_dir, "missing") + "//"
+        self.assertEqual(
+            self.index.find("refs.bib", [missing] + self.bib_path),
+            self._path("bibtex", "bib", "base", "refs.bib"),
+        )
+
+    def test_updated_database(self):
+        self.assertFalse(self.index.is_outdated())
+        stat = os.stat(self.database)
+        os.utime(self.database, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertTrue(self.index.is_outdated())
+
+
+class BackgroundLoadingTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.database = os.path.join(self.tmp_dir, "ls-R")
+        with open(self.database, "w") as f:
+            f.write(LS_R)
+        self.release = threading.Event()
+        self.loads = []
+
+        def find_databases():
+            self.loads.append(1)
+            self.release.wait(5)
+            return [self.database]
+
+        bib_path = ("!!" + os.path.join(self.tmp_dir, "bibtex", "bib") + "//",)
+        for patcher in (
+            patch.object(kpathsea, "_find_databases", find_databases),
+            patch.object(kpathsea, "search_path", return_value=bib_path),
+            patch.object(kpathsea, "_environment", None),
+            patch.object(kpathsea, "_index", None),
+            patch.object(kpathsea, "_loading", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.release.set()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_lookups_are_left_to_kpsewhich_while_loading(self):
+        self.assertEqual(kpathsea.lookup_all(["refs.bib"], "bib"), {})
+        self.assertEqual(kpathsea.lookup_all(["refs.bib"], "bib"), {})
+        self.assertIsNone(kpathsea.get_index(wait=False))
+
+        self.release.set()
+        index = kpathsea.get_index()
+        self.assertEqual(len(self.loads), 1)
+        self.assertIs(kpathsea.get_index(wait=False), index)
+        self.assertEqual(
+            kpathsea.lookup_all(["refs.bib"], "bib"),
+            {"refs.bib": os.path.join(self.tmp_dir, "bibtex", "bib", "base", "refs.bib")},
+        )
+
+    def _wait_for_loading(self):
+        deadline = time.time() + 5
+        while not self.loads and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.loads), 1)
+
+    def test_lock_is_not_held_while_loading(self):
+        kpathsea.get_index(wait=False)
+        self._wait_for_loading()
+        self.assertTrue(kpathsea._lock.acquire(timeout=5))
+        kpathsea._lock.release()
+
+    def test_background_task_is_not_blocked(self):
+        # the workers of the executor run submitted tasks inline
+        future = io_executor.submit(kpathsea.get_index, wait=False)
+        self.assertIsNone(future.result(2))
+        self._wait_for_loading()
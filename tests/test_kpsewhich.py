@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from LaTeXTools.latextools.utils import kpathsea
+from LaTeXTools.latextools.utils import kpsewhich
+
+
+class MatchPathsTest(TestCase):
+    def test_missing_files_are_omitted(self):
+        names = ["a.bib", "b.bib", "c.bib"]
+        paths = ["/texmf/bibtex/bib/a.bib", "/texmf/bibtex/bib/c.bib", ""]
+        self.assertEqual(
+            kpsewhich.match_paths(names, paths),
+            {"a.bib": "/texmf/bibtex/bib/a.bib", "c.bib": "/texmf/bibtex/bib/c.bib"},
+        )
+
+    def test_default_suffix_and_directories(self):
+        names = ["refs", "sub/refs.bib", "other.bib"]
+        paths = ["/texmf/refs.bib", "./sub/refs.bib"]
+        self.assertEqual(
+            kpsewhich.match_paths(names, paths),
+            {"refs": "/texmf/refs.bib", "sub/refs.bib": "./sub/refs.bib"},
+        )
+
+
+class KpsewhichCacheTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "refs.bib")
+        open(self.path, "w").close()
+        self.texinputs = os.environ.get("TEXINPUTS")
+
+    def tearDown(self):
+        if self.texinputs is None:
+            os.environ.pop("TEXINPUTS", None)
+        else:
+            os.environ["TEXINPUTS"] = self.texinputs
+        kpsewhich.clear_cache()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _remember(self, name, path):
+        with kpsewhich._lock:
+            kpsewhich._environment = kpathsea.environment_key()
+            kpsewhich._results[("mlbib", name)] = (path, time.time())
+
+    def test_results_are_reused(self):
+        self._remember("refs.bib", self.path)
+        self._remember("missing.bib", None)
+        self.assertEqual(
+            kpsewhich.kpsewhich_all(["refs.bib", "missing.bib"], "mlbib"),
+            {"refs.bib": self.path, "missing.bib": None},
+        )
+
+    def test_environment_change_clears_results(self):
+        self._remember("refs.bib", self.path)
+        os.environ["TEXINPUTS"] = self.tmp_dir + os.pathsep
+        kpsewhich.kpsewhich_all(["other.bib"], "mlbib")
+        self.assertNotIn(("mlbib", "refs.bib"), kpsewhich._results)